@@ -0,0 +1,277 @@
+"""群相册渲染基准测试
+
+在插件根目录下、使用安装了 AstrBot 的 Python 环境运行：
+
+    python -m bench.bench_render --font-dir <字体目录> [--out result.json]
+    python -m bench.bench_render --baseline result.json   # 与上次结果对比
+
+全程离线：头像为按固定种子生成的本地图片，不连接协议端。
+Pilmoji 绘制 emoji 时需要联网下载 emoji 图片，默认关闭，传入 --pilmoji 开启。
+每个用例在独立子进程中执行，因此峰值 RSS 互不影响。
+"""
+
+import argparse
+import io
+import json
+import multiprocessing
+import platform
+import random
+import resource
+import statistics
+import sys
+import time
+from pathlib import Path
+
+PLUGIN_ROOT = Path(__file__).resolve().parent.parent
+if str(PLUGIN_ROOT) not in sys.path:
+    sys.path.insert(0, str(PLUGIN_ROOT))
+
+from PIL import Image, ImageDraw  # noqa: E402
+
+from src import draw  # noqa: E402
+from src.encoder import EncodeOptions  # noqa: E402
+
+SEED = 20260801
+AVATAR_COUNT = 8
+
+SHORT_CJK = "今天群里又有人说怪话了"
+LONG_CJK = (
+    "我跟你们说，昨天晚上我做了一个梦，梦见自己在图书馆里找一本书，"
+    "找了三个小时都没找到，最后发现那本书就在我手上。"
+) * 40
+EMOJI_HEAVY = "笑死😂😂😂 这也太离谱了吧🤣👍🔥🔥 我直接一个大无语😅🙃🫠✨🎉" * 6
+CUSTOM_TITLE = "🌟摸鱼大师🐟"
+
+NICKNAMES = ["群友甲", "Alice", "今天也要早睡😴", "管理员小王", "路人", "某某某"]
+ROLES = ["member", "member", "admin", "owner"]
+
+
+def make_avatars() -> list[bytes]:
+    """生成固定的本地头像素材"""
+    rnd = random.Random(SEED)
+    avatars = []
+    for _ in range(AVATAR_COUNT):
+        img = Image.new("RGB", (640, 640), tuple(rnd.randrange(256) for _ in range(3)))
+        d = ImageDraw.Draw(img)
+        for _ in range(12):
+            x0, y0 = rnd.randrange(600), rnd.randrange(600)
+            d.ellipse(
+                (x0, y0, x0 + rnd.randrange(40, 320), y0 + rnd.randrange(40, 320)),
+                fill=tuple(rnd.randrange(256) for _ in range(3)),
+            )
+        buf = io.BytesIO()
+        img.save(buf, format="JPEG", quality=90)
+        avatars.append(buf.getvalue())
+    return avatars
+
+
+def make_messages(count: int, avatars: list[bytes]) -> list[dict]:
+    rnd = random.Random(SEED + count)
+    texts = [SHORT_CJK, LONG_CJK[:300], EMOJI_HEAVY[:60], "好", "？？？"]
+    return [
+        {
+            "name": rnd.choice(NICKNAMES),
+            "avatar_bytes": rnd.choice(avatars),
+            "text": rnd.choice(texts),
+            "role": rnd.choice(ROLES),
+            "title": rnd.choice(["", "", CUSTOM_TITLE]),
+            "level": rnd.randrange(1, 100),
+        }
+        for _ in range(count)
+    ]
+
+
+def render_kwargs(text: str, avatar: bytes, title: str = "") -> dict:
+    return {
+        "name": "群友甲",
+        "avatar_bytes": avatar,
+        "text": text,
+        "role": "member",
+        "title": title,
+        "level": 42,
+    }
+
+
+def stitch(messages: list[dict]) -> list[bytes]:
+    pager = draw.StitchPager(
+        draw.STITCH_MAX_HEIGHT, draw.STITCH_MAX_PIXELS, EncodeOptions()
+    )
+    pages = []
+    for msg in messages:
+        img = draw.render_my_friend_image(**msg)
+        if not pager.fits(img):
+            pages.append(pager.flush())
+        pager.add(img)
+    pages.append(pager.flush())
+    return [p for p in pages if p]
+
+
+def build_cases(avatars: list[bytes]) -> dict:
+    font = draw.load_font(55)
+    avatar = avatars[0]
+    return {
+        "wrap_text/short_cjk": lambda: draw.wrap_text(SHORT_CJK, font, 900),
+        "wrap_text/long_cjk": lambda: draw.wrap_text(LONG_CJK, font, 900),
+        "wrap_text/emoji": lambda: draw.wrap_text(
+            draw.pad_emojis(EMOJI_HEAVY), font, 900
+        ),
+        "make_dialog_box/short_cjk": lambda: draw.make_dialog_box(SHORT_CJK, 0),
+        "make_dialog_box/long_cjk": lambda: draw.make_dialog_box(LONG_CJK, 0),
+        "make_dialog_box/emoji": lambda: draw.make_dialog_box(EMOJI_HEAVY, 0),
+        "render_my_friend/short_cjk": lambda: draw.render_my_friend(
+            **render_kwargs(SHORT_CJK, avatar)
+        ),
+        "render_my_friend/long_cjk": lambda: draw.render_my_friend(
+            **render_kwargs(LONG_CJK, avatar)
+        ),
+        "render_my_friend/emoji": lambda: draw.render_my_friend(
+            **render_kwargs(EMOJI_HEAVY, avatar)
+        ),
+        "render_my_friend/custom_title": lambda: draw.render_my_friend(
+            **render_kwargs(SHORT_CJK, avatar, title=CUSTOM_TITLE)
+        ),
+        "stitch/1": lambda: stitch(make_messages(1, avatars)),
+        "stitch/10": lambda: stitch(make_messages(10, avatars)),
+        "stitch/50": lambda: stitch(make_messages(50, avatars)),
+    }
+
+
+def output_size(result) -> int:
+    if isinstance(result, bytes):
+        return len(result)
+    if isinstance(result, list) and result and isinstance(result[0], bytes):
+        return sum(len(b) for b in result)
+    return 0
+
+
+def percentile(sorted_values: list[float], pct: float) -> float:
+    if not sorted_values:
+        return 0.0
+    idx = min(len(sorted_values) - 1, int(round(pct / 100 * (len(sorted_values) - 1))))
+    return sorted_values[idx]
+
+
+def run_case(name: str, args: argparse.Namespace, queue) -> None:
+    setup(args)
+    func = build_cases(make_avatars())[name]
+    rss_before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    for _ in range(args.warmup):
+        func()
+    timings = []
+    size = 0
+    for _ in range(args.iterations):
+        start = time.perf_counter()
+        result = func()
+        timings.append((time.perf_counter() - start) * 1000)
+        size = output_size(result)
+    timings.sort()
+    queue.put(
+        {
+            "case": name,
+            "iterations": args.iterations,
+            "p50_ms": percentile(timings, 50),
+            "p90_ms": percentile(timings, 90),
+            "p99_ms": percentile(timings, 99),
+            "max_ms": timings[-1],
+            "mean_ms": statistics.fmean(timings),
+            "peak_rss_kb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+            "rss_growth_kb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+            - rss_before,
+            "output_bytes": size,
+        }
+    )
+
+
+def setup(args: argparse.Namespace) -> None:
+    if args.font_dir:
+        draw.set_font_dir(Path(args.font_dir))
+    draw.set_text_limits(args.max_lines, args.max_chars)
+    draw.set_stitch_limits(args.max_height, 0)
+    if not args.pilmoji:
+        draw.Pilmoji = None
+
+
+def environment() -> dict:
+    import PIL
+
+    try:
+        import pilmoji
+
+        pilmoji_version = getattr(pilmoji, "__version__", "unknown")
+    except ImportError:
+        pilmoji_version = None
+    return {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "pillow": PIL.__version__,
+        "pilmoji": pilmoji_version,
+        "seed": SEED,
+    }
+
+
+def print_table(results: list[dict], baseline: dict | None) -> None:
+    header = (
+        f"{'case':<32}{'p50':>9}{'p90':>9}{'p99':>9}"
+        f"{'peakRSS':>11}{'bytes':>11}"
+    )
+    if baseline:
+        header += f"{'Δp50':>9}"
+    print(header)
+    for r in results:
+        line = (
+            f"{r['case']:<32}{r['p50_ms']:>8.1f}ms{r['p90_ms']:>7.1f}ms"
+            f"{r['p99_ms']:>7.1f}ms{r['peak_rss_kb'] / 1024:>9.1f}MB"
+            f"{r['output_bytes']:>11}"
+        )
+        old = (baseline or {}).get(r["case"])
+        if old and old["p50_ms"]:
+            line += f"{(r['p50_ms'] / old['p50_ms'] - 1) * 100:>+8.1f}%"
+        print(line)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="群相册渲染基准测试")
+    parser.add_argument("--font-dir", help="NotoSansSC 字体目录（插件数据目录/fonts）")
+    parser.add_argument("-n", "--iterations", type=int, default=20)
+    parser.add_argument("--warmup", type=int, default=2)
+    parser.add_argument("-k", "--filter", default="", help="只运行名称包含该子串的用例")
+    parser.add_argument("--max-lines", type=int, default=40)
+    parser.add_argument("--max-chars", type=int, default=1500)
+    parser.add_argument("--max-height", type=int, default=16000)
+    parser.add_argument("--pilmoji", action="store_true", help="启用 Pilmoji（需联网）")
+    parser.add_argument("--out", help="把结果写入 JSON 文件")
+    parser.add_argument("--baseline", help="与之前保存的 JSON 结果对比")
+    args = parser.parse_args()
+
+    names = [n for n in build_cases([b""]) if args.filter in n]
+    ctx = multiprocessing.get_context("fork")
+    results = []
+    for name in names:
+        queue = ctx.Queue()
+        proc = ctx.Process(target=run_case, args=(name, args, queue))
+        proc.start()
+        proc.join()
+        if proc.exitcode != 0:
+            print(f"{name}: 子进程异常退出(exitcode={proc.exitcode})", file=sys.stderr)
+            continue
+        results.append(queue.get())
+
+    baseline = None
+    if args.baseline:
+        data = json.loads(Path(args.baseline).read_text(encoding="utf-8"))
+        baseline = {r["case"]: r for r in data["results"]}
+    print_table(results, baseline)
+
+    if args.out:
+        Path(args.out).write_text(
+            json.dumps(
+                {"environment": environment(), "args": vars(args), "results": results},
+                ensure_ascii=False,
+                indent=2,
+            ),
+            encoding="utf-8",
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -1,9 +1,13 @@
+# ruff: noqa: E402
+import time
+
+_IMPORT_START = time.perf_counter()
+
 import asyncio
 from datetime import datetime
 import json
 import os
 import random
-import re
 import shutil
 from pathlib import Path
 
@@ -16,51 +20,55 @@ from astrbot.core.platform.sources.aiocqhttp.aiocqhttp_message_event import (
     AiocqhttpMessageEvent,
 )
 
-from .src import draw as draw_module
+from .src import emoji_compat
+from .src.album_catalog import AlbumCatalog, album_name_of
+from .src.avatar_cache import AvatarCache
+from .src.backend_registry import (
+    ALBUM_LIST_ACTIONS,
+    BackendRegistry,
+    candidate_actions,
+    set_backend_registry,
+)
+from .src.backup_store import BackupStore
+from .src.encoder import EncodeOptions, fit_bytes
 from .src.font_manager import FontManager
+from .src.http_client import HttpClient, set_http_client
+from .src.ingest import (
+    IMAGE_SUFFIXES,
+    ImageHandle,
+    clear_temp_dir,
+    save_bytes,
+    staging_name,
+)
+from .src.member_cache import MemberInfoCache, set_member_cache
+from .src.message_buffer import MessageBuffer, set_message_buffer
+from .src.phash import NearDuplicateIndex, dhash
+from .src.upload_modes import get_upload_tracker
+from .src.upload_queue import UploadJob, UploadQueue
+from .src.render_cache import RenderCache
+from .src.render_pool import RenderPool, RenderQueueFull
 from .src.utils import (
+    buffered_message_from_raw,
     check_group_level_permission,
-    detect_image_ext,
-    get_first_image,
+    collect_images,
+    ingest_first_image,
     get_message_history,
     normalize_album_list_response,
     sanitize_filename,
-    upload_album_image_with_fallback,
+    upload_album_image,
+    upload_album_images,
 )
 
-try:
-    import emoji
-    from emoji import unicode_codes
-
-    if not hasattr(unicode_codes, "get_emoji_unicode_dict"):
-
-        def get_emoji_unicode_dict(lang):
-            return {
-                data[lang]: char
-                for char, data in emoji.EMOJI_DATA.items()
-                if lang in data
-            }
-
-        unicode_codes.get_emoji_unicode_dict = get_emoji_unicode_dict
+# PIL / pilmoji / emoji 等重量级依赖都在渲染模块中，由后台预热任务按需导入
+_IMPORT_MS = (time.perf_counter() - _IMPORT_START) * 1000
 
-    if not hasattr(unicode_codes, "EMOJI_UNICODE"):
-        unicode_codes.EMOJI_UNICODE = {"en": get_emoji_unicode_dict("en")}
+RENDER_BUSY_HINT = "渲染繁忙，请稍后再试"
 
-    if not hasattr(emoji, "get_emoji_regexp"):
-        _emoji_regexp = None
 
-        def get_emoji_regexp():
-            global _emoji_regexp
-            if _emoji_regexp is None:
-                emojis = sorted(emoji.EMOJI_DATA.keys(), key=len, reverse=True)
-                pattern = "|".join(re.escape(e) for e in emojis)
-                _emoji_regexp = re.compile(pattern)
-            return _emoji_regexp
-
-        emoji.get_emoji_regexp = get_emoji_regexp
-
-except ImportError:
-    pass
+def _skipped_hint(skipped: list[dict]) -> str:
+    if not skipped:
+        return ""
+    return f"（{len(skipped)} 条消息渲染失败，未包含在拼接图中）"
 
 
 class AdminPlugin(Star):
@@ -68,19 +76,137 @@ class AdminPlugin(Star):
         super().__init__(context)
         self.conf = config
         self.plugin_data_dir = StarTools.get_data_dir("astrbot_plugin_qun_album")
-        self._backend: str = "napcat"
-        self._backend_client_id: int | None = None
+        # 下载 / 渲染得到的图片先流式写入这里，再移动到备份或上传位置
+        self.ingest_dir = self.plugin_data_dir / "ingest"
+        self.backup_store = BackupStore(self.plugin_data_dir / "backup")
+        self.near_dup_index = NearDuplicateIndex(self.plugin_data_dir / "backup")
+        self.backends = BackendRegistry(self.plugin_data_dir / "backends.json")
+        set_backend_registry(self.backends)
         self.font_manager = FontManager(self.plugin_data_dir)
         self._font_task: asyncio.Task | None = None
         self._keywords: dict[str, dict[str, str]] = {}
-        self._default_album_cache: dict[str, dict[str, str]] = {}
+        self.album_catalog = AlbumCatalog(
+            ttl=self.conf.get("album_cache_ttl", 600),
+            on_refresh=self._sync_album_meta,
+        )
+        self._text_limits = (
+            self.conf.get("max_text_lines", 40),
+            self.conf.get("max_text_chars", 1500),
+        )
+        self.render_pool = RenderPool(
+            mode=self.conf.get("render_executor", "thread"),
+            workers=self.conf.get("render_workers", 2),
+            queue_size=self.conf.get("render_queue_size", 16),
+            timeout=self.conf.get("render_timeout", 60),
+        )
+        self.encode_options = EncodeOptions.from_config(self.conf)
+        cache_memory_mb = self.conf.get("render_cache_memory_mb", 32)
+        cache_disk_mb = self.conf.get("render_cache_disk_mb", 0)
+        self.render_cache = RenderCache(
+            max_memory_bytes=cache_memory_mb * 1024 * 1024,
+            disk_dir=self.plugin_data_dir / "render_cache",
+            max_disk_bytes=cache_disk_mb * 1024 * 1024,
+        )
+        self._render_cache_enabled = cache_memory_mb > 0 or cache_disk_mb > 0
+        self.http = HttpClient(
+            timeout=self.conf.get("http_timeout", 15),
+            max_bytes=self.conf.get("download_max_mb", 20) * 1024 * 1024,
+        )
+        set_http_client(self.http)
+        self.avatar_cache = AvatarCache(
+            cache_dir=self.plugin_data_dir / "avatars",
+            ttl=self.conf.get("avatar_cache_ttl_hours", 24) * 3600,
+            max_memory_entries=self.conf.get("avatar_cache_size", 256),
+            max_disk_entries=self.conf.get("avatar_cache_disk_entries", 2000),
+        )
+        self.member_cache = MemberInfoCache(ttl=self.conf.get("member_cache_ttl", 300))
+        set_member_cache(self.member_cache if self.member_cache.ttl > 0 else None)
+        buffer_size = self.conf.get("message_buffer_size", 300)
+        self.message_buffer = MessageBuffer(
+            size=max(0, buffer_size),
+            spill_dir=(
+                self.plugin_data_dir / "message_buffer"
+                if self.conf.get("message_buffer_spill", False)
+                else None
+            ),
+        )
+        set_message_buffer(self.message_buffer if buffer_size > 0 else None)
+        self.upload_queue: UploadQueue | None = None
+        if self.conf.get("async_upload", False):
+            self.upload_queue = UploadQueue(
+                self.plugin_data_dir / "upload_queue",
+                handler=self._process_upload_job,
+                notifier=self._notify_upload_result,
+                workers=self.conf.get("upload_workers", 2),
+                per_group=self.conf.get("upload_group_concurrency", 1),
+                max_attempts=self.conf.get("upload_max_attempts", 5),
+            )
+        self._draw = None
+        self._warm_up_task: asyncio.Task | None = None
+        self._initialize_ms = 0.0
+        self._warm_up_ms = 0.0
 
     async def initialize(self) -> None:
+        start = time.perf_counter()
+        self._warm_up_task = asyncio.create_task(
+            self._warm_up(),
+            name="qun-album-预热",
+        )
         self._font_task = asyncio.create_task(
             self._ensure_fonts(),
             name="qun-album-字体下载",
         )
         await self._init_keywords()
+        await asyncio.to_thread(clear_temp_dir, self.ingest_dir)
+        if self.upload_queue is not None:
+            self.upload_queue.start()
+        self._initialize_ms = (time.perf_counter() - start) * 1000
+        logger.info(
+            f"[qun_album] 插件加载完成: 导入 {_IMPORT_MS:.0f}ms"
+            f"，初始化 {self._initialize_ms:.0f}ms"
+        )
+
+    def _load_draw(self):
+        """导入渲染模块（PIL / pilmoji）并应用渲染配置，在工作线程中执行"""
+        emoji_compat.set_cache_dir(self.plugin_data_dir)
+        emoji_compat.install_shim()
+        from .src import draw
+
+        draw.set_text_limits(*self._text_limits)
+        draw.set_render_pool(self.render_pool)
+        draw.set_encode_options(self.encode_options)
+        if self._render_cache_enabled:
+            draw.set_render_cache(self.render_cache)
+        draw.set_avatar_cache(self.avatar_cache)
+        draw.set_stitch_limits(
+            self.conf.get("stitch_max_height", 16000),
+            self.conf.get("stitch_max_pixels", 0),
+        )
+        # 字体缓存按线程划分，这里只预热气泡素材与 emoji 正则
+        draw.warm_up(fonts=False)
+        return draw
+
+    async def _warm_up(self) -> None:
+        start = time.perf_counter()
+        draw = await asyncio.to_thread(self._load_draw)
+        self.render_pool.start(draw.FONT_DIR, *self._text_limits)
+        self._draw = draw
+        self._warm_up_ms = (time.perf_counter() - start) * 1000
+        logger.info(f"[qun_album] 渲染模块预热完成: {self._warm_up_ms:.0f}ms")
+
+    async def _get_draw(self):
+        """返回已完成预热的渲染模块，预热未完成时等待"""
+        if self._draw is None:
+            task = self._warm_up_task
+            if task is None or (
+                task.done() and (task.cancelled() or task.exception() is not None)
+            ):
+                # 上次预热失败时重新预热，而不是每次都拿到同一个异常
+                self._warm_up_task = asyncio.create_task(
+                    self._warm_up(), name="qun-album-预热"
+                )
+            await asyncio.shield(self._warm_up_task)
+        return self._draw
 
     async def _migrate_old_fonts(self) -> None:
         old_dir = Path(__file__).resolve().parent / "resources" / "fonts"
@@ -102,18 +228,7 @@ class AdminPlugin(Star):
                     logger.info(f"[qun_album] 已迁移旧字体: {fname}")
                     migrated = True
         if migrated:
-            draw_module.set_font_dir(self.font_manager.font_dir)
-
-    def _build_backup_path(
-        self, group_id: int, album_id: str, timestamp: str, ext: str
-    ) -> Path:
-        return (
-            self.plugin_data_dir
-            / "backup"
-            / str(group_id)
-            / str(album_id)
-            / f"{timestamp}.{ext}"
-        )
+            await self._apply_font_dir()
 
     def _albums_meta_path(self, group_id: int) -> Path:
         return self.plugin_data_dir / "backup" / str(group_id) / "_albums.json"
@@ -156,79 +271,115 @@ class AdminPlugin(Star):
         await self._migrate_old_fonts()
         ok = await self.font_manager.ensure_fonts()
         if ok:
-            draw_module.set_font_dir(self.font_manager.font_dir)
+            await self._apply_font_dir()
+
+    async def _apply_font_dir(self) -> None:
+        draw_module = await self._get_draw()
+        draw_module.set_font_dir(self.font_manager.font_dir)
+        if self.render_pool.mode == "process":
+            # 进程池的 worker 持有自己的字体缓存，需要按新目录重建
+            self.render_pool.start(self.font_manager.font_dir, *self._text_limits)
 
     async def terminate(self) -> None:
+        if self._warm_up_task is not None and not self._warm_up_task.done():
+            self._warm_up_task.cancel()
         if self._font_task is not None and not self._font_task.done():
             self._font_task.cancel()
             try:
                 await self._font_task
             except asyncio.CancelledError:
                 pass
+        if self.upload_queue is not None:
+            await self.upload_queue.close()
+        await self.album_catalog.close()
+        await self.render_pool.shutdown()
+        await self.http.close()
+        await asyncio.to_thread(self.message_buffer.persist)
+
+    async def _fetch_album_list(self, client, self_id, group_id: int) -> list[dict]:
+        backend = await self.backends.backend(self_id, client)
+        raw_album_list = await self.backends.call(
+            self_id,
+            candidate_actions(ALBUM_LIST_ACTIONS, backend),
+            lambda action: client.api.call_action(action, group_id=group_id),
+        )
+        return normalize_album_list_response(raw_album_list)
+
+    async def _find_album(
+        self, client, self_id, group_id: int, name: str | None
+    ) -> tuple[dict | None, bool]:
+        """从相册目录缓存中按名称查找相册，返回 (相册, 是否来自缓存)"""
+        return await self.album_catalog.find(
+            group_id, name, lambda: self._fetch_album_list(client, self_id, group_id)
+        )
 
-    async def _ensure_backend_detected(self, client) -> None:
-        if client is None:
-            return
-
-        client_id = id(client)
-        if self._backend_client_id == client_id:
+    async def _sync_album_meta(self, group_id: int, albums: list[dict]) -> None:
+        """相册列表刷新后对比 _albums.json，记录相册改名并更新关键词"""
+        meta = self._read_albums_meta(group_id)
+        if not meta:
             return
+        changed = False
+        for album in albums:
+            album_id = str(album.get("album_id"))
+            old = meta.get(album_id)
+            new_name = album_name_of(album)
+            if isinstance(old, dict) and new_name and old.get("name") != new_name:
+                logger.info(f"[qun_album] 检测到相册改名: {old.get('name')} → {new_name}")
+                old["name"] = new_name
+                changed = True
+        if changed:
+            self._write_albums_meta(group_id, meta)
+            await self._init_keywords()
+
+    async def _resolve_upload_target(
+        self, event: AiocqhttpMessageEvent, real_album_name: str | None
+    ) -> dict | None:
+        """解析上传目标相册，返回 {album_id, album_name, lookup_name}；相册不存在时返回 None
 
-        self._backend_client_id = client_id
-        self._backend = "napcat"
-
-        try:
-            version_info = await client.api.call_action("get_version_info")
-            app_name = (
-                version_info.get("app_name") if isinstance(version_info, dict) else None
-            )
-            if (
-                app_name is None
-                and isinstance(version_info, dict)
-                and isinstance(version_info.get("data"), dict)
-            ):
-                app_name = version_info["data"].get("app_name")
-            if app_name == "LLOneBot":
-                self._backend = "llbot"
-            elif app_name == "SnowLuma":
-                self._backend = "snowluma"
-            logger.debug(
-                f"[qun_album] 懒探测协议端完成: "
-                f"app_name={app_name or 'unknown'}, backend={self._backend}"
-            )
-        except Exception as e:
-            logger.warning(f"[qun_album] 懒探测协议端失败，默认按 NapCat 处理: {e}")
+        未指定相册名时使用配置的群默认相册，再退回相册列表第一个。
+        相册均从相册目录缓存中解析；lookup_name 非空表示 album_id 来自缓存，
+        上传失败时要让缓存失效并按名称重新查询一次。
+        """
+        group_id_str = str(event.get_group_id())
 
-    async def _get_album_by_name(
-        self, event: AiocqhttpMessageEvent, name: str | None = None
-    ) -> dict | None:
-        await self._ensure_backend_detected(getattr(event, "bot", None))
-        group_id = int(event.get_group_id())
-        if self._backend in ("llbot", "snowluma"):
-            raw_album_list = await event.bot.api.call_action(
-                "get_group_album_list",
-                group_id=group_id,
-            )
-        else:
-            raw_album_list = await event.bot.get_qun_album_list(group_id=group_id)
+        # Default album fallback from config
+        if not real_album_name:
+            default_albums = self.conf.get("default_albums", [])
+            for entry in default_albums:
+                if str(entry.get("group_id", "")) == group_id_str:
+                    real_album_name = entry.get("album_name", "")
+                    break
 
-        album_list = normalize_album_list_response(raw_album_list)
-        if not album_list:
+        album, cached = await self._find_album(
+            event.bot, event.get_self_id(), int(group_id_str), real_album_name or None
+        )
+        if not album:
+            logger.warning(f"[qun_album] 上传目标相册不存在: {real_album_name}")
             return None
-        if not name:
-            return album_list[0]
-
-        for album in album_list:
-            album_name = album.get("name") or album.get("album_name")
-            if album_name == name:
-                return album
-        return None
+        album_name = album_name_of(album) or real_album_name or ""
+        return {
+            "album_id": album.get("album_id"),
+            "album_name": album_name,
+            "lookup_name": album_name if cached else None,
+        }
+
+    async def _check_level(self, event: AiocqhttpMessageEvent) -> str | None:
+        """群等级不足时返回提示语，否则返回 None"""
+        level_threshold = self.conf.get("level_threshold", 0)
+        is_allowed, current_level = await check_group_level_permission(
+            event,
+            level_threshold,
+            max_age=self.conf.get("permission_cache_seconds", 0),
+        )
+        if is_allowed:
+            return None
+        return f"你的群等级({current_level})不足，需要达到 {level_threshold} 级才能使用此指令"
 
     @filter.event_message_type(filter.EventMessageType.GROUP_MESSAGE)
     @filter.command("上传群相册", alias={"up"})
     async def upload_qun_album(self, event: AiocqhttpMessageEvent):
         """上传群相册"""
-        await self._ensure_backend_detected(getattr(event, "bot", None))
+        backend = await self.backends.backend(event.get_self_id(), event.bot)
         parts = event.message_str.strip().split()
 
         real_count = None
@@ -243,149 +394,576 @@ class AdminPlugin(Star):
         elif len(parts) == 2:
             real_album_name = parts[1]
 
-        group_id_str = str(event.get_group_id())
-
-        # Default album fallback from config
-        resolved_from_config = False
-        if not real_album_name:
-            default_albums = self.conf.get("default_albums", [])
-            for entry in default_albums:
-                if str(entry.get("group_id", "")) == group_id_str:
-                    real_album_name = entry.get("album_name", "")
-                    resolved_from_config = True
-                    break
-
-        # Resolve album ID (with caching for config-resolved names)
-        used_cache = False
-        if real_album_name:
-            cached = self._default_album_cache.get(group_id_str, {})
-            if cached.get("album_name") == real_album_name:
-                album_id = cached["album_id"]
-                resolved_album_name = real_album_name
-                used_cache = True
-            else:
-                album = await self._get_album_by_name(event, real_album_name)
-                if not album:
-                    logger.warning(f"[qun_album] 上传目标相册不存在: {real_album_name}")
-                    yield event.plain_result("该相册不存在")
-                    return
-                album_id = album.get("album_id")
-                resolved_album_name = (
-                    album.get("name") or album.get("album_name") or real_album_name
-                )
-                if resolved_from_config:
-                    self._default_album_cache[group_id_str] = {
-                        "album_name": real_album_name,
-                        "album_id": album_id,
-                    }
-        else:
-            album = await self._get_album_by_name(event, None)
-            if not album:
-                logger.warning(f"[qun_album] 上传目标相册不存在: {real_album_name}")
-                yield event.plain_result("该相册不存在")
-                return
-            album_id = album.get("album_id")
-            resolved_album_name = album.get("name") or album.get("album_name") or ""
+        target = await self._resolve_upload_target(event, real_album_name)
+        if target is None:
+            yield event.plain_result("该相册不存在")
+            return
 
-        level_threshold = self.conf.get("level_threshold", 0)
         show_title = self.conf.get("show_title", True)
-
-        is_allowed, current_level = await check_group_level_permission(
-            event,
-            level_threshold,
-        )
-
-        if not is_allowed:
-            yield event.plain_result(
-                f"你的群等级({current_level})不足，需要达到 {level_threshold} 级才能使用此指令"
-            )
+        if refusal := await self._check_level(event):
+            yield event.plain_result(refusal)
             return
 
+        skipped: list[dict] = []
         if real_count:
+            max_count = self.conf.get("stitch_max_messages", 100)
+            if max_count > 0 and real_count > max_count:
+                yield event.plain_result(
+                    f"单次最多拼接 {max_count} 条消息，已按 {max_count} 条处理"
+                )
+                real_count = max_count
             messages = await get_message_history(event, real_count)
             if not messages:
                 yield event.plain_result("获取历史消息失败，请确保是回复消息且消息存在")
                 return
-            image = await draw_module.generate_stitched_meme(
-                event, messages, show_title=show_title
+            draw_module = await self._get_draw()
+            images = draw_module.iter_stitched_pages(
+                event, messages, show_title=show_title, skipped=skipped
             )
         else:
-            image = await get_first_image(event) or await draw_module.generate_meme(
-                event, show_title=show_title
+            image = await ingest_first_image(
+                event, self.ingest_dir, max_bytes=self.http.max_bytes
             )
+            if image:
+                image = await self._fit_image(image)
+                matches = await self._find_near_duplicates(
+                    int(event.get_group_id()), image
+                )
+                if matches:
+                    distance, entry = matches[0]
+                    hint = f"相册中已有相似图片（差异 {distance}）: {entry.file}"
+                    if self.conf.get("near_duplicate_action", "off") == "skip":
+                        image.path.unlink(missing_ok=True)
+                        event.stop_event()
+                        yield event.plain_result(f"{hint}，已跳过上传")
+                        return
+                    yield event.plain_result(f"{hint}，仍继续上传")
+            else:
+                draw_module = await self._get_draw()
+                try:
+                    image = await draw_module.generate_meme(
+                        event, show_title=show_title
+                    )
+                except (RenderQueueFull, asyncio.TimeoutError):
+                    yield event.plain_result(RENDER_BUSY_HINT)
+                    return
+            images = self._single_image(image)
+
+        group_id = int(event.get_group_id())
+        use_backup = self.conf.get("backup_media", False)
+        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
 
-        if not image:
+        if self.upload_queue is not None:
+            paths = []
+            try:
+                async for image in images:
+                    handle = await self._save_upload_file(
+                        image, group_id, target["album_id"], timestamp, len(paths)
+                    )
+                    paths.append(handle.path)
+                    del image
+            except (RenderQueueFull, asyncio.TimeoutError):
+                if not use_backup:
+                    for path in paths:
+                        path.unlink(missing_ok=True)
+                yield event.plain_result(RENDER_BUSY_HINT)
+                return
+            if not paths:
+                yield event.plain_result("需引用图片/文字")
+                return
+            job = UploadJob(
+                job_id=UploadQueue.new_job_id(),
+                self_id=str(event.get_self_id()),
+                group_id=group_id,
+                album_id=str(target["album_id"]),
+                album_name=target["album_name"],
+                backend=backend,
+                paths=[str(p) for p in paths],
+                backup=use_backup,
+                lookup_name=target["lookup_name"],
+            )
+            ahead = await self.upload_queue.submit(job, event.bot)
+            event.stop_event()
+            queue_hint = f"，前面还有 {ahead} 个任务" if ahead else ""
+            yield event.plain_result(
+                f"已加入上传队列{queue_hint}，完成后会通知" + _skipped_hint(skipped)
+            )
+            return
+
+        uploaded = 0
+        try:
+            async for image in images:
+                handle = await self._save_upload_file(
+                    image, group_id, target["album_id"], timestamp, uploaded
+                )
+                save_path = handle.path
+                del image
+
+                await self._upload_with_refresh(
+                    event.bot,
+                    event.get_self_id(),
+                    group_id,
+                    target,
+                    save_path,
+                    backend,
+                )
+
+                uploaded += 1
+                logger.info(f"[qun_album] 上传图片到相册 {target['album_name']} 成功")
+                if not use_backup:
+                    os.remove(save_path)
+        except (RenderQueueFull, asyncio.TimeoutError):
+            done_hint = f"已上传 {uploaded} 张，其余未上传；" if uploaded else ""
+            yield event.plain_result(done_hint + RENDER_BUSY_HINT)
+            return
+
+        if not uploaded:
             yield event.plain_result("需引用图片/文字")
             return
 
-        group_id = int(event.get_group_id())
-        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        ext = detect_image_ext(image)
-        use_backup = self.conf.get("backup_media", False)
+        event.stop_event()
+        if uploaded > 1:
+            logger.info(f"[qun_album] 拼接图超出单张上限，已分 {uploaded} 张上传")
+        if skipped:
+            yield event.plain_result("已上传" + _skipped_hint(skipped))
 
         if use_backup:
-            save_path = self._build_backup_path(group_id, str(album_id), timestamp, ext)
-        else:
-            save_path = self.plugin_data_dir / f"{group_id}_{timestamp}.{ext}"
+            await self._record_album_meta(
+                group_id, target["album_id"], target["album_name"]
+            )
 
-        save_path.parent.mkdir(parents=True, exist_ok=True)
-        with save_path.open("wb") as f:
-            f.write(image)
+    async def _save_upload_file(
+        self,
+        image: bytes | ImageHandle,
+        group_id: int,
+        album_id,
+        timestamp: str,
+        index: int,
+    ) -> ImageHandle:
+        """把待上传图片放入备份存储或临时文件位置；已落盘的图片直接移动"""
+        if isinstance(image, bytes):
+            image = await asyncio.to_thread(save_bytes, image, self.ingest_dir)
+        # 拼接图按页依次上传，同一秒内的多页以序号区分
+        name = f"{timestamp}_{index + 1}" if index else timestamp
+        logger.info(
+            f"[qun_album] 待上传图片: 格式={image.ext}, 大小={image.size} bytes"
+        )
+
+        if self.conf.get("backup_media", False):
+            backup_path = await asyncio.to_thread(
+                self.backup_store.add, image, group_id, album_id, name
+            )
+            image.path = backup_path
+            await self._index_near_duplicate(image, group_id, album_id)
+            return image
+        save_path = self.plugin_data_dir / staging_name(f"{group_id}_{name}", image)
+        return await asyncio.to_thread(image.move_to, save_path)
+
+    async def _find_near_duplicates(self, group_id: int, image: ImageHandle) -> list:
+        """在本群备份的感知哈希索引中查找相似图片，未启用时返回空列表"""
+        if self.conf.get("near_duplicate_action", "off") == "off":
+            return []
+        try:
+            value = await asyncio.to_thread(dhash, image.path)
+            return await asyncio.to_thread(
+                self.near_dup_index.query,
+                group_id,
+                value,
+                self.conf.get("near_duplicate_distance", 6),
+            )
+        except Exception as e:
+            logger.warning(f"[qun_album] 相似图片检查失败，继续上传: {e}")
+            return []
 
-        # Upload with retry on cached album_id failure
+    async def _index_near_duplicate(
+        self, image: ImageHandle, group_id: int, album_id
+    ) -> None:
+        """把刚备份的图片加入感知哈希索引"""
         try:
-            await upload_album_image_with_fallback(
-                event=event,
-                raw_group_id=group_id,
-                raw_album_id=album_id,
-                album_name=resolved_album_name,
-                save_path=save_path,
-                backend=self._backend,
+            value = await asyncio.to_thread(dhash, image.path)
+            await asyncio.to_thread(
+                self.near_dup_index.add,
+                group_id,
+                image.sha256,
+                value,
+                album_id,
+                image.path.name,
             )
+        except Exception as e:
+            logger.debug(f"[qun_album] 计算感知哈希失败: {e}")
+
+    async def _fit_image(self, image: ImageHandle) -> ImageHandle:
+        """图片超出输出大小预算时重新编码，否则原样返回"""
+        max_bytes = self.encode_options.max_bytes
+        if not max_bytes or image.size <= max_bytes:
+            return image
+        data = await asyncio.to_thread(image.read_bytes)
+        fitted = await asyncio.to_thread(fit_bytes, data, self.encode_options)
+        del data
+        if fitted is None:
+            return image
+        logger.info(
+            f"[qun_album] 图片超出大小预算，已重新编码: "
+            f"{image.size} → {len(fitted.data)} bytes"
+        )
+        image.path.unlink(missing_ok=True)
+        return await asyncio.to_thread(save_bytes, fitted.data, self.ingest_dir)
+
+    async def _upload_with_refresh(
+        self,
+        client,
+        self_id,
+        group_id: int,
+        target: dict,
+        save_path: Path,
+        backend: str,
+    ) -> None:
+        """上传一张图片；album_id 来自缓存且上传失败时，刷新一次相册 ID 再重试"""
+        try:
+            await upload_album_image(
+                client,
+                self_id,
+                group_id,
+                target["album_id"],
+                target["album_name"],
+                save_path,
+                backend=backend,
+            )
+            return
         except Exception:
-            if used_cache:
-                logger.info(
-                    f"[qun_album] 缓存相册 ID 上传失败，尝试刷新: {group_id_str}/{real_album_name}"
-                )
-                self._default_album_cache.pop(group_id_str, None)
-                album = await self._get_album_by_name(event, real_album_name)
-                if album:
-                    album_id = album.get("album_id")
-                    resolved_album_name = (
-                        album.get("name")
-                        or album.get("album_name")
-                        or real_album_name
-                        or ""
-                    )
-                    await upload_album_image_with_fallback(
-                        event=event,
-                        raw_group_id=group_id,
-                        raw_album_id=album_id,
-                        album_name=resolved_album_name,
-                        save_path=save_path,
-                        backend=self._backend,
-                    )
-                else:
-                    raise
-            else:
+            if not await self._refresh_target(client, self_id, group_id, target):
                 raise
+        await upload_album_image(
+            client,
+            self_id,
+            group_id,
+            target["album_id"],
+            target["album_name"],
+            save_path,
+            backend=backend,
+        )
 
-        event.stop_event()
-        logger.info(f"[qun_album] 上传图片到相册 {resolved_album_name} 成功")
+    async def _refresh_target(
+        self, client, self_id, group_id: int, target: dict
+    ) -> bool:
+        """按名称重新查询缓存的相册 ID 并写回 target；无需或无法刷新时返回 False"""
+        lookup_name = target.get("lookup_name")
+        if not lookup_name:
+            return False
+        logger.info(
+            f"[qun_album] 缓存相册 ID 上传失败，尝试刷新: {group_id}/{lookup_name}"
+        )
+        target["lookup_name"] = None
+        self.album_catalog.invalidate(group_id)
+        album, _ = await self._find_album(client, self_id, group_id, lookup_name)
+        if not album:
+            return False
+        target["album_id"] = album.get("album_id")
+        target["album_name"] = album_name_of(album) or lookup_name
+        return True
+
+    async def _record_album_meta(
+        self, group_id: int, album_id, album_name: str
+    ) -> None:
+        """备份模式下更新相册元数据（检测改名）并刷新关键词"""
+        meta = self._read_albums_meta(group_id)
+        old = meta.get(str(album_id))
+        if old and isinstance(old, dict) and old.get("name") != album_name:
+            logger.info(f"[qun_album] 检测到相册改名: {old['name']} → {album_name}")
+        meta[str(album_id)] = {"name": album_name}
+        self._write_albums_meta(group_id, meta)
+        await self._init_keywords()
 
-        if not use_backup:
-            os.remove(save_path)
+    async def _process_upload_job(self, job: UploadJob, client) -> None:
+        """上传队列的任务处理：从上次完成的位置继续，每张完成后落盘进度"""
+        target = {
+            "album_id": job.album_id,
+            "album_name": job.album_name,
+            "lookup_name": job.lookup_name,
+        }
+        while job.done < len(job.paths):
+            save_path = Path(job.paths[job.done])
+            await self._upload_with_refresh(
+                client, job.self_id, job.group_id, target, save_path, job.backend
+            )
+            if not job.backup:
+                save_path.unlink(missing_ok=True)
+            job.done += 1
+            job.album_id = str(target["album_id"])
+            job.album_name = target["album_name"]
+            job.lookup_name = target["lookup_name"]
+            await asyncio.to_thread(self.upload_queue.save, job)
+        logger.info(
+            f"[qun_album] 上传任务 {job.job_id} 完成: {len(job.paths)} 张"
+            f" → 相册 {job.album_name}"
+        )
+        if job.backup:
+            await self._record_album_meta(job.group_id, job.album_id, job.album_name)
+
+    async def _notify_upload_result(
+        self, job: UploadJob, client, error: str | None
+    ) -> None:
+        if error is None:
+            text = f"已上传到群相册「{job.album_name}」"
+            if len(job.paths) > 1:
+                text += f"（共 {len(job.paths)} 张）"
+        else:
+            text = f"上传到群相册「{job.album_name}」失败: {error}"
+            if not job.backup:
+                for path in job.paths[job.done :]:
+                    Path(path).unlink(missing_ok=True)
+        await client.send_group_msg(group_id=job.group_id, message=text)
+
+    @filter.event_message_type(filter.EventMessageType.GROUP_MESSAGE)
+    @filter.command("批量上传群相册", alias={"upall"})
+    async def upload_qun_album_batch(self, event: AiocqhttpMessageEvent):
+        """把引用消息、当前消息及其中合并转发里的所有图片上传到同一个群相册"""
+        backend = await self.backends.backend(event.get_self_id(), event.bot)
+        parts = event.message_str.strip().split()
+        target = await self._resolve_upload_target(
+            event, " ".join(parts[1:]) or None
+        )
+        if target is None:
+            yield event.plain_result("该相册不存在")
+            return
+        if refusal := await self._check_level(event):
+            yield event.plain_result(refusal)
             return
 
-        meta = self._read_albums_meta(group_id)
-        old = meta.get(str(album_id))
-        if old and isinstance(old, dict) and old.get("name") != resolved_album_name:
-            logger.info(
-                f"[qun_album] 检测到相册改名: {old['name']} → {resolved_album_name}"
+        images = await collect_images(
+            event,
+            self.ingest_dir,
+            limit=self.conf.get("batch_max_images", 50),
+            max_bytes=self.http.max_bytes,
+        )
+        if not images:
+            yield event.plain_result("未找到可上传的图片")
+            return
+
+        group_id = int(event.get_group_id())
+        use_backup = self.conf.get("backup_media", False)
+        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+        paths = []
+        for index, image in enumerate(images):
+            image = await self._fit_image(image)
+            handle = await self._save_upload_file(
+                image, group_id, target["album_id"], timestamp, index
             )
-        meta[str(album_id)] = {"name": resolved_album_name}
-        self._write_albums_meta(group_id, meta)
+            paths.append(handle.path)
+
+        results = await upload_album_images(
+            event.bot,
+            event.get_self_id(),
+            group_id,
+            target["album_id"],
+            target["album_name"],
+            paths,
+            backend=backend,
+        )
+        failed = [i for i, error in enumerate(results) if error is not None]
+        if failed and await self._refresh_target(
+            event.bot, event.get_self_id(), group_id, target
+        ):
+            retried = await upload_album_images(
+                event.bot,
+                event.get_self_id(),
+                group_id,
+                target["album_id"],
+                target["album_name"],
+                [paths[i] for i in failed],
+                backend=backend,
+            )
+            for i, error in zip(failed, retried):
+                results[i] = error
+            failed = [i for i, error in enumerate(results) if error is not None]
+
+        if not use_backup:
+            for path in paths:
+                path.unlink(missing_ok=True)
+        event.stop_event()
+
+        uploaded = len(paths) - len(failed)
+        logger.info(
+            f"[qun_album] 批量上传到相册 {target['album_name']}: "
+            f"成功 {uploaded}，失败 {len(failed)}"
+        )
+        if failed:
+            logger.warning(f"[qun_album] 批量上传失败示例: {results[failed[0]]}")
+        if uploaded and use_backup:
+            await self._record_album_meta(
+                group_id, target["album_id"], target["album_name"]
+            )
+        if not uploaded:
+            yield event.plain_result(f"上传失败: {results[failed[0]]}")
+        elif failed:
+            yield event.plain_result(
+                f"已上传 {uploaded} 张到「{target['album_name']}」，{len(failed)} 张失败"
+            )
+        else:
+            yield event.plain_result(
+                f"已上传 {uploaded} 张到「{target['album_name']}」"
+            )
+
+    @staticmethod
+    async def _single_image(image: bytes | ImageHandle | None):
+        if image:
+            yield image
+
+    @filter.permission_type(filter.PermissionType.ADMIN)
+    @filter.command("群相册状态")
+    async def album_stats(self, event: AstrMessageEvent):
+        """查看群相册插件运行状态"""
+        draw_module = await self._get_draw()
+        font_stats = draw_module.font_cache_stats()
+        lines = [
+            "[群相册状态]",
+            f"加载耗时: 导入 {_IMPORT_MS:.0f}ms，初始化 {self._initialize_ms:.0f}ms"
+            f"，预热 {self._warm_up_ms:.0f}ms",
+            f"字体缓存: 命中 {font_stats['hits']} / 未命中 {font_stats['misses']}"
+            f"，已加载 {font_stats['size']}/{font_stats['maxsize']}",
+        ]
+        pool_stats = self.render_pool.stats()
+        lines.append(
+            f"渲染池: {pool_stats['mode']}，排队 {pool_stats['queue_depth']}"
+            f"，执行中 {pool_stats['in_flight']}，完成 {pool_stats['completed']}"
+            f"，失败 {pool_stats['failed']}，超时 {pool_stats['timed_out']}"
+            f"，拒绝 {pool_stats['rejected']}"
+        )
+        lines.append(
+            f"渲染耗时: 平均 {pool_stats['avg_ms']:.0f}ms"
+            f" / P95 {pool_stats['p95_ms']:.0f}ms / 最大 {pool_stats['max_ms']:.0f}ms"
+        )
+        cache_stats = self.render_cache.stats()
+        lookups = (
+            cache_stats["memory_hits"] + cache_stats["disk_hits"] + cache_stats["misses"]
+        )
+        hit_rate = (
+            (cache_stats["memory_hits"] + cache_stats["disk_hits"]) / lookups * 100
+            if lookups
+            else 0.0
+        )
+        lines.append(
+            f"渲染缓存: 命中率 {hit_rate:.1f}%（内存 {cache_stats['memory_hits']}"
+            f" / 磁盘 {cache_stats['disk_hits']} / 未命中 {cache_stats['misses']}）"
+            f"，内存 {cache_stats['memory_entries']} 项"
+            f" {cache_stats['memory_bytes'] / 1024 / 1024:.1f}MB"
+            f"，磁盘 {cache_stats['disk_entries']} 项"
+            f" {cache_stats['disk_bytes'] / 1024 / 1024:.1f}MB"
+        )
+        avatar_stats = self.avatar_cache.stats()
+        lines.append(
+            f"头像缓存: {avatar_stats['memory_entries']} 项"
+            f"（磁盘 {avatar_stats['disk_entries']} 项），内存命中 {avatar_stats['memory_hits']}"
+            f"，磁盘命中 {avatar_stats['disk_hits']}，304 {avatar_stats['not_modified']}"
+            f"，下载 {avatar_stats['downloads']}，失败 {avatar_stats['failures']}"
+        )
+        member_stats = self.member_cache.stats()
+        lines.append(
+            f"成员缓存: {member_stats['entries']} 项，命中 {member_stats['hits']}"
+            f"，未命中 {member_stats['misses']}"
+            f"，批量预热 {member_stats['bulk_loads']} 次"
+            f"，@昵称命中 {member_stats['name_hits']} / 未命中 {member_stats['name_misses']}"
+        )
+        buffer_stats = self.message_buffer.stats()
+        lookups = buffer_stats["hits"] + buffer_stats["misses"]
+        lines.append(
+            f"消息缓冲: {buffer_stats['groups']} 个群 {buffer_stats['entries']} 条"
+            f"，命中率 {buffer_stats['hits'] / lookups * 100 if lookups else 0.0:.1f}%"
+            f"（命中 {buffer_stats['hits']} / 未命中 {buffer_stats['misses']}）"
+        )
+        if self.upload_queue is not None:
+            queue_stats = self.upload_queue.stats()
+            lines.append(
+                f"上传队列: 等待 {queue_stats['pending']}，执行中 {queue_stats['running']}"
+                f"，完成 {queue_stats['completed']}，失败 {queue_stats['failed']}"
+                f"，重试 {queue_stats['retries']}"
+                + (
+                    f"，{queue_stats['no_client']} 个等待机器人连接"
+                    if queue_stats["no_client"]
+                    else ""
+                )
+            )
+        catalog_stats = self.album_catalog.stats()
+        lines.append(
+            f"相册目录: {catalog_stats['groups']} 个群 {catalog_stats['albums']} 个相册"
+            f"，命中 {catalog_stats['hits']}，拉取 {catalog_stats['fetches']}"
+        )
+        backend_stats = self.backends.stats()
+        lines.append(
+            "协议端: "
+            + (
+                "，".join(f"{k}={v}" for k, v in backend_stats["clients"].items())
+                or "未探测"
+            )
+            + f"（探测 {backend_stats['probes']} 次）"
+        )
+        for self_id, actions in backend_stats["unsupported"].items():
+            lines.append(f"  {self_id} 不支持的接口: {', '.join(actions)}")
+        dup_stats = self.near_dup_index.stats()
+        lines.append(
+            f"相似图片索引: {dup_stats['groups']} 个群 {dup_stats['entries']} 张"
+            f"，查询 {dup_stats['queries']}，发现相似 {dup_stats['matches']}"
+        )
+        upload_stats = get_upload_tracker().stats()
+        for mode, counter in upload_stats["modes"].items():
+            lines.append(
+                f"上传模式 {mode}: 成功 {counter['success']}，失败 {counter['failure']}"
+                f"，平均 {counter['avg_ms']:.0f}ms"
+            )
+        for client, mode in upload_stats["preferred"].items():
+            lines.append(f"当前优先模式 {client}: {mode}")
+        yield event.plain_result("\n".join(lines))
+
+    @filter.permission_type(filter.PermissionType.ADMIN)
+    @filter.command("迁移群相册备份")
+    async def migrate_backup(self, event: AstrMessageEvent):
+        """把已有备份迁移到按内容去重的存储，并报告回收的空间"""
+        yield event.plain_result("开始迁移备份，文件较多时需要一些时间…")
+        report = await asyncio.to_thread(self.backup_store.migrate)
         await self._init_keywords()
+        yield event.plain_result(
+            f"备份迁移完成: 扫描 {report.scanned} 个文件"
+            f"，合并相同内容 {report.linked} 个，删除相册内重复 {report.duplicates} 个"
+            f"，清理无引用本体 {report.swept} 个"
+            f"，回收 {report.reclaimed_bytes / 1024 / 1024:.1f}MB"
+            + (f"，失败 {report.errors} 个（详见日志）" if report.errors else "")
+            + (
+                ""
+                if report.hardlinks
+                else "\n备份目录不支持硬链接，图片直接保存在相册目录，仅在相册内去重"
+            )
+        )
+
+    @filter.permission_type(filter.PermissionType.ADMIN)
+    @filter.command("索引群相册备份")
+    async def index_backup(self, event: AstrMessageEvent):
+        """为已有备份批量计算感知哈希，供相似图片检查使用"""
+        yield event.plain_result("开始为备份建立相似图片索引，文件较多时需要一些时间…")
+        start = time.perf_counter()
+        stats = await asyncio.to_thread(self.near_dup_index.rebuild)
+        yield event.plain_result(
+            f"索引完成: {stats['groups']} 个群，新增 {stats['indexed']} 张"
+            f"，已有 {stats['skipped']} 张，清理失效 {stats['pruned']} 张"
+            + (f"，失败 {stats['errors']} 张（详见日志）" if stats["errors"] else "")
+            + f"，耗时 {time.perf_counter() - start:.1f}s"
+        )
+
+    @filter.event_message_type(filter.EventMessageType.GROUP_MESSAGE)
+    async def on_group_message_record(self, event: AstrMessageEvent):
+        """记录机器人客户端供上传队列使用，并把群消息写入本地消息缓冲区"""
+        if not isinstance(event, AiocqhttpMessageEvent):
+            return
+        if self.upload_queue is not None:
+            self.upload_queue.register_client(event.get_self_id(), event.bot)
+        if self.message_buffer.size <= 0:
+            return
+        raw = getattr(event.message_obj, "raw_message", None)
+        if not isinstance(raw, dict):
+            return
+        group_id = event.get_group_id()
+        entry = buffered_message_from_raw(raw)
+        if group_id and entry is not None:
+            self.message_buffer.record(int(group_id), entry)
 
     @filter.event_message_type(filter.EventMessageType.GROUP_MESSAGE)
     async def on_random_album_keyword(self, event: AstrMessageEvent):
@@ -419,8 +997,7 @@ class AdminPlugin(Star):
         files = [
             f
             for f in album_dir.iterdir()
-            if f.is_file()
-            and f.suffix.lower() in (".png", ".jpg", ".jpeg", ".gif", ".webp")
+            if f.is_file() and f.suffix.lower() in IMAGE_SUFFIXES
         ]
         if not files:
             return
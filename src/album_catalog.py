@@ -0,0 +1,124 @@
+import asyncio
+import time
+from dataclasses import dataclass, field
+from typing import Awaitable, Callable
+
+from astrbot.api import logger
+
+from .single_flight import SingleFlight
+
+AlbumFetcher = Callable[[], Awaitable[list[dict]]]
+RefreshListener = Callable[[int, list[dict]], Awaitable[None]]
+
+
+def album_name_of(album: dict) -> str:
+    return album.get("name") or album.get("album_name") or ""
+
+
+@dataclass
+class GroupAlbums:
+    """某个群的相册列表快照及名称索引"""
+
+    albums: list[dict]
+    fetched_at: float
+    by_name: dict[str, dict] = field(default_factory=dict)
+
+    def __post_init__(self):
+        for album in self.albums:
+            # 同名相册以列表中靠前的为准，与逐个扫描的旧行为一致
+            self.by_name.setdefault(album_name_of(album), album)
+
+    def find(self, name: str | None) -> dict | None:
+        if not name:
+            return self.albums[0] if self.albums else None
+        return self.by_name.get(name)
+
+
+class AlbumCatalog:
+    """按群缓存相册列表，提供 名称 → 相册 的索引
+
+    缓存未过期时直接返回；过期后先返回旧数据并在后台刷新。
+    同一个群的并发刷新只请求一次。每次刷新后通知 on_refresh（用于检测相册改名）。
+    上传因相册 ID 失效而失败时调用 invalidate 让下一次查询重新拉取。
+    """
+
+    def __init__(
+        self,
+        ttl: float = 600,
+        miss_refresh_interval: float = 30,
+        on_refresh: RefreshListener | None = None,
+    ):
+        self.ttl = ttl
+        self.miss_refresh_interval = miss_refresh_interval
+        self.on_refresh = on_refresh
+        self._groups: dict[int, GroupAlbums] = {}
+        self._inflight: SingleFlight[GroupAlbums] = SingleFlight()
+        self._background: set[asyncio.Task] = set()
+        self.hits = 0
+        self.fetches = 0
+
+    async def _refresh(self, group_id: int, fetch: AlbumFetcher) -> GroupAlbums:
+        async def load() -> GroupAlbums:
+            self.fetches += 1
+            entry = GroupAlbums(await fetch(), time.time())
+            self._groups[group_id] = entry
+            if self.on_refresh is not None:
+                try:
+                    await self.on_refresh(group_id, entry.albums)
+                except Exception as e:
+                    logger.warning(f"[qun_album] 处理相册列表更新失败: {e}")
+            return entry
+
+        return await self._inflight.run(group_id, load)
+
+    def _refresh_in_background(self, group_id: int, fetch: AlbumFetcher) -> None:
+        if group_id in self._inflight:
+            return
+
+        async def run():
+            try:
+                await self._refresh(group_id, fetch)
+            except Exception as e:
+                logger.warning(f"[qun_album] 后台刷新群 {group_id} 相册列表失败: {e}")
+
+        task = asyncio.create_task(run())
+        self._background.add(task)
+        task.add_done_callback(self._background.discard)
+
+    async def find(
+        self, group_id: int, name: str | None, fetch: AlbumFetcher
+    ) -> tuple[dict | None, bool]:
+        """按名称查找相册（name 为空时取第一个），返回 (相册, 是否来自缓存)
+
+        缓存中找不到该名称且快照已超过 miss_refresh_interval 秒时，会重新拉取一次，
+        以便识别刚创建或刚改名的相册。
+        """
+        entry = self._groups.get(group_id)
+        if entry is not None:
+            age = time.time() - entry.fetched_at
+            album = entry.find(name)
+            if album is not None:
+                self.hits += 1
+                if age > self.ttl:
+                    self._refresh_in_background(group_id, fetch)
+                return album, True
+            if age < self.miss_refresh_interval:
+                return None, True
+        entry = await self._refresh(group_id, fetch)
+        return entry.find(name), False
+
+    def invalidate(self, group_id: int) -> None:
+        self._groups.pop(group_id, None)
+
+    async def close(self) -> None:
+        for task in list(self._background):
+            task.cancel()
+        await asyncio.gather(*self._background, return_exceptions=True)
+
+    def stats(self) -> dict:
+        return {
+            "groups": len(self._groups),
+            "albums": sum(len(e.albums) for e in self._groups.values()),
+            "hits": self.hits,
+            "fetches": self.fetches,
+        }
@@ -0,0 +1,245 @@
+import asyncio
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from pathlib import Path
+from typing import TYPE_CHECKING
+
+from astrbot.api import logger
+
+from .http_client import get_http_client
+from .single_flight import SingleFlight
+
+if TYPE_CHECKING:
+    from PIL import Image
+
+AVATAR_URL = "https://q4.qlogo.cn/headimg_dl?dst_uin={user_id}&spec={spec}"
+# 渲染尺寸为 135px，优先请求不小于该尺寸的最小规格，失败再退回原图
+AVATAR_SPECS = (140, 640)
+AVATAR_MAX_BYTES = 2 * 1024 * 1024
+
+
+@dataclass
+class Avatar:
+    """已裁成圆形的 135px 头像及其原始数据摘要"""
+
+    image: "Image.Image"
+    digest: str
+    fetched_at: float
+
+
+class AvatarCache:
+    """头像缓存
+
+    内存层：按 QQ 号缓存已缩放并裁圆的 RGBA 头像（LRU）。
+    磁盘层：保存原始图片字节与 ETag / Last-Modified，超过 TTL 后用条件请求刷新，
+    CDN 返回 304 时直接沿用本地数据；刷新失败时退回过期数据。
+    磁盘层最多保留 max_disk_entries 个 QQ 号（0 为不限制），按最近访问时间淘汰。
+    """
+
+    def __init__(
+        self,
+        cache_dir: Path | None = None,
+        ttl: float = 24 * 3600,
+        max_memory_entries: int = 256,
+        max_disk_entries: int = 2000,
+    ):
+        self.cache_dir = cache_dir
+        self.ttl = ttl
+        self.max_memory_entries = max_memory_entries
+        self.max_disk_entries = max_disk_entries
+        self._memory: OrderedDict[str, Avatar] = OrderedDict()
+        # QQ 号按最近访问排序，首次访问磁盘层时按元数据文件的修改时间建立
+        self._disk_index: OrderedDict[str, None] | None = None
+        self._lock = threading.Lock()
+        self._inflight: SingleFlight[Avatar | None] = SingleFlight()
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.not_modified = 0
+        self.downloads = 0
+        self.failures = 0
+
+    # ---------- 磁盘层 ----------
+
+    def _paths(self, user_id: str) -> tuple[Path, Path]:
+        base = self.cache_dir / user_id[-2:]
+        return base / f"{user_id}.img", base / f"{user_id}.json"
+
+    def _load_disk_index(self) -> OrderedDict[str, None]:
+        if self._disk_index is not None:
+            return self._disk_index
+        entries = []
+        if self.cache_dir.is_dir():
+            for path in self.cache_dir.glob("*/*.json"):
+                try:
+                    entries.append((path.stat().st_mtime, path.stem))
+                except OSError:
+                    continue
+        entries.sort()
+        self._disk_index = OrderedDict((user_id, None) for _, user_id in entries)
+        return self._disk_index
+
+    def _touch(self, user_id: str) -> list[str]:
+        """标记最近访问，返回需要淘汰的 QQ 号"""
+        evicted = []
+        with self._lock:
+            index = self._load_disk_index()
+            index[user_id] = None
+            index.move_to_end(user_id)
+            while self.max_disk_entries and len(index) > self.max_disk_entries:
+                old_id, _ = index.popitem(last=False)
+                evicted.append(old_id)
+        return evicted
+
+    def _read_disk(self, user_id: str) -> tuple[bytes, dict] | None:
+        if self.cache_dir is None:
+            return None
+        data_path, meta_path = self._paths(user_id)
+        try:
+            meta = json.loads(meta_path.read_text(encoding="utf-8"))
+            data = data_path.read_bytes()
+            os.utime(meta_path)
+        except (OSError, ValueError):
+            return None
+        self._touch(user_id)
+        return data, meta
+
+    def _write_disk(self, user_id: str, data: bytes | None, meta: dict) -> None:
+        if self.cache_dir is None:
+            return
+        data_path, meta_path = self._paths(user_id)
+        try:
+            data_path.parent.mkdir(parents=True, exist_ok=True)
+            if data is not None:
+                tmp = data_path.with_name(data_path.name + ".tmp")
+                tmp.write_bytes(data)
+                os.replace(tmp, data_path)
+            meta_path.write_text(json.dumps(meta), encoding="utf-8")
+        except OSError as e:
+            logger.warning(f"[qun_album] 写入头像缓存失败: {e}")
+            return
+        for old_id in self._touch(user_id):
+            for path in self._paths(old_id):
+                try:
+                    path.unlink()
+                except OSError:
+                    pass
+
+    # ---------- 内存层 ----------
+
+    def _remember(self, user_id: str, avatar: Avatar) -> Avatar:
+        self._memory[user_id] = avatar
+        self._memory.move_to_end(user_id)
+        while len(self._memory) > self.max_memory_entries:
+            self._memory.popitem(last=False)
+        return avatar
+
+    async def _build(self, user_id: str, data: bytes, fetched_at: float) -> Avatar:
+        from .draw import prepare_avatar
+
+        image = await asyncio.to_thread(prepare_avatar, data)
+        digest = hashlib.sha256(data).hexdigest()
+        return self._remember(user_id, Avatar(image, digest, fetched_at))
+
+    # ---------- 网络 ----------
+
+    async def _download(
+        self, user_id: str, meta: dict | None
+    ) -> tuple[int, bytes, dict]:
+        """返回 (状态码, 数据, 新元数据)；304 时数据为空"""
+        client = get_http_client()
+        last_error: Exception | None = None
+        specs = AVATAR_SPECS
+        if meta and meta.get("spec") in AVATAR_SPECS:
+            specs = (meta["spec"],)
+        for spec in specs:
+            headers = {}
+            if meta and meta.get("spec") == spec:
+                if meta.get("etag"):
+                    headers["If-None-Match"] = meta["etag"]
+                if meta.get("last_modified"):
+                    headers["If-Modified-Since"] = meta["last_modified"]
+            url = AVATAR_URL.format(user_id=user_id, spec=spec)
+            try:
+                status, resp_headers, data = await client.request(
+                    url, headers=headers, max_bytes=AVATAR_MAX_BYTES
+                )
+            except Exception as e:
+                last_error = e
+                continue
+            if status == 304 or (status == 200 and data):
+                new_meta = {
+                    "spec": spec,
+                    "etag": resp_headers.get("etag"),
+                    "last_modified": resp_headers.get("last-modified"),
+                    "fetched_at": time.time(),
+                }
+                if status == 304:
+                    new_meta["etag"] = new_meta["etag"] or meta.get("etag")
+                    new_meta["last_modified"] = new_meta["last_modified"] or meta.get(
+                        "last_modified"
+                    )
+                return status, data, new_meta
+            last_error = RuntimeError(f"HTTP {status}")
+        raise last_error or RuntimeError("头像下载失败")
+
+    async def _load(self, user_id: str) -> Avatar | None:
+        now = time.time()
+        stale = self._memory.get(user_id)
+
+        disk = await asyncio.to_thread(self._read_disk, user_id)
+        if disk is not None:
+            data, meta = disk
+            if now - meta.get("fetched_at", 0) < self.ttl:
+                self.disk_hits += 1
+                return await self._build(user_id, data, meta["fetched_at"])
+        else:
+            data, meta = None, None
+
+        try:
+            status, new_data, new_meta = await self._download(user_id, meta)
+        except Exception as e:
+            self.failures += 1
+            logger.error(f"下载头像失败: {e}")
+            if stale is not None:
+                return stale
+            if data is not None:
+                return await self._build(user_id, data, meta.get("fetched_at", 0))
+            return None
+
+        if status == 304 and data is not None:
+            self.not_modified += 1
+            await asyncio.to_thread(self._write_disk, user_id, None, new_meta)
+            if stale is not None:
+                stale.fetched_at = new_meta["fetched_at"]
+                return self._remember(user_id, stale)
+            return await self._build(user_id, data, new_meta["fetched_at"])
+
+        self.downloads += 1
+        await asyncio.to_thread(self._write_disk, user_id, new_data, new_meta)
+        return await self._build(user_id, new_data, new_meta["fetched_at"])
+
+    async def get(self, user_id: str) -> Avatar | None:
+        avatar = self._memory.get(user_id)
+        if avatar is not None and time.time() - avatar.fetched_at < self.ttl:
+            self._memory.move_to_end(user_id)
+            self.memory_hits += 1
+            return avatar
+
+        # 同一 QQ 号的并发请求只发起一次加载
+        return await self._inflight.run(user_id, lambda: self._load(user_id))
+
+    def stats(self) -> dict:
+        return {
+            "memory_entries": len(self._memory),
+            "disk_entries": len(self._disk_index or ()),
+            "memory_hits": self.memory_hits,
+            "disk_hits": self.disk_hits,
+            "not_modified": self.not_modified,
+            "downloads": self.downloads,
+            "failures": self.failures,
+        }
@@ -0,0 +1,247 @@
+import asyncio
+import json
+import os
+import time
+from dataclasses import asdict, dataclass, field, fields
+from pathlib import Path
+from typing import Any, Awaitable, Callable, Sequence
+
+from aiocqhttp.exceptions import ActionFailed, ApiNotAvailable
+from astrbot.api import logger
+
+from .single_flight import SingleFlight
+
+APP_BACKENDS = {"LLOneBot": "llbot", "SnowLuma": "snowluma"}
+DEFAULT_BACKEND = "napcat"
+# 探测失败时按默认协议端处理，过这么久再重新探测；也是两次重新探测的最小间隔
+PROBE_RETRY_INTERVAL = 300
+# OneBot v11: 不支持的 API
+RETCODE_UNSUPPORTED = 1404
+
+# 同一功能在各协议端上的候选接口，按首选顺序排列；首选不受支持时依次尝试其余接口
+ALBUM_LIST_ACTIONS = {
+    "llbot": ("get_group_album_list", "get_qun_album_list"),
+    "snowluma": ("get_group_album_list", "get_qun_album_list"),
+    DEFAULT_BACKEND: ("get_qun_album_list", "get_group_album_list"),
+}
+# upload_group_album 一次可携带多个文件，upload_image_to_qun_album 只能一张
+BATCH_UPLOAD_ACTION = "upload_group_album"
+UPLOAD_ACTIONS = {
+    "llbot": (BATCH_UPLOAD_ACTION, "upload_image_to_qun_album"),
+    "snowluma": ("upload_image_to_qun_album", BATCH_UPLOAD_ACTION),
+    DEFAULT_BACKEND: ("upload_image_to_qun_album", BATCH_UPLOAD_ACTION),
+}
+
+
+def candidate_actions(
+    table: dict[str, tuple[str, ...]], backend: str
+) -> tuple[str, ...]:
+    return table.get(backend, table[DEFAULT_BACKEND])
+
+
+def is_unsupported_action(error: Exception) -> bool:
+    """接口调用失败是否因为协议端不支持该接口（而不是超时、限流、无权限等临时错误）"""
+    if isinstance(error, ApiNotAvailable):
+        return True
+    return isinstance(error, ActionFailed) and (
+        getattr(error, "retcode", None) == RETCODE_UNSUPPORTED
+    )
+
+
+@dataclass
+class BackendInfo:
+    backend: str
+    app_name: str = ""
+    app_version: str = ""
+    detected_at: float = field(default_factory=time.time)
+    # 实际调用中确认可用 / 返回“不支持”的接口，随记录一起落盘
+    supported: list[str] = field(default_factory=list)
+    unsupported: list[str] = field(default_factory=list)
+
+
+class BackendRegistry:
+    """按机器人 QQ 号（self_id）记录所连接的协议端类型
+
+    探测结果保存在 path 指向的 JSON 文件中，重启后直接使用，超过 max_age 秒才重新探测。
+    同一 self_id 的并发探测只发起一次 get_version_info。
+    另外记录每个 self_id 调用过的接口是否受支持：调用时跳过已确认不支持的接口，
+    协议端更换后也能直接改用候选中的其他接口，而不必丢弃整条记录重新探测。
+    path 为 None 时只保存在内存中。
+    """
+
+    def __init__(self, path: Path | None, max_age: float = 7 * 24 * 3600):
+        self.path = path
+        self.max_age = max_age
+        self._entries: dict[str, BackendInfo] = {}
+        self._inflight: SingleFlight[BackendInfo] = SingleFlight()
+        self.probes = 0
+        self._load()
+
+    def _load(self) -> None:
+        if self.path is None:
+            return
+        try:
+            data = json.loads(self.path.read_text(encoding="utf-8"))
+        except FileNotFoundError:
+            return
+        except (OSError, ValueError) as e:
+            logger.warning(f"[qun_album] 读取协议端记录失败: {e}")
+            return
+        known = {f.name for f in fields(BackendInfo)}
+        for self_id, info in data.items():
+            try:
+                self._entries[self_id] = BackendInfo(
+                    **{k: v for k, v in info.items() if k in known}
+                )
+            except (AttributeError, TypeError):
+                continue
+
+    def _save(self) -> None:
+        if self.path is None:
+            return
+        try:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            tmp = self.path.with_name(self.path.name + ".tmp")
+            tmp.write_text(
+                json.dumps(
+                    {k: asdict(v) for k, v in self._entries.items()},
+                    ensure_ascii=False,
+                    indent=2,
+                ),
+                encoding="utf-8",
+            )
+            os.replace(tmp, self.path)
+        except OSError as e:
+            logger.warning(f"[qun_album] 保存协议端记录失败: {e}")
+
+    async def _probe(self, self_id: str, client) -> BackendInfo:
+        self.probes += 1
+        info = BackendInfo(backend=DEFAULT_BACKEND)
+        probed = False
+        try:
+            version_info = await client.api.call_action("get_version_info")
+            if isinstance(version_info, dict) and isinstance(
+                version_info.get("data"), dict
+            ):
+                version_info = version_info["data"]
+            if isinstance(version_info, dict):
+                info.app_name = version_info.get("app_name") or ""
+                info.app_version = str(version_info.get("app_version") or "")
+            info.backend = APP_BACKENDS.get(info.app_name, DEFAULT_BACKEND)
+            probed = True
+            logger.debug(
+                f"[qun_album] 探测协议端完成: self_id={self_id}, "
+                f"app_name={info.app_name or 'unknown'}, backend={info.backend}"
+            )
+        except Exception as e:
+            logger.warning(
+                f"[qun_album] 探测协议端失败，默认按 NapCat 处理: self_id={self_id}, {e}"
+            )
+            # 探测失败的结果不落盘，只在内存中保留一小段时间
+            info.detected_at = time.time() - self.max_age + PROBE_RETRY_INTERVAL
+        old = self._entries.get(self_id)
+        if old is not None and (old.backend, old.app_name) == (
+            info.backend,
+            info.app_name,
+        ):
+            # 协议端未变，沿用已知的接口支持情况
+            info.supported = old.supported
+            info.unsupported = old.unsupported
+        self._entries[self_id] = info
+        if probed:
+            await asyncio.to_thread(self._save)
+        return info
+
+    async def get(self, self_id, client) -> BackendInfo:
+        key = str(self_id)
+        info = self._entries.get(key)
+        if info is not None and time.time() - info.detected_at < self.max_age:
+            return info
+        if client is None:
+            return info or BackendInfo(backend=DEFAULT_BACKEND)
+
+        return await self._inflight.run(key, lambda: self._probe(key, client))
+
+    async def backend(self, self_id, client) -> str:
+        return (await self.get(self_id, client)).backend
+
+    def actions(self, self_id, candidates: Sequence[str]) -> list[str]:
+        """按记录排列候选接口：已确认支持的在前，未知的其次，已确认不支持的跳过
+
+        候选接口全部被记为不支持时原样返回（协议端可能已升级），再试一轮。
+        """
+        info = self._entries.get(str(self_id))
+        if info is None:
+            return list(candidates)
+        usable = [a for a in candidates if a not in info.unsupported]
+        if not usable:
+            return list(candidates)
+        return sorted(usable, key=lambda a: a not in info.supported)
+
+    async def record(self, self_id, action: str, supported: bool) -> None:
+        """记录接口是否受支持，状态变化时落盘"""
+        info = self._entries.get(str(self_id))
+        if info is None:
+            return
+        add, remove = (
+            (info.supported, info.unsupported)
+            if supported
+            else (info.unsupported, info.supported)
+        )
+        if action in add:
+            return
+        add.append(action)
+        if action in remove:
+            remove.remove(action)
+        if not supported:
+            logger.info(
+                f"[qun_album] 协议端不支持接口 {action}，改用其他接口: self_id={self_id}"
+            )
+        await asyncio.to_thread(self._save)
+
+    async def call(
+        self,
+        self_id,
+        candidates: Sequence[str],
+        invoke: Callable[[str], Awaitable[Any]],
+    ) -> Any:
+        """按 actions 的顺序调用 invoke(接口名)，返回第一个成功的结果
+
+        接口返回“不支持”时记录并尝试下一个；超时、限流等其他错误直接抛出。
+        """
+        last_error: Exception | None = None
+        for action in self.actions(self_id, candidates):
+            try:
+                result = await invoke(action)
+            except Exception as e:
+                if not is_unsupported_action(e):
+                    raise
+                await self.record(self_id, action, False)
+                last_error = e
+                continue
+            await self.record(self_id, action, True)
+            return result
+        raise last_error
+
+    def stats(self) -> dict:
+        return {
+            "clients": {k: v.backend for k, v in self._entries.items()},
+            "unsupported": {
+                k: list(v.unsupported)
+                for k, v in self._entries.items()
+                if v.unsupported
+            },
+            "probes": self.probes,
+        }
+
+
+_registry = BackendRegistry(None)
+
+
+def get_backend_registry() -> BackendRegistry:
+    return _registry
+
+
+def set_backend_registry(registry: BackendRegistry) -> None:
+    global _registry
+    _registry = registry
@@ -0,0 +1,265 @@
+import hashlib
+import json
+import os
+import threading
+from dataclasses import dataclass
+from pathlib import Path
+
+from astrbot.api import logger
+
+from .http_client import CHUNK_SIZE
+from .ingest import ImageHandle
+
+OBJECTS_DIR = "objects"
+INDEX_FILE = "_index.json"
+LINK_PROBE = ".link_probe"
+
+
+@dataclass
+class MigrationReport:
+    scanned: int = 0
+    linked: int = 0
+    duplicates: int = 0
+    reclaimed_bytes: int = 0
+    errors: int = 0
+    # 清理的无引用本体数（其字节数计入 reclaimed_bytes）
+    swept: int = 0
+    hardlinks: bool = True
+
+
+def _file_sha256(path: Path) -> str:
+    digest = hashlib.sha256()
+    with path.open("rb") as f:
+        while chunk := f.read(CHUNK_SIZE):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class BackupStore:
+    """按内容寻址的备份存储
+
+    图片本体按 SHA-256 存放在 backup/objects/ 下，只存一份；
+    backup/<群号>/<相册ID>/ 中的文件是指向本体的硬链接，
+    每个相册的 _index.json 记录 摘要 → 文件名，同一张图在同一相册中只出现一次。
+    文件系统不支持硬链接时（首次使用时检测一次）不再使用 objects/，
+    图片直接保存在相册目录中，每份备份只占一份空间。
+    add 与迁移都在线程中执行，索引的读改写由同一把锁串行化。
+    """
+
+    def __init__(self, root: Path):
+        self.root = root
+        self._lock = threading.Lock()
+        self._hardlinks: bool | None = None
+
+    def _object_path(self, digest: str, ext: str) -> Path:
+        return self.root / OBJECTS_DIR / digest[:2] / f"{digest}.{ext}"
+
+    def _find_object(self, digest: str) -> Path | None:
+        """按摘要查找已有本体（扩展名不参与去重）"""
+        shard = self.root / OBJECTS_DIR / digest[:2]
+        return next(shard.glob(f"{digest}.*"), None)
+
+    def _album_dir(self, group_id, album_id) -> Path:
+        return self.root / str(group_id) / str(album_id)
+
+    @staticmethod
+    def _read_index(album_dir: Path) -> dict[str, str]:
+        try:
+            return json.loads((album_dir / INDEX_FILE).read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            return {}
+
+    @staticmethod
+    def _write_index(album_dir: Path, index: dict[str, str]) -> None:
+        path = album_dir / INDEX_FILE
+        tmp = path.with_name(path.name + ".tmp")
+        tmp.write_text(
+            json.dumps(index, ensure_ascii=False, indent=2), encoding="utf-8"
+        )
+        os.replace(tmp, path)
+
+    def _hardlinks_supported(self) -> bool:
+        if self._hardlinks is None:
+            src = self.root / OBJECTS_DIR / LINK_PROBE
+            dst = self.root / LINK_PROBE
+            try:
+                src.parent.mkdir(parents=True, exist_ok=True)
+                src.write_bytes(b"")
+                os.link(src, dst)
+                self._hardlinks = True
+            except OSError as e:
+                self._disable_hardlinks(e)
+            finally:
+                src.unlink(missing_ok=True)
+                dst.unlink(missing_ok=True)
+        return self._hardlinks
+
+    def _disable_hardlinks(self, error: OSError) -> None:
+        self._hardlinks = False
+        logger.warning(
+            f"[qun_album] 备份目录不支持硬链接，图片改为直接保存在相册目录"
+            f"（不再使用 {OBJECTS_DIR}/ 去重存储）: {error}"
+        )
+
+    def _link(self, src: Path, dst: Path) -> bool:
+        """创建硬链接；失败时切换到不使用硬链接的模式并返回 False（不复制）"""
+        try:
+            os.link(src, dst)
+            return True
+        except OSError as e:
+            self._disable_hardlinks(e)
+            return False
+
+    def _store_object(self, handle: ImageHandle) -> Path:
+        obj = self._find_object(handle.sha256)
+        if obj is not None:
+            handle.path.unlink(missing_ok=True)
+            return obj
+        obj = self._object_path(handle.sha256, handle.ext)
+        handle.move_to(obj)
+        return obj
+
+    def add(self, handle: ImageHandle, group_id, album_id, name: str) -> Path:
+        """把图片加入相册备份，返回相册目录中的文件路径
+
+        同一相册已有相同内容时直接返回已有文件，不再新增。
+        文件名为 name 加摘要前 8 位，同一秒内的多次上传不会互相覆盖。
+        """
+        with self._lock:
+            return self._add(handle, group_id, album_id, name)
+
+    def _add(self, handle: ImageHandle, group_id, album_id, name: str) -> Path:
+        album_dir = self._album_dir(group_id, album_id)
+        album_dir.mkdir(parents=True, exist_ok=True)
+        index = self._read_index(album_dir)
+        existing = index.get(handle.sha256)
+        if existing and (album_dir / existing).exists():
+            logger.debug(f"[qun_album] 相册中已有相同图片，复用备份: {existing}")
+            handle.path.unlink(missing_ok=True)
+            return album_dir / existing
+
+        filename = f"{name}_{handle.sha256[:8]}.{handle.ext}"
+        target = album_dir / filename
+        if target.exists():
+            handle.path.unlink(missing_ok=True)
+        elif self._hardlinks_supported():
+            obj = self._store_object(handle)
+            if not self._link(obj, target):
+                # 本体移入相册目录，仍只保留一份
+                os.replace(obj, target)
+        else:
+            handle.move_to(target)
+        index[handle.sha256] = filename
+        self._write_index(album_dir, index)
+        return target
+
+    # ---------- 迁移 ----------
+
+    def _album_dirs(self):
+        if not self.root.is_dir():
+            return
+        for group_dir in self.root.iterdir():
+            if not group_dir.is_dir() or group_dir.name == OBJECTS_DIR:
+                continue
+            for album_dir in group_dir.iterdir():
+                if album_dir.is_dir():
+                    yield album_dir
+
+    def _migrate_album(self, album_dir: Path, report: MigrationReport) -> None:
+        index = self._read_index(album_dir)
+        # 旧索引可能指向已被删除的文件，按实际存在的文件重建
+        index = {d: f for d, f in index.items() if (album_dir / f).is_file()}
+        indexed = set(index.values())
+        for path in sorted(album_dir.iterdir()):
+            if not path.is_file() or path.name.startswith("_"):
+                continue
+            report.scanned += 1
+            try:
+                digest = _file_sha256(path)
+                stat = path.stat()
+                # 只有没有其他硬链接的文件被删除 / 替换时才真正释放空间
+                sole_copy = stat.st_nlink == 1
+                if path.name not in indexed and digest in index:
+                    # 同一相册里的重复图片：删除，只保留一份
+                    path.unlink()
+                    report.duplicates += 1
+                    if sole_copy:
+                        report.reclaimed_bytes += stat.st_size
+                    continue
+                index[digest] = path.name
+                indexed.add(path.name)
+                if not self._hardlinks_supported():
+                    continue
+                obj = self._find_object(digest)
+                if obj is None:
+                    obj = self._object_path(digest, path.suffix.lstrip(".") or "bin")
+                    obj.parent.mkdir(parents=True, exist_ok=True)
+                    self._link(path, obj)
+                elif not os.path.samefile(obj, path):
+                    tmp = path.with_name(path.name + ".tmp")
+                    if self._link(obj, tmp):
+                        os.replace(tmp, path)
+                        report.linked += 1
+                        if sole_copy:
+                            report.reclaimed_bytes += stat.st_size
+            except OSError as e:
+                report.errors += 1
+                logger.warning(f"[qun_album] 迁移备份文件失败: {path}: {e}")
+        self._write_index(album_dir, index)
+
+    def _sweep_objects(self, report: MigrationReport) -> None:
+        """删除没有相册引用的本体
+
+        st_nlink 为 1 说明没有相册文件链接到它；摘要也不在任何相册索引中时即为孤儿。
+        不使用硬链接时相册文件本身就是完整的一份，objects/ 中的本体全部多余。
+        """
+        objects_dir = self.root / OBJECTS_DIR
+        if not objects_dir.is_dir():
+            return
+        referenced = set()
+        for album_dir in self._album_dirs():
+            referenced.update(
+                digest
+                for digest, file in self._read_index(album_dir).items()
+                if (album_dir / file).is_file()
+            )
+        hardlinks = self._hardlinks_supported()
+        for shard in objects_dir.iterdir():
+            if not shard.is_dir():
+                continue
+            for obj in shard.iterdir():
+                try:
+                    stat = obj.stat()
+                    if stat.st_nlink > 1 or (hardlinks and obj.stem in referenced):
+                        continue
+                    obj.unlink()
+                except OSError as e:
+                    report.errors += 1
+                    logger.warning(f"[qun_album] 清理备份本体失败: {obj}: {e}")
+                    continue
+                report.swept += 1
+                report.reclaimed_bytes += stat.st_size
+            try:
+                shard.rmdir()
+            except OSError:
+                pass
+
+    def migrate(self) -> MigrationReport:
+        """把现有备份目录迁移到内容寻址存储，清理无引用的本体，返回迁移报告
+
+        可重复执行。
+        """
+        report = MigrationReport()
+        for album_dir in list(self._album_dirs()):
+            with self._lock:
+                self._migrate_album(album_dir, report)
+        with self._lock:
+            self._sweep_objects(report)
+        report.hardlinks = self._hardlinks_supported()
+        logger.info(
+            f"[qun_album] 备份迁移完成: 扫描 {report.scanned}，合并 {report.linked}"
+            f"，删除重复 {report.duplicates}，清理无引用本体 {report.swept}"
+            f"，回收 {report.reclaimed_bytes} bytes，失败 {report.errors}"
+            + ("" if report.hardlinks else "，文件系统不支持硬链接")
+        )
+        return report
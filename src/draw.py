@@ -2,11 +2,17 @@ from astrbot import logger
 from astrbot.core.platform.sources.aiocqhttp.aiocqhttp_message_event import (
     AiocqhttpMessageEvent,
 )
+from .avatar_cache import Avatar, AvatarCache
+from .emoji_compat import get_emoji_pattern
+from .encoder import EncodeOptions, encode_image
+from .render_cache import RenderCache, make_render_key
+from .render_pool import RenderPool, RenderQueueFull
 from .utils import (
     get_avatar,
     get_reply_text_async,
     get_replyer_id,
     get_member_rich_info,
+    warm_member_cache,
 )
 from PIL import Image, ImageDraw, ImageFont
 
@@ -14,26 +20,22 @@ try:
     from pilmoji import Pilmoji
 except ImportError:
     Pilmoji = None
+from collections import OrderedDict, deque
+from dataclasses import asdict, dataclass, field
+import asyncio
+import functools
+import hashlib
 import io
 from pathlib import Path
-import re
+import threading
+from typing import AsyncIterator
+import weakref
 
 RESOURCES_DIR = Path(__file__).parent.parent / "resources"
 FONT_DIR: Path | None = None
 FONT_PATH = RESOURCES_DIR / "fonts" / "NotoSansSC-Regular.ttf"
 FONT_BOLD_PATH = RESOURCES_DIR / "fonts" / "NotoSansSC-Bold.ttf"
-
-
-def set_font_dir(path: Path) -> None:
-    global FONT_DIR
-    FONT_DIR = path
-
-
-def _try_load(path: Path, size: int) -> ImageFont.FreeTypeFont | None:
-    try:
-        return ImageFont.truetype(str(path), size)
-    except Exception:
-        return None
+FONT_CACHE_SIZE = 16
 
 
 def _find_font(bold: bool) -> Path | None:
@@ -65,54 +67,306 @@ def _find_font(bold: bool) -> Path | None:
     return None
 
 
+class _ThreadFonts(OrderedDict):
+    """单个线程的字体 LRU（子类才能被弱引用）"""
+
+
+class FontRegistry:
+    """字体注册表：字体路径只解析一次，已加载的字体按 (路径, 字号, 粗体) 做 LRU 缓存
+
+    FreeType 字体对象不能被多个线程同时使用，因此每个线程（渲染池的每个
+    worker）各自持有一份 LRU，只在该线程首次用到某个字号时加载。
+    LRU 只由线程局部存储强引用，线程退出后随之释放；注册表中仅保留弱引用用于统计。
+    """
+
+    def __init__(self, maxsize: int = FONT_CACHE_SIZE):
+        self.maxsize = maxsize
+        self._paths: dict[bool, Path | None] = {}
+        self._local = threading.local()
+        self._caches: weakref.WeakValueDictionary[int, _ThreadFonts] = (
+            weakref.WeakValueDictionary()
+        )
+        self._generation = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def _thread_cache(
+        self,
+    ) -> OrderedDict[tuple[str, int, bool], ImageFont.FreeTypeFont]:
+        cache = getattr(self._local, "fonts", None)
+        if cache is None:
+            cache = self._local.fonts = _ThreadFonts()
+            with self._lock:
+                self._caches[threading.get_ident()] = cache
+        if getattr(self._local, "generation", None) != self._generation:
+            cache.clear()
+            self._local.generation = self._generation
+        return cache
+
+    def resolve(self, bold: bool) -> Path | None:
+        with self._lock:
+            if bold not in self._paths:
+                self._paths[bold] = _find_font(bold)
+            return self._paths[bold]
+
+    def get(self, size: int, bold: bool = False) -> ImageFont.FreeTypeFont:
+        path = self.resolve(bold)
+        key = (str(path) if path is not None else "", size, bold)
+        cache = self._thread_cache()
+        font = cache.get(key)
+        if font is not None:
+            cache.move_to_end(key)
+            with self._lock:
+                self.hits += 1
+            return font
+        with self._lock:
+            self.misses += 1
+
+        if path is not None:
+            font = _try_load(path, size)
+        if font is None:
+            font = ImageFont.load_default()
+
+        cache[key] = font
+        while len(cache) > self.maxsize:
+            cache.popitem(last=False)
+        return font
+
+    def invalidate(self) -> None:
+        """字体目录变化时清空路径解析结果与已加载字体"""
+        with self._lock:
+            self._paths.clear()
+            self._generation += 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            caches = list(self._caches.values())
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "size": sum(len(c) for c in caches),
+                "maxsize": self.maxsize * max(1, len(caches)),
+                "regular": str(self._paths.get(False) or ""),
+                "bold": str(self._paths.get(True) or ""),
+            }
+
+
+_font_registry = FontRegistry()
+
+
+def set_font_dir(path: Path) -> None:
+    global FONT_DIR
+    FONT_DIR = path
+    _font_registry.invalidate()
+
+
+def _try_load(path: Path, size: int) -> ImageFont.FreeTypeFont | None:
+    try:
+        return ImageFont.truetype(str(path), size)
+    except Exception:
+        return None
+
+
 def load_font(size: int, bold: bool = False) -> ImageFont.FreeTypeFont:
-    path = _find_font(bold)
-    if path is not None:
-        result = _try_load(path, size)
-        if result is not None:
-            return result
-    return ImageFont.load_default()
+    return _font_registry.get(size, bold)
 
 
-def wrap_text(text: str, font: ImageFont.FreeTypeFont, max_width: int) -> list[str]:
-    """根据最大宽度对文本进行自动换行"""
-    lines = []
+def warm_up(fonts: bool = True) -> None:
+    """预加载渲染用到的字体（当前线程）、气泡素材与 emoji 正则"""
+    if fonts:
+        for size, bold in (
+            (55, False),
+            (35, False),
+            (32, False),
+            (32, True),
+            (28, True),
+        ):
+            load_font(size, bold)
+    _bubble_template.warm_up()
+    get_emoji_pattern()
+
+
+def font_cache_stats() -> dict:
+    """返回字体缓存命中/未命中计数"""
+    return _font_registry.stats()
+
 
-    # 统一换行符并按行分割
-    paragraphs = text.replace("\r\n", "\n").split("\n")
+MAX_TEXT_LINES = 0
+MAX_TEXT_CHARS = 0
+ELLIPSIS = "…"
+_KERNING_PROBES = ("AV", "To", "Wa", "LT")
 
-    for paragraph in paragraphs:
+
+def set_text_limits(max_lines: int = 0, max_chars: int = 0) -> None:
+    """设置气泡文本的行数/字符数硬上限，0 表示不限制"""
+    global MAX_TEXT_LINES, MAX_TEXT_CHARS
+    MAX_TEXT_LINES = max(0, int(max_lines or 0))
+    MAX_TEXT_CHARS = max(0, int(max_chars or 0))
+
+
+class GlyphMetrics:
+    """单个字体的字形前进宽度与字距缓存"""
+
+    def __init__(self, font: ImageFont.FreeTypeFont):
+        self.font = font
+        self._advances: dict[str, float] = {}
+        self._kerning: dict[str, float] = {}
+        self.has_kerning = any(
+            abs(self._measure(p) - self._measure(p[0]) - self._measure(p[1])) > 0.01
+            for p in _KERNING_PROBES
+        )
+
+    def _measure(self, text: str) -> float:
+        try:
+            return float(self.font.getlength(text))
+        except Exception:
+            bbox = self.font.getbbox(text)
+            return float(bbox[2] - bbox[0]) if bbox else 0.0
+
+    def advance(self, char: str) -> float:
+        adv = self._advances.get(char)
+        if adv is None:
+            adv = self._advances[char] = self._measure(char)
+        return adv
+
+    def kerning(self, prev: str, char: str) -> float:
+        if not self.has_kerning or not prev:
+            return 0.0
+        pair = prev + char
+        kern = self._kerning.get(pair)
+        if kern is None:
+            kern = self._measure(pair) - self.advance(prev) - self.advance(char)
+            self._kerning[pair] = kern
+        return kern
+
+
+_glyph_metrics: "weakref.WeakKeyDictionary[ImageFont.FreeTypeFont, GlyphMetrics]" = (
+    weakref.WeakKeyDictionary()
+)
+_glyph_metrics_lock = threading.Lock()
+
+
+def get_glyph_metrics(font: ImageFont.FreeTypeFont) -> GlyphMetrics:
+    with _glyph_metrics_lock:
+        metrics = _glyph_metrics.get(font)
+        if metrics is None:
+            metrics = _glyph_metrics[font] = GlyphMetrics(font)
+        return metrics
+
+
+@dataclass
+class TextLayout:
+    """排版结果：每行文本及其实测宽度"""
+
+    lines: list[str] = field(default_factory=list)
+    widths: list[int] = field(default_factory=list)
+    truncated: bool = False
+
+    @property
+    def width(self) -> int:
+        return max(self.widths, default=0)
+
+
+def _fit_ellipsis(
+    line: str, width: float, metrics: GlyphMetrics, max_width: int
+) -> tuple[str, float]:
+    """从行尾删字直到追加省略号后不超过最大宽度"""
+    chars = list(line)
+    ellipsis_w = metrics.advance(ELLIPSIS)
+    while chars and width + ellipsis_w > max_width:
+        last = chars.pop()
+        width -= metrics.advance(last)
+        if chars:
+            width -= metrics.kerning(chars[-1], last)
+    return "".join(chars) + ELLIPSIS, width + ellipsis_w
+
+
+def layout_text(
+    text: str,
+    font: ImageFont.FreeTypeFont,
+    max_width: int,
+    max_lines: int | None = None,
+    max_chars: int | None = None,
+) -> TextLayout:
+    """按最大宽度对文本单遍断行
+
+    使用缓存的字形前进宽度（字体带字距表时叠加字距）累加行宽，
+    每个字符只测量一次，总代价与文本长度成线性关系。
+    超出行数或字符数上限时截断并以省略号结尾。
+    """
+    max_lines = MAX_TEXT_LINES if max_lines is None else max_lines
+    max_chars = MAX_TEXT_CHARS if max_chars is None else max_chars
+    metrics = get_glyph_metrics(font)
+    layout = TextLayout()
+
+    # 统一换行符
+    text = text.replace("\r\n", "\n")
+    if max_chars and len(text) > max_chars:
+        text = text[:max_chars]
+        layout.truncated = True
+
+    def push(line: str, width: float) -> bool:
+        """追加一行，达到行数上限时返回 False"""
+        layout.lines.append(line)
+        layout.widths.append(int(round(width)))
+        return not (max_lines and len(layout.lines) >= max_lines)
+
+    stopped = False
+    paragraphs = text.split("\n")
+    for p_idx, paragraph in enumerate(paragraphs):
         # 如果是空行（比如连续换行），保留占位
         if not paragraph:
-            lines.append("")
+            if not push("", 0):
+                stopped = p_idx < len(paragraphs) - 1
+                break
             continue
 
-        current_line = ""
-        for char in paragraph:
-            test_line = current_line + char
-            bbox = font.getbbox(test_line)
-            # 兼容 getbbox 返回 None 的情况
-            width = (bbox[2] - bbox[0]) if bbox else 0
-
-            if width <= max_width:
-                current_line = test_line
+        start = 0
+        width = 0.0
+        prev = ""
+        for idx, char in enumerate(paragraph):
+            step = metrics.advance(char) + metrics.kerning(prev, char)
+            if width + step > max_width and idx > start:
+                if not push(paragraph[start:idx], width):
+                    stopped = True
+                    break
+                start = idx
+                width = metrics.advance(char)
             else:
-                lines.append(current_line)
-                current_line = char
-        if current_line:
-            lines.append(current_line)
+                width += step
+            prev = char
+        if stopped:
+            break
+        if not push(paragraph[start:], width):
+            stopped = p_idx < len(paragraphs) - 1
+            break
+
+    if stopped:
+        layout.truncated = True
+    if layout.truncated and layout.lines:
+        last = layout.lines[-1]
+        line, width = _fit_ellipsis(
+            last, float(layout.widths[-1]), metrics, max_width
+        )
+        layout.lines[-1] = line
+        layout.widths[-1] = int(round(width))
+    return layout
 
-    return lines
+
+def wrap_text(text: str, font: ImageFont.FreeTypeFont, max_width: int) -> list[str]:
+    """根据最大宽度对文本进行自动换行"""
+    return layout_text(text, font, max_width).lines
 
 
 def pad_emojis(text: str) -> str:
     try:
-        import emoji
-
-        pattern = emoji.get_emoji_regexp()
-        return re.sub(pattern, lambda m: f" {m.group(0)} ", text)
+        pattern = get_emoji_pattern()
     except Exception:
         return text
+    if pattern is None:
+        return text
+    return pattern.sub(lambda m: f" {m.group(0)} ", text)
 
 
 def draw_rounded_rectangle(
@@ -136,53 +390,124 @@ def make_italic(image: Image.Image, skew_factor: float = 0.1) -> Image.Image:
     )
 
 
+BUBBLE_CACHE_SIZE = 32
+# 已拼好的空气泡按 RGBA 字节数计算总量上限；超过单项上限的大气泡（长文本）不缓存
+BUBBLE_CACHE_BYTES = 16 * 1024 * 1024
+BUBBLE_CACHE_MAX_ITEM_BYTES = 2 * 1024 * 1024
+CORNER_W = 70
+CORNER_H = 75
+
+
+class BubbleTemplate:
+    """对话气泡九宫格模板
+
+    四个角贴图在首次使用时解码一次并常驻内存；边和中心都是纯白填充，
+    因此任意尺寸的气泡都可以由缓存的角贴图加两块矩形拼出，无需再读盘。
+    已拼好的空气泡按 (box_w, box_h) 做 LRU 缓存，取用时返回副本；
+    缓存同时受条目数与总字节数限制，单个超过 max_item_bytes 的气泡每次现拼。
+    """
+
+    def __init__(
+        self,
+        maxsize: int = BUBBLE_CACHE_SIZE,
+        max_bytes: int = BUBBLE_CACHE_BYTES,
+        max_item_bytes: int = BUBBLE_CACHE_MAX_ITEM_BYTES,
+    ):
+        self.maxsize = maxsize
+        self.max_bytes = max_bytes
+        self.max_item_bytes = max_item_bytes
+        self._bytes = 0
+        self._corners: tuple[Image.Image, ...] | None = None
+        self._loaded = False
+        self._bubbles: OrderedDict[tuple[int, int], Image.Image] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _load_corners(self) -> tuple[Image.Image, ...] | None:
+        if self._loaded:
+            return self._corners
+        corners = []
+        try:
+            for i in range(1, 5):
+                with Image.open(RESOURCES_DIR / f"corner{i}.png") as im:
+                    corners.append(im.convert("RGBA"))
+        except FileNotFoundError:
+            self._corners = None
+        else:
+            self._corners = tuple(corners)
+        self._loaded = True
+        return self._corners
+
+    def warm_up(self) -> None:
+        with self._lock:
+            self._load_corners()
+
+    def _build(self, box_w: int, box_h: int) -> Image.Image:
+        box = Image.new("RGBA", (box_w, box_h), (0, 0, 0, 0))
+        draw = ImageDraw.Draw(box)
+        corners = self._load_corners()
+        if corners is None:
+            draw.rounded_rectangle((0, 0, box_w, box_h), radius=20, fill="white")
+            return box
+
+        corner1, corner2, corner3, corner4 = corners
+        box.paste(corner1, (0, 0))
+        box.paste(corner2, (0, box_h - CORNER_H))
+        box.paste(corner3, (box_w - CORNER_W, 0))
+        box.paste(corner4, (box_w - CORNER_W, box_h - CORNER_H))
+
+        draw.rectangle((65, 20, box_w - 65, box_h - 20), fill="white")
+        draw.rectangle((26, 75, box_w - 26, box_h - 75), fill="white")
+        return box
+
+    def render(self, box_w: int, box_h: int) -> Image.Image:
+        """返回指定尺寸的空气泡（副本，可直接在上面绘制）"""
+        key = (box_w, box_h)
+        size = box_w * box_h * 4
+        with self._lock:
+            bubble = self._bubbles.get(key)
+            if bubble is not None:
+                self._bubbles.move_to_end(key)
+                return bubble.copy()
+            if size > self.max_item_bytes:
+                return self._build(box_w, box_h)
+            bubble = self._build(box_w, box_h)
+            self._bubbles[key] = bubble
+            self._bytes += size
+            while self._bubbles and (
+                len(self._bubbles) > self.maxsize or self._bytes > self.max_bytes
+            ):
+                (w, h), _ = self._bubbles.popitem(last=False)
+                self._bytes -= w * h * 4
+            return bubble.copy()
+
+
+_bubble_template = BubbleTemplate()
+
+
 def make_dialog_box(text: str, name_w: int) -> Image.Image:
     """创建对话气泡"""
     font_size = 55
     font = load_font(font_size, bold=False)
     max_text_width = 900
 
-    lines = wrap_text(pad_emojis(text), font, max_text_width)
+    layout = layout_text(pad_emojis(text), font, max_text_width)
+    lines = layout.lines
 
-    text_width = 0
-    text_height = 0
     line_spacing = 4
 
     ascent, descent = font.getmetrics()
     line_height = ascent + descent
 
-    for line in lines:
-        bbox = font.getbbox(line)
-        w = (bbox[2] - bbox[0]) if bbox else 0
-        text_width = max(text_width, w)
-        text_height += line_height + line_spacing
-
+    text_width = layout.width
+    text_height = len(lines) * (line_height + line_spacing)
     if lines:
         text_height -= line_spacing
 
     box_w = max(text_width, name_w) + 130
     box_h = max(text_height + 103, 150)
 
-    box = Image.new("RGBA", (int(box_w), int(box_h)), (0, 0, 0, 0))
-
-    try:
-        corner1 = Image.open(RESOURCES_DIR / "corner1.png").convert("RGBA")
-        corner2 = Image.open(RESOURCES_DIR / "corner2.png").convert("RGBA")
-        corner3 = Image.open(RESOURCES_DIR / "corner3.png").convert("RGBA")
-        corner4 = Image.open(RESOURCES_DIR / "corner4.png").convert("RGBA")
-    except FileNotFoundError:
-        draw = ImageDraw.Draw(box)
-        draw.rounded_rectangle((0, 0, box_w, box_h), radius=20, fill="white")
-        return box
-
-    box.paste(corner1, (0, 0))
-    box.paste(corner2, (0, int(box_h - 75)))
-    box.paste(corner3, (int(box_w - 70), 0))
-    box.paste(corner4, (int(box_w - 70), int(box_h - 75)))
-
+    box = _bubble_template.render(int(box_w), int(box_h))
     fill_draw = ImageDraw.Draw(box)
-    fill_draw.rectangle((65, 20, box_w - 65, box_h - 20), fill="white")
-    fill_draw.rectangle((26, 75, box_w - 26, box_h - 75), fill="white")
 
     text_start_x = 65
     text_start_y = 17 + (box_h - 40 - text_height) // 2
@@ -202,7 +527,30 @@ def make_dialog_box(text: str, name_w: int) -> Image.Image:
     return box
 
 
-def render_my_friend(
+AVATAR_SIZE = 135
+
+
+@functools.lru_cache(maxsize=1)
+def _circle_mask() -> Image.Image:
+    mask = Image.new("L", (AVATAR_SIZE, AVATAR_SIZE), 0)
+    draw_mask = ImageDraw.Draw(mask)
+    draw_mask.ellipse((0, 0, AVATAR_SIZE, AVATAR_SIZE), fill=255)
+    return mask
+
+
+def prepare_avatar(avatar_bytes: bytes) -> Image.Image:
+    """解码头像并缩放、裁成圆形"""
+    try:
+        avatar = Image.open(io.BytesIO(avatar_bytes)).convert("RGBA")
+    except Exception:
+        avatar = Image.new("RGBA", (AVATAR_SIZE, AVATAR_SIZE), "gray")
+
+    avatar = avatar.resize((AVATAR_SIZE, AVATAR_SIZE))
+    avatar.putalpha(_circle_mask())
+    return avatar
+
+
+def render_my_friend_image(
     name: str,
     avatar_bytes: bytes,
     text: str,
@@ -210,19 +558,13 @@ def render_my_friend(
     title: str = "",
     level: int = 0,
     show_title: bool = True,
-) -> bytes:
-    """渲染包含头像、头衔、等级和对话框的完整表情包"""
+    avatar_image: Image.Image | None = None,
+) -> Image.Image:
+    """渲染包含头像、头衔、等级和对话框的完整表情包，返回未编码的 RGB 图像
 
-    try:
-        avatar = Image.open(io.BytesIO(avatar_bytes)).convert("RGBA")
-    except Exception:
-        avatar = Image.new("RGBA", (135, 135), "gray")
-
-    mask = Image.new("L", (135, 135), 0)
-    draw_mask = ImageDraw.Draw(mask)
-    draw_mask.ellipse((0, 0, 135, 135), fill=255)
-    avatar = avatar.resize((135, 135))
-    avatar.putalpha(mask)
+    传入 avatar_image（prepare_avatar 的结果）时跳过头像解码与裁圆。
+    """
+    avatar = avatar_image if avatar_image is not None else prepare_avatar(avatar_bytes)
 
     name_font = load_font(35, bold=False)
     name_bbox = name_font.getbbox(name)
@@ -408,33 +750,156 @@ def render_my_friend(
         name_draw = ImageDraw.Draw(canvas)
         name_draw.text((name_x, name_draw_y), name, font=name_font, fill="#868894")
 
-    output = io.BytesIO()
-    canvas.convert("RGB").save(output, format="JPEG", quality=90)
-    return output.getvalue()
+    return canvas.convert("RGB")
 
 
-async def generate_single_meme(
-    bot, user_id: str, text: str, info: dict, show_title: bool = True
-) -> bytes | None:
-    """获取头像并生成单张表情包"""
-    avatar = await get_avatar(user_id)
-    if not avatar:
-        return None
+def render_my_friend(
+    name: str,
+    avatar_bytes: bytes,
+    text: str,
+    role: str = "member",
+    title: str = "",
+    level: int = 0,
+    show_title: bool = True,
+    encode: EncodeOptions | None = None,
+    avatar_image: Image.Image | None = None,
+) -> bytes:
+    """渲染包含头像、头衔、等级和对话框的完整表情包"""
+    image = render_my_friend_image(
+        name,
+        avatar_bytes,
+        text,
+        role=role,
+        title=title,
+        level=level,
+        show_title=show_title,
+        avatar_image=avatar_image,
+    )
+    return encode_image(image, encode or EncodeOptions()).data
+
+
+_render_pool = RenderPool()
+_encode_options = EncodeOptions()
+_render_cache: RenderCache | None = None
+_avatar_cache: AvatarCache | None = None
+STITCH_FETCH_CONCURRENCY = 5
+STITCH_LOOKAHEAD = 4
+# 不同发送者达到该数量时先用群成员列表批量预热成员缓存
+STITCH_BULK_MEMBER_THRESHOLD = 4
+# 单页高度始终有上限，避免一次拼接生成无限高的画布
+DEFAULT_STITCH_MAX_HEIGHT = 16000
+STITCH_MAX_HEIGHT = DEFAULT_STITCH_MAX_HEIGHT
+STITCH_MAX_PIXELS = 0
+
+
+def set_render_pool(pool: RenderPool) -> None:
+    global _render_pool
+    _render_pool = pool
+
+
+def set_stitch_limits(max_height: int = 0, max_pixels: int = 0) -> None:
+    """设置拼接图单页的最大高度与像素数
+
+    高度为 0 时使用 DEFAULT_STITCH_MAX_HEIGHT；像素数为 0 表示不限制。
+    """
+    global STITCH_MAX_HEIGHT, STITCH_MAX_PIXELS
+    STITCH_MAX_HEIGHT = max(0, int(max_height or 0)) or DEFAULT_STITCH_MAX_HEIGHT
+    STITCH_MAX_PIXELS = max(0, int(max_pixels or 0))
+
+
+def set_render_cache(cache: RenderCache | None) -> None:
+    global _render_cache
+    _render_cache = cache
+
+
+def set_avatar_cache(cache: AvatarCache | None) -> None:
+    global _avatar_cache
+    _avatar_cache = cache
+
+
+def set_encode_options(options: EncodeOptions) -> None:
+    global _encode_options
+    _encode_options = options
 
+
+async def _fetch_avatar(user_id: str) -> Avatar | bytes | None:
+    """优先从头像缓存获取已裁圆的头像，未启用缓存时下载原图"""
+    if _avatar_cache is not None and user_id.isdigit():
+        return await _avatar_cache.get(user_id)
+    return await get_avatar(user_id)
+
+
+def _render_cache_key(
+    avatar_digest: str, text: str, info: dict, show_title: bool
+) -> str:
+    return make_render_key(
+        text=text,
+        nickname=info["nickname"],
+        role=info["role"],
+        title=info["title"],
+        level=info["level"],
+        avatar=avatar_digest,
+        show_title=show_title,
+        encode=asdict(_encode_options),
+        text_limits=(MAX_TEXT_LINES, MAX_TEXT_CHARS),
+        font_dir=str(FONT_DIR or ""),
+        pilmoji=Pilmoji is not None,
+    )
+
+
+async def _render_with_avatar(
+    avatar: Avatar | bytes,
+    text: str,
+    info: dict,
+    show_title: bool = True,
+    render_func=render_my_friend,
+):
+    if isinstance(avatar, Avatar):
+        kwargs = {"avatar_bytes": b"", "avatar_image": avatar.image}
+        avatar_digest = avatar.digest
+    else:
+        kwargs = {"avatar_bytes": avatar}
+        avatar_digest = None
+    cache_key = None
+    if render_func is render_my_friend:
+        kwargs["encode"] = _encode_options
+        if _render_cache is not None:
+            if avatar_digest is None:
+                avatar_digest = hashlib.sha256(avatar).hexdigest()
+            cache_key = _render_cache_key(avatar_digest, text, info, show_title)
+            cached = await _render_cache.get(cache_key)
+            if cached is not None:
+                return cached
     try:
-        img_bytes = render_my_friend(
+        result = await _render_pool.run(
+            render_func,
             name=info["nickname"],
-            avatar_bytes=avatar,
             text=text,
             role=info["role"],
             title=info["title"],
             level=info["level"],
             show_title=show_title,
+            **kwargs,
         )
-        return img_bytes
+    except (RenderQueueFull, asyncio.TimeoutError):
+        # 渲染池繁忙不是单条消息的问题，交给调用方整体处理
+        raise
     except Exception as e:
         logger.exception(f"渲染失败: {e}")
         return None
+    if cache_key is not None and result:
+        await _render_cache.put(cache_key, result)
+    return result
+
+
+async def generate_single_meme(
+    bot, user_id: str, text: str, info: dict, show_title: bool = True
+) -> bytes | None:
+    """获取头像并生成单张表情包"""
+    avatar = await _fetch_avatar(user_id)
+    if not avatar:
+        return None
+    return await _render_with_avatar(avatar, text, info, show_title=show_title)
 
 
 async def generate_meme(
@@ -461,42 +926,166 @@ async def generate_meme(
     )
 
 
-async def generate_stitched_meme(
-    event: AiocqhttpMessageEvent, messages: list[dict], show_title: bool = True
-) -> bytes | None:
-    """处理多条消息并生成垂直拼接的表情包"""
-    images = []
-    group_id = int(event.get_group_id())
+class StitchPager:
+    """把子图按顺序累积成分页，单页高度/像素数超过上限时切到下一页
+
+    只保留当前页的子图，已输出的页立即释放，峰值内存与消息总数无关。
+    """
+
+    def __init__(
+        self,
+        max_height: int = DEFAULT_STITCH_MAX_HEIGHT,
+        max_pixels: int = 0,
+        encode: EncodeOptions | None = None,
+    ):
+        self.max_height = max_height or DEFAULT_STITCH_MAX_HEIGHT
+        self.max_pixels = max_pixels
+        self.encode = encode
+        self._images: list[Image.Image] = []
+        self._width = 0
+        self._height = 0
+
+    def fits(self, img: Image.Image) -> bool:
+        """当前页放入 img 后是否仍不超过上限（空页总能放下）"""
+        if not self._images:
+            return True
+        width = max(self._width, img.width)
+        height = self._height + img.height
+        if height > self.max_height:
+            return False
+        if self.max_pixels and width * height > self.max_pixels:
+            return False
+        return True
+
+    def add(self, img: Image.Image) -> None:
+        self._images.append(img)
+        self._width = max(self._width, img.width)
+        self._height += img.height
+
+    def flush_discard(self) -> None:
+        """丢弃当前页（生成被中断时释放内存）"""
+        for img in self._images:
+            img.close()
+        self._images = []
+        self._width = self._height = 0
+
+    def flush(self) -> bytes | None:
+        """合成并编码当前页，随后清空"""
+        images, self._images = self._images, []
+        self._width = self._height = 0
+        if not images:
+            return None
+        try:
+            return compose_vertical(images, self.encode)
+        finally:
+            for img in images:
+                img.close()
 
-    for msg in messages:
-        user_id = msg["user_id"]
-        text = msg["text"]
 
-        info = await get_member_rich_info(event.bot, group_id, int(user_id))
+async def iter_stitched_pages(
+    event: AiocqhttpMessageEvent,
+    messages: list[dict],
+    show_title: bool = True,
+    skipped: list[dict] | None = None,
+) -> AsyncIterator[bytes]:
+    """处理多条消息并按页生成垂直拼接的表情包
+
+    同一发送者的群成员信息与头像只获取一次，不同发送者并发获取；
+    渲染最多提前 STITCH_LOOKAHEAD 条，结果按原顺序逐条放入分页，
+    单条失败不影响其他消息，失败的消息追加到 skipped 中供调用方提示。
+    渲染池已满或超时会直接抛出 RenderQueueFull / asyncio.TimeoutError。
+    超过高度/像素上限时拆成多页依次产出。
+    """
+    group_id = int(event.get_group_id())
+    fetch_sem = asyncio.Semaphore(STITCH_FETCH_CONCURRENCY)
+    # 不超过渲染池的 worker 数，避免一次拼接把排队上限占满
+    render_sem = asyncio.Semaphore(max(1, _render_pool.workers))
+    lookahead = max(STITCH_LOOKAHEAD, _render_pool.workers)
+    senders: dict[str, asyncio.Task] = {}
+
+    async def fetch_sender(user_id: str) -> tuple[dict, Avatar | bytes | None]:
+        async with fetch_sem:
+            return await asyncio.gather(
+                get_member_rich_info(event.bot, group_id, int(user_id)),
+                _fetch_avatar(user_id),
+            )
 
-        img_bytes = await generate_single_meme(
-            event.bot, user_id, text, info, show_title=show_title
-        )
-        if img_bytes:
-            images.append(Image.open(io.BytesIO(img_bytes)))
+    async def render_one(msg: dict) -> Image.Image | None:
+        try:
+            info, avatar = await senders[msg["user_id"]]
+        except Exception as e:
+            logger.warning(f"[qun_album] 获取发送者 {msg['user_id']} 信息失败: {e}")
+            return None
+        if not avatar:
+            return None
+        async with render_sem:
+            return await _render_with_avatar(
+                avatar,
+                msg["text"],
+                info,
+                show_title=show_title,
+                render_func=render_my_friend_image,
+            )
 
-    if not images:
-        return None
+    if len({msg["user_id"] for msg in messages}) >= STITCH_BULK_MEMBER_THRESHOLD:
+        await warm_member_cache(event.bot, group_id)
 
+    for msg in messages:
+        user_id = msg["user_id"]
+        if user_id not in senders:
+            senders[user_id] = asyncio.create_task(fetch_sender(user_id))
+
+    pager = StitchPager(STITCH_MAX_HEIGHT, STITCH_MAX_PIXELS, _encode_options)
+    pending: deque[tuple[dict, asyncio.Task]] = deque()
+    queued = iter(messages)
     try:
-        width = max(img.width for img in images)
-        total_height = sum(img.height for img in images)
+        while True:
+            while len(pending) < lookahead:
+                msg = next(queued, None)
+                if msg is None:
+                    break
+                pending.append((msg, asyncio.create_task(render_one(msg))))
+            if not pending:
+                break
+            # 子图直接以内存图像合成到分页画布，每页只编码一次
+            msg, task = pending.popleft()
+            img = await task
+            if img is None:
+                if skipped is not None:
+                    skipped.append(msg)
+                continue
+            if not pager.fits(img):
+                page = await _render_pool.run_local(pager.flush)
+                if page:
+                    yield page
+            pager.add(img)
+
+        page = await _render_pool.run_local(pager.flush)
+        if page:
+            yield page
+    finally:
+        for _, task in pending:
+            task.cancel()
+        for task in senders.values():
+            task.cancel()
+        pager.flush_discard()
 
-        bg_color = "#eaedf4"
-        with Image.new("RGB", (width, total_height), bg_color) as new_img:
-            y_offset = 0
-            for img in images:
-                new_img.paste(img, (0, y_offset))
-                y_offset += img.height
 
-            output = io.BytesIO()
-            new_img.save(output, format="PNG")
-            return output.getvalue()
-    finally:
+def compose_vertical(
+    images: list[Image.Image],
+    encode: EncodeOptions | None = None,
+    bg_color: str = "#eaedf4",
+) -> bytes:
+    """把多张子图垂直合成到一张画布并编码（默认 PNG）"""
+    width = max(img.width for img in images)
+    total_height = sum(img.height for img in images)
+
+    with Image.new("RGB", (width, total_height), bg_color) as new_img:
+        y_offset = 0
         for img in images:
-            img.close()
+            new_img.paste(img, (0, y_offset))
+            y_offset += img.height
+
+        return encode_image(
+            new_img, encode or EncodeOptions(), default_format="png"
+        ).data
@@ -0,0 +1,159 @@
+import os
+import re
+import threading
+from pathlib import Path
+
+from astrbot.api import logger
+
+EMOJI_PATTERN_PREFIX = "emoji_pattern-"
+
+_cache_dir: Path | None = None
+_pattern: re.Pattern | None = None
+_lock = threading.Lock()
+_shim_installed = False
+
+
+def set_cache_dir(path: Path) -> None:
+    global _cache_dir
+    _cache_dir = path
+
+
+def install_shim() -> None:
+    """为新版 emoji 库补上 pilmoji 依赖的旧接口，必须在导入 pilmoji 之前调用"""
+    global _shim_installed
+    if _shim_installed:
+        return
+    try:
+        import emoji
+        from emoji import unicode_codes
+    except ImportError:
+        _shim_installed = True
+        return
+
+    if not hasattr(unicode_codes, "get_emoji_unicode_dict"):
+
+        def get_emoji_unicode_dict(lang):
+            return {
+                data[lang]: char
+                for char, data in emoji.EMOJI_DATA.items()
+                if lang in data
+            }
+
+        unicode_codes.get_emoji_unicode_dict = get_emoji_unicode_dict
+
+    if not hasattr(unicode_codes, "EMOJI_UNICODE"):
+        unicode_codes.EMOJI_UNICODE = {
+            "en": unicode_codes.get_emoji_unicode_dict("en")
+        }
+
+    if not hasattr(emoji, "get_emoji_regexp"):
+        emoji.get_emoji_regexp = get_emoji_pattern
+
+    _shim_installed = True
+
+
+def _emoji_list() -> list[str]:
+    import emoji
+    from emoji import unicode_codes
+
+    data = getattr(emoji, "EMOJI_DATA", None) or getattr(
+        unicode_codes, "EMOJI_DATA", None
+    )
+    if data:
+        return list(data.keys())
+    return list(unicode_codes.EMOJI_UNICODE["en"].values())
+
+
+def _escape_class(char: str) -> str:
+    return "\\" + char if char in "\\]^-[" else char
+
+
+def _trie_regex(words: list[str]) -> str:
+    """把 emoji 列表构建成前缀树形式的正则
+
+    比几千项的平铺 alternation 编译和匹配都快得多；
+    每个节点的分支首字符互不相同，可选尾部贪婪匹配，保证最长匹配优先。
+    """
+    trie: dict = {}
+    for word in words:
+        node = trie
+        for char in word:
+            node = node.setdefault(char, {})
+        node[""] = True
+
+    def build(node: dict) -> str:
+        leaves = []
+        branches = []
+        for char in sorted(k for k in node if k):
+            child = node[char]
+            if len(child) == 1 and "" in child:
+                leaves.append(char)
+            else:
+                branches.append(re.escape(char) + build(child))
+        if len(leaves) == 1:
+            branches.append(re.escape(leaves[0]))
+        elif leaves:
+            branches.append("[" + "".join(_escape_class(c) for c in leaves) + "]")
+        if not branches:
+            return ""
+        if "" in node:
+            return "(?:" + "|".join(branches) + ")?"
+        if len(branches) == 1:
+            return branches[0]
+        return "(?:" + "|".join(branches) + ")"
+
+    return build(trie)
+
+
+def _pattern_cache_path() -> Path | None:
+    if _cache_dir is None:
+        return None
+    try:
+        import emoji
+
+        version = getattr(emoji, "__version__", "unknown")
+    except ImportError:
+        return None
+    return _cache_dir / f"{EMOJI_PATTERN_PREFIX}{version}.txt"
+
+
+def _load_or_build_source(use_cache: bool = True) -> str:
+    path = _pattern_cache_path()
+    if use_cache and path is not None and path.is_file():
+        try:
+            return path.read_text(encoding="utf-8")
+        except OSError:
+            pass
+
+    source = _trie_regex(_emoji_list())
+    if path is not None:
+        try:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            for old in path.parent.glob(f"{EMOJI_PATTERN_PREFIX}*.txt"):
+                old.unlink()
+            # 先写临时文件再替换，中途崩溃不会留下截断的缓存
+            tmp = path.with_name(path.name + ".tmp")
+            tmp.write_text(source, encoding="utf-8")
+            os.replace(tmp, path)
+        except OSError as e:
+            logger.warning(f"[qun_album] 写入 emoji 正则缓存失败: {e}")
+    return source
+
+
+def get_emoji_pattern() -> re.Pattern | None:
+    """返回匹配单个 emoji 的已编译正则；首次调用时构建（优先读取磁盘缓存）"""
+    global _pattern
+    if _pattern is not None:
+        return _pattern
+    with _lock:
+        if _pattern is None:
+            try:
+                try:
+                    _pattern = re.compile(_load_or_build_source())
+                except re.error as e:
+                    # 磁盘缓存损坏（如写入时崩溃），忽略缓存重新构建并覆盖
+                    logger.warning(f"[qun_album] emoji 正则缓存无效，重新构建: {e}")
+                    _pattern = re.compile(_load_or_build_source(use_cache=False))
+            except ImportError:
+                return None
+    return _pattern
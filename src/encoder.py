@@ -0,0 +1,141 @@
+import io
+from dataclasses import dataclass
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from PIL import Image
+
+ENCODE_FORMATS = ("auto", "jpeg", "progressive_jpeg", "webp", "png")
+LOSSY_FORMATS = ("jpeg", "progressive_jpeg", "webp")
+SCALE_STEP = 0.85
+FORMAT_EXT = {"jpeg": "jpg", "progressive_jpeg": "jpg", "webp": "webp", "png": "png"}
+
+
+@dataclass
+class EncodeOptions:
+    """输出编码配置
+
+    format 为 auto 时单张图使用 JPEG、拼接图使用 PNG（与旧版一致）。
+    max_bytes 大于 0 时会依次降低质量、缩小尺寸，直到文件不超过预算。
+    """
+
+    format: str = "auto"
+    quality: int = 90
+    png_compress_level: int = 6
+    max_bytes: int = 0
+    min_quality: int = 40
+    min_scale: float = 0.4
+
+    @classmethod
+    def from_config(cls, conf) -> "EncodeOptions":
+        fmt = conf.get("output_format", "auto")
+        return cls(
+            format=fmt if fmt in ENCODE_FORMATS else "auto",
+            quality=min(100, max(1, int(conf.get("output_quality", 90)))),
+            png_compress_level=min(9, max(0, int(conf.get("png_compress_level", 6)))),
+            max_bytes=max(0, int(conf.get("output_max_kb", 0))) * 1024,
+        )
+
+
+@dataclass
+class EncodeResult:
+    data: bytes
+    format: str
+    quality: int | None = None
+    scale: float = 1.0
+
+    @property
+    def ext(self) -> str:
+        return FORMAT_EXT.get(self.format, self.format)
+
+
+def _save(image: "Image.Image", fmt: str, quality: int, compress_level: int) -> bytes:
+    output = io.BytesIO()
+    if fmt == "png":
+        image.save(output, format="PNG", compress_level=compress_level)
+    elif fmt == "webp":
+        image.save(output, format="WEBP", quality=quality, method=4)
+    else:
+        if image.mode not in ("RGB", "L"):
+            image = image.convert("RGB")
+        if fmt == "progressive_jpeg":
+            image.save(
+                output, format="JPEG", quality=quality, progressive=True, optimize=True
+            )
+        else:
+            image.save(output, format="JPEG", quality=quality)
+    return output.getvalue()
+
+
+def _scaled(image: "Image.Image", scale: float) -> "Image.Image":
+    if scale >= 1.0:
+        return image
+    from PIL import Image
+
+    size = (max(1, int(image.width * scale)), max(1, int(image.height * scale)))
+    return image.resize(size, Image.LANCZOS)
+
+
+def _fit_quality(
+    image: "Image.Image", fmt: str, options: EncodeOptions
+) -> tuple[bytes, int]:
+    """在 [min_quality, quality] 中二分查找不超过预算的最高质量"""
+    best = _save(image, fmt, options.min_quality, options.png_compress_level)
+    best_q = options.min_quality
+    if len(best) > options.max_bytes:
+        return best, best_q
+    lo, hi = options.min_quality + 1, options.quality
+    while lo <= hi:
+        mid = (lo + hi) // 2
+        data = _save(image, fmt, mid, options.png_compress_level)
+        if len(data) <= options.max_bytes:
+            best, best_q = data, mid
+            lo = mid + 1
+        else:
+            hi = mid - 1
+    return best, best_q
+
+
+def encode_image(
+    image: "Image.Image", options: EncodeOptions, default_format: str = "jpeg"
+) -> EncodeResult:
+    """按配置编码图像，必要时搜索质量与缩放比例以满足字节预算"""
+    fmt = default_format if options.format == "auto" else options.format
+    lossy = fmt in LOSSY_FORMATS
+    quality = options.quality if lossy else None
+
+    data = _save(image, fmt, options.quality, options.png_compress_level)
+    if not options.max_bytes or len(data) <= options.max_bytes:
+        return EncodeResult(data, fmt, quality)
+
+    scale = 1.0
+    while True:
+        current = _scaled(image, scale)
+        if lossy:
+            data, quality = _fit_quality(current, fmt, options)
+        else:
+            data = _save(current, fmt, options.quality, 9)
+        if len(data) <= options.max_bytes or scale * SCALE_STEP < options.min_scale:
+            return EncodeResult(data, fmt, quality, scale)
+        scale *= SCALE_STEP
+
+
+def fit_bytes(data: bytes, options: EncodeOptions) -> EncodeResult | None:
+    """把已有图片重新编码到字节预算以内；无需处理或无法处理（如动图）时返回 None"""
+    if not options.max_bytes or len(data) <= options.max_bytes:
+        return None
+    from PIL import Image
+
+    try:
+        with Image.open(io.BytesIO(data)) as img:
+            if getattr(img, "is_animated", False):
+                return None
+            src_fmt = (img.format or "").lower()
+            default = "png" if src_fmt == "png" else "jpeg"
+            img.load()
+            result = encode_image(img, options, default_format=default)
+    except Exception:
+        return None
+    if len(result.data) >= len(data):
+        return None
+    return result
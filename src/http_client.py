@@ -0,0 +1,132 @@
+import asyncio
+from typing import TYPE_CHECKING
+
+from astrbot.api import logger
+
+if TYPE_CHECKING:
+    import aiohttp
+
+DEFAULT_MAX_BYTES = 20 * 1024 * 1024
+CHUNK_SIZE = 64 * 1024
+USER_AGENT = "astrbot-plugin-qun-album/1.0"
+
+
+class ResponseTooLarge(ValueError):
+    """响应体超过大小上限"""
+
+
+class HttpClient:
+    """插件共享的 HTTP 客户端
+
+    所有下载复用同一个 aiohttp 会话：连接池 + keep-alive + 单主机连接数限制 +
+    DNS 缓存，统一超时。会话在首次请求时创建，插件卸载时关闭。
+    """
+
+    def __init__(
+        self,
+        limit: int = 32,
+        limit_per_host: int = 8,
+        dns_ttl: int = 300,
+        keepalive_timeout: float = 30.0,
+        timeout: float = 15.0,
+        max_bytes: int = DEFAULT_MAX_BYTES,
+    ):
+        self.limit = limit
+        self.limit_per_host = limit_per_host
+        self.dns_ttl = dns_ttl
+        self.keepalive_timeout = keepalive_timeout
+        self.timeout = timeout
+        self.max_bytes = max_bytes
+        self._session: "aiohttp.ClientSession | None" = None
+        self._lock = asyncio.Lock()
+
+    async def session(self) -> "aiohttp.ClientSession":
+        if self._session is not None and not self._session.closed:
+            return self._session
+        async with self._lock:
+            if self._session is None or self._session.closed:
+                import aiohttp
+
+                connector = aiohttp.TCPConnector(
+                    limit=self.limit,
+                    limit_per_host=self.limit_per_host,
+                    ttl_dns_cache=self.dns_ttl,
+                    keepalive_timeout=self.keepalive_timeout,
+                )
+                self._session = aiohttp.ClientSession(
+                    connector=connector,
+                    timeout=aiohttp.ClientTimeout(
+                        total=self.timeout, sock_connect=min(self.timeout, 10)
+                    ),
+                    headers={"User-Agent": USER_AGENT},
+                )
+        return self._session
+
+    async def iter_chunks(
+        self, resp: "aiohttp.ClientResponse", max_bytes: int | None = None
+    ):
+        """逐块读取响应体，累计超过上限时抛出 ResponseTooLarge"""
+        limit = self.max_bytes if max_bytes is None else max_bytes
+        if limit and resp.content_length and resp.content_length > limit:
+            raise ResponseTooLarge(f"响应体过大: {resp.content_length} > {limit}")
+        total = 0
+        async for chunk in resp.content.iter_chunked(CHUNK_SIZE):
+            total += len(chunk)
+            if limit and total > limit:
+                raise ResponseTooLarge(f"响应体超过上限 {limit} bytes")
+            yield chunk
+
+    async def fetch(
+        self,
+        url: str,
+        *,
+        max_bytes: int | None = None,
+        raise_for_status: bool = True,
+        headers: dict | None = None,
+    ) -> bytes:
+        session = await self.session()
+        async with session.get(url, headers=headers) as resp:
+            if raise_for_status:
+                resp.raise_for_status()
+            buf = bytearray()
+            async for chunk in self.iter_chunks(resp, max_bytes):
+                buf += chunk
+            return bytes(buf)
+
+    async def request(
+        self,
+        url: str,
+        *,
+        headers: dict | None = None,
+        max_bytes: int | None = None,
+    ) -> tuple[int, dict[str, str], bytes]:
+        """GET 请求，返回 (状态码, 小写键的响应头, 响应体)，不对状态码做判断
+
+        用于条件请求（If-None-Match / If-Modified-Since），304 时响应体为空。
+        """
+        session = await self.session()
+        async with session.get(url, headers=headers) as resp:
+            buf = bytearray()
+            if resp.status != 304:
+                async for chunk in self.iter_chunks(resp, max_bytes):
+                    buf += chunk
+            resp_headers = {k.lower(): v for k, v in resp.headers.items()}
+            return resp.status, resp_headers, bytes(buf)
+
+    async def close(self) -> None:
+        session, self._session = self._session, None
+        if session is not None and not session.closed:
+            await session.close()
+            logger.debug("[qun_album] HTTP 会话已关闭")
+
+
+_http_client = HttpClient()
+
+
+def get_http_client() -> HttpClient:
+    return _http_client
+
+
+def set_http_client(client: HttpClient) -> None:
+    global _http_client
+    _http_client = client
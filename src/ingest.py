@@ -0,0 +1,189 @@
+import asyncio
+import base64
+import hashlib
+import os
+import uuid
+from dataclasses import dataclass
+from pathlib import Path
+
+from astrbot.api import logger
+
+from .http_client import CHUNK_SIZE, get_http_client
+
+SNIFF_BYTES = 32
+# 下载时攒够这么多字节再交给线程写盘，避免在事件循环里逐块写文件
+WRITE_BUFFER_BYTES = 1024 * 1024
+# sniff_image_ext 可能产出的全部扩展名；识别备份目录中的图片文件时统一使用
+IMAGE_SUFFIXES = (
+    ".png",
+    ".jpg",
+    ".jpeg",
+    ".gif",
+    ".webp",
+    ".bmp",
+    ".tif",
+    ".heic",
+    ".avif",
+)
+
+
+@dataclass
+class ImageHandle:
+    """已落盘的图片：路径、扩展名、字节数与 SHA-256
+
+    上传、备份等后续步骤只使用这个句柄，不再把整张图片读回内存。
+    """
+
+    path: Path
+    ext: str
+    size: int
+    sha256: str
+
+    def move_to(self, target: Path) -> "ImageHandle":
+        """移动到 target（同一文件系统内为重命名）"""
+        target.parent.mkdir(parents=True, exist_ok=True)
+        os.replace(self.path, target)
+        self.path = target
+        return self
+
+    def read_bytes(self) -> bytes:
+        return self.path.read_bytes()
+
+
+def staging_name(prefix: str, handle: ImageHandle) -> str:
+    """待上传文件的文件名：前缀加临时文件的随机名
+
+    前缀中的时间戳只精确到秒，同一秒内的多次上传靠随机部分区分，互不覆盖。
+    """
+    return f"{prefix}_{handle.path.stem[:12]}.{handle.ext}"
+
+
+def sniff_image_ext(head: bytes, fallback: str = "png") -> str:
+    """根据文件头识别图片格式"""
+    if head.startswith(b"\xff\xd8\xff"):
+        return "jpg"
+    if head.startswith(b"\x89PNG\r\n\x1a\n"):
+        return "png"
+    if head[:6] in (b"GIF87a", b"GIF89a"):
+        return "gif"
+    if head[:4] == b"RIFF" and head[8:12] == b"WEBP":
+        return "webp"
+    if head.startswith(b"BM"):
+        return "bmp"
+    if head[:4] in (b"II*\x00", b"MM\x00*"):
+        return "tif"
+    if head[4:8] == b"ftyp" and head[8:12] in (b"heic", b"heix", b"mif1", b"msf1"):
+        return "heic"
+    if head[4:12] == b"ftypavif":
+        return "avif"
+    return fallback
+
+
+class ImageSink:
+    """把分块写入的数据同时落盘、计算 SHA-256、识别格式，并限制总大小"""
+
+    def __init__(self, temp_dir: Path, max_bytes: int = 0):
+        temp_dir.mkdir(parents=True, exist_ok=True)
+        self.path = temp_dir / f"{uuid.uuid4().hex}.part"
+        self.max_bytes = max_bytes
+        self.size = 0
+        self._head = b""
+        self._hash = hashlib.sha256()
+        self._file = self.path.open("wb")
+
+    def write(self, chunk: bytes) -> None:
+        self.size += len(chunk)
+        if self.max_bytes and self.size > self.max_bytes:
+            raise ValueError(f"图片超过大小上限 {self.max_bytes} bytes")
+        if len(self._head) < SNIFF_BYTES:
+            self._head += chunk[: SNIFF_BYTES - len(self._head)]
+        self._hash.update(chunk)
+        self._file.write(chunk)
+
+    def finish(self) -> ImageHandle | None:
+        self._file.close()
+        if not self.size:
+            self.path.unlink(missing_ok=True)
+            return None
+        ext = sniff_image_ext(self._head)
+        final = self.path.with_suffix(f".{ext}")
+        os.replace(self.path, final)
+        return ImageHandle(final, ext, self.size, self._hash.hexdigest())
+
+    def abort(self) -> None:
+        self._file.close()
+        self.path.unlink(missing_ok=True)
+
+
+def save_bytes(data: bytes, temp_dir: Path, max_bytes: int = 0) -> ImageHandle | None:
+    """把内存中的图片（如渲染结果）写入临时目录"""
+    sink = ImageSink(temp_dir, max_bytes)
+    try:
+        sink.write(data)
+    except BaseException:
+        sink.abort()
+        raise
+    return sink.finish()
+
+
+def _copy_file(src: Path, temp_dir: Path, max_bytes: int) -> ImageHandle | None:
+    sink = ImageSink(temp_dir, max_bytes)
+    try:
+        with src.open("rb") as f:
+            while chunk := f.read(CHUNK_SIZE):
+                sink.write(chunk)
+    except BaseException:
+        sink.abort()
+        raise
+    return sink.finish()
+
+
+async def _download(url: str, temp_dir: Path, max_bytes: int) -> ImageHandle | None:
+    client = get_http_client()
+    session = await client.session()
+    sink = await asyncio.to_thread(ImageSink, temp_dir, max_bytes)
+    buffer = bytearray()
+    try:
+        async with session.get(url) as resp:
+            resp.raise_for_status()
+            async for chunk in client.iter_chunks(resp, max_bytes or None):
+                buffer += chunk
+                if len(buffer) >= WRITE_BUFFER_BYTES:
+                    await asyncio.to_thread(sink.write, bytes(buffer))
+                    buffer.clear()
+        if buffer:
+            await asyncio.to_thread(sink.write, bytes(buffer))
+    except BaseException:
+        await asyncio.to_thread(sink.abort)
+        raise
+    return await asyncio.to_thread(sink.finish)
+
+
+async def ingest_source(
+    src: str, temp_dir: Path, max_bytes: int = 0, http: bool = True
+) -> ImageHandle | None:
+    """把本地文件 / URL / base64:// 来源的图片流式写入临时目录，失败时返回 None"""
+    try:
+        if src.startswith("base64://"):
+            data = base64.b64decode(src[9:])
+            return await asyncio.to_thread(save_bytes, data, temp_dir, max_bytes)
+        if src.startswith("http"):
+            if http:
+                src = src.replace("https://", "http://")
+            return await _download(src, temp_dir, max_bytes)
+        if src.startswith("file://"):
+            src = src[7:]
+        if Path(src).is_file():
+            return await asyncio.to_thread(_copy_file, Path(src), temp_dir, max_bytes)
+    except Exception as e:
+        logger.error(f"图片获取失败: {e}")
+    return None
+
+
+def clear_temp_dir(temp_dir: Path) -> None:
+    """清理上次运行遗留的临时文件"""
+    if not temp_dir.is_dir():
+        return
+    for path in temp_dir.iterdir():
+        if path.is_file():
+            path.unlink(missing_ok=True)
@@ -0,0 +1,163 @@
+import time
+from collections import OrderedDict
+
+from astrbot.api import logger
+
+from .single_flight import SingleFlight
+
+BULK_REFRESH_INTERVAL = 600
+
+
+class MemberInfoCache:
+    """群成员信息缓存
+
+    按 (group_id, user_id) 缓存 get_group_member_info 的原始结果，带 TTL；
+    同一成员的并发查询只发起一次请求。活跃群可通过 get_group_member_list
+    一次性批量预热。另附 @ 昵称缓存，查不到的用户按 negative_ttl 缓存失败结果。
+    """
+
+    def __init__(
+        self,
+        ttl: float = 300,
+        max_entries: int = 5000,
+        bulk_interval: float = BULK_REFRESH_INTERVAL,
+        negative_ttl: float = 120,
+    ):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.bulk_interval = bulk_interval
+        self._entries: OrderedDict[tuple[int, int], tuple[float, dict]] = (
+            OrderedDict()
+        )
+        self.negative_ttl = negative_ttl
+        self._names: OrderedDict[tuple[int, int], tuple[float, str | None]] = (
+            OrderedDict()
+        )
+        self._inflight = SingleFlight()
+        self._bulk_loaded: dict[int, float] = {}
+        self.hits = 0
+        self.misses = 0
+        self.bulk_loads = 0
+        self.name_hits = 0
+        self.name_misses = 0
+
+    def _store(self, group_id: int, user_id: int, info: dict, at: float) -> None:
+        key = (group_id, user_id)
+        self._entries[key] = (at, info)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def peek(
+        self, group_id: int, user_id: int, max_age: float | None = None
+    ) -> dict | None:
+        entry = self._entries.get((group_id, user_id))
+        if entry is None:
+            return None
+        at, info = entry
+        if time.time() - at > (self.ttl if max_age is None else max_age):
+            return None
+        return info
+
+    def peek_name(self, group_id: int, user_id: int) -> tuple[bool, str | None]:
+        """返回 (是否命中, 昵称)；命中但昵称为 None 表示该用户已确认查不到"""
+        entry = self._names.get((group_id, user_id))
+        if entry is not None:
+            at, name = entry
+            ttl = self.ttl if name is not None else self.negative_ttl
+            if time.time() - at <= ttl:
+                self.name_hits += 1
+                return True, name
+        info = self.peek(group_id, user_id)
+        if info is not None:
+            name = info.get("card") or info.get("nickname")
+            if name:
+                self.name_hits += 1
+                return True, name
+        self.name_misses += 1
+        return False, None
+
+    def store_name(self, group_id: int, user_id: int, name: str | None) -> None:
+        key = (group_id, user_id)
+        self._names[key] = (time.time(), name)
+        self._names.move_to_end(key)
+        while len(self._names) > self.max_entries:
+            self._names.popitem(last=False)
+
+    async def get(
+        self,
+        client,
+        group_id: int,
+        user_id: int,
+        max_age: float | None = None,
+    ) -> dict:
+        """返回成员信息；缓存不超过 max_age（默认 TTL）秒时直接使用"""
+        info = self.peek(group_id, user_id, max_age)
+        if info is not None:
+            self.hits += 1
+            return info
+        self.misses += 1
+
+        async def fetch() -> dict:
+            info = await client.get_group_member_info(
+                group_id=group_id, user_id=user_id, no_cache=True
+            )
+            self._store(group_id, user_id, info, time.time())
+            return info
+
+        return await self._inflight.run(("member", group_id, user_id), fetch)
+
+    def needs_warm_up(self, group_id: int) -> bool:
+        return time.time() - self._bulk_loaded.get(group_id, 0) > self.bulk_interval
+
+    async def warm_group(self, client, group_id: int) -> int:
+        """用 get_group_member_list 批量填充整个群的成员信息，返回写入条数"""
+        if not self.needs_warm_up(group_id):
+            return 0
+
+        async def fetch() -> int:
+            members = await client.get_group_member_list(group_id=group_id)
+            if isinstance(members, dict):
+                members = members.get("data") or []
+            now = time.time()
+            count = 0
+            for member in members or []:
+                if not isinstance(member, dict) or "user_id" not in member:
+                    continue
+                self._store(group_id, int(member["user_id"]), member, now)
+                count += 1
+            self._bulk_loaded[group_id] = now
+            self.bulk_loads += 1
+            logger.debug(f"[qun_album] 群 {group_id} 成员信息批量预热: {count} 人")
+            return count
+
+        try:
+            return await self._inflight.run(("bulk", group_id), fetch)
+        except Exception as e:
+            # 失败后同样等待一个周期再重试，避免每次都打到协议端
+            self._bulk_loaded[group_id] = time.time()
+            logger.warning(f"[qun_album] 批量获取群成员列表失败: {e}")
+            return 0
+
+    def stats(self) -> dict:
+        return {
+            "entries": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "bulk_loads": self.bulk_loads,
+            "groups": len(self._bulk_loaded),
+            "name_hits": self.name_hits,
+            "name_misses": self.name_misses,
+        }
+
+
+_member_cache: MemberInfoCache | None = None
+
+
+def get_member_cache() -> MemberInfoCache | None:
+    return _member_cache
+
+
+def set_member_cache(cache: MemberInfoCache | None) -> None:
+    global _member_cache
+    _member_cache = cache
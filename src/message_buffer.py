@@ -0,0 +1,194 @@
+import json
+import os
+from collections import OrderedDict, deque
+from dataclasses import dataclass
+from pathlib import Path
+
+from astrbot.api import logger
+
+# 缓冲区中的断档标记：插件重启等原因导致其前后的消息不连续
+GAP = None
+
+
+@dataclass
+class BufferedMessage:
+    """缓冲区中的一条群消息
+
+    parts 为预先提取的文本片段：str 为文本，int 为尚未解析昵称的 @ 对象 QQ 号。
+    seq 为协议端的群内连续序号（real_seq），没有时为 None。
+    """
+
+    message_id: str
+    seq: int | None
+    time: int
+    user_id: str
+    parts: tuple
+
+    @property
+    def has_text(self) -> bool:
+        return any(isinstance(p, int) or p.strip() for p in self.parts)
+
+    def to_json(self) -> list:
+        return [self.message_id, self.seq, self.time, self.user_id, list(self.parts)]
+
+    @classmethod
+    def from_json(cls, data: list) -> "BufferedMessage":
+        message_id, seq, time, user_id, parts = data
+        return cls(message_id, seq, time, user_id, tuple(parts))
+
+
+class MessageBuffer:
+    """按群保存最近消息的环形缓冲区
+
+    由群消息监听器实时写入，拼接上传时若目标消息及其之前的 count 条都在缓冲区内
+    且序号连续、中间没有断档，就不必再请求协议端的历史消息接口。
+    消息不带序号（如 LLOneBot）时无法判断是否漏收，多于一条的窗口一律视为未命中。
+    内存中最多保留 max_groups 个群，超出时最久未活跃的群写入磁盘（启用 spill_dir 时）。
+    """
+
+    def __init__(
+        self,
+        size: int = 300,
+        max_groups: int = 200,
+        spill_dir: Path | None = None,
+    ):
+        self.size = size
+        self.max_groups = max_groups
+        self.spill_dir = spill_dir
+        self._groups: OrderedDict[int, deque] = OrderedDict()
+        # 本次运行中换出到磁盘的群，重新载入时不需要断档标记
+        self._spilled: set[int] = set()
+        self.hits = 0
+        self.misses = 0
+
+    # ---------- 磁盘层 ----------
+
+    def _spill_path(self, group_id: int) -> Path:
+        return self.spill_dir / f"{group_id}.jsonl"
+
+    def _write(self, group_id: int, entries: deque) -> None:
+        if self.spill_dir is None:
+            return
+        path = self._spill_path(group_id)
+        try:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            tmp = path.with_name(path.name + ".tmp")
+            with tmp.open("w", encoding="utf-8") as f:
+                for entry in entries:
+                    data = None if entry is GAP else entry.to_json()
+                    f.write(json.dumps(data, ensure_ascii=False) + "\n")
+            os.replace(tmp, path)
+        except OSError as e:
+            logger.warning(f"[qun_album] 写入群 {group_id} 消息缓冲失败: {e}")
+
+    def _read(self, group_id: int) -> deque:
+        entries: deque = deque(maxlen=self.size)
+        if self.spill_dir is None:
+            return entries
+        path = self._spill_path(group_id)
+        try:
+            with path.open(encoding="utf-8") as f:
+                for line in f:
+                    data = json.loads(line)
+                    entries.append(
+                        GAP if data is None else BufferedMessage.from_json(data)
+                    )
+        except FileNotFoundError:
+            return entries
+        except (OSError, ValueError, TypeError) as e:
+            logger.warning(f"[qun_album] 读取群 {group_id} 消息缓冲失败: {e}")
+            return deque(maxlen=self.size)
+        if group_id not in self._spilled and entries and entries[-1] is not GAP:
+            # 上次运行保存的数据，与本次收到的消息之间必然有断档
+            entries.append(GAP)
+        self._spilled.discard(group_id)
+        return entries
+
+    # ---------- 内存层 ----------
+
+    def _group(self, group_id: int) -> deque:
+        entries = self._groups.get(group_id)
+        if entries is None:
+            entries = self._read(group_id)
+            self._groups[group_id] = entries
+            while len(self._groups) > self.max_groups:
+                old_id, old_entries = self._groups.popitem(last=False)
+                self._write(old_id, old_entries)
+                if self.spill_dir is not None:
+                    self._spilled.add(old_id)
+        self._groups.move_to_end(group_id)
+        return entries
+
+    def record(self, group_id: int, message: BufferedMessage) -> None:
+        self._group(group_id).append(message)
+
+    def lookup(
+        self, group_id: int, message_id: str, count: int
+    ) -> list[BufferedMessage] | None:
+        """返回目标消息及其之前共 count 条有效消息（正序）；窗口未被完整覆盖时返回 None"""
+        result = self._lookup(group_id, message_id, count)
+        if result is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return result
+
+    def _lookup(
+        self, group_id: int, message_id: str, count: int
+    ) -> list[BufferedMessage] | None:
+        if group_id not in self._groups and self.spill_dir is None:
+            return None
+        entries = self._group(group_id)
+        collected: list[BufferedMessage] = []
+        newer: BufferedMessage | None = None
+        found = False
+        for entry in reversed(entries):
+            if entry is GAP:
+                if found:
+                    return None
+                newer = None
+                continue
+            if not found:
+                if entry.message_id != message_id:
+                    continue
+                found = True
+            elif newer is not None and (
+                entry.seq is None or newer.seq is None or newer.seq - entry.seq != 1
+            ):
+                # 序号不连续：中间有未收到的消息（如机器人自己发的、撤回的）；
+                # 协议端不提供序号时无法确认连续，交给历史消息接口
+                return None
+            newer = entry
+            if entry.has_text:
+                collected.append(entry)
+                if len(collected) >= count:
+                    collected.reverse()
+                    return collected
+        return None
+
+    def persist(self) -> None:
+        """把内存中的所有群写入磁盘（启用 spill_dir 时），插件卸载时调用"""
+        if self.spill_dir is None:
+            return
+        for group_id, entries in self._groups.items():
+            self._write(group_id, entries)
+
+    def stats(self) -> dict:
+        return {
+            "groups": len(self._groups),
+            "entries": sum(len(e) for e in self._groups.values()),
+            "hits": self.hits,
+            "misses": self.misses,
+        }
+
+
+_message_buffer: MessageBuffer | None = None
+
+
+def get_message_buffer() -> MessageBuffer | None:
+    return _message_buffer
+
+
+def set_message_buffer(buffer: MessageBuffer | None) -> None:
+    global _message_buffer
+    _message_buffer = buffer
@@ -0,0 +1,253 @@
+import json
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from pathlib import Path
+
+from astrbot.api import logger
+
+from .ingest import IMAGE_SUFFIXES
+
+HASH_SIZE = 8
+INDEX_FILE = "_phash.json"
+
+
+def dhash(path: Path) -> int:
+    """计算 64 位差值哈希（dHash）
+
+    JPEG 借助 draft 模式在解码时直接缩小，再缩放到 9x8 灰度图，
+    用 NumPy 一次比较相邻像素并打包成整数。
+    """
+    import numpy as np
+    from PIL import Image
+
+    with Image.open(path) as img:
+        img.draft("L", (HASH_SIZE * 8, HASH_SIZE * 8))
+        small = img.convert("L").resize((HASH_SIZE + 1, HASH_SIZE), Image.BILINEAR)
+    pixels = np.asarray(small, dtype=np.int16)
+    bits = (pixels[:, 1:] > pixels[:, :-1]).ravel()
+    return int.from_bytes(np.packbits(bits).tobytes(), "big")
+
+
+def hamming(a: int, b: int) -> int:
+    return (a ^ b).bit_count()
+
+
+class BKTree:
+    """按汉明距离组织的 BK 树，支持半径查询"""
+
+    def __init__(self):
+        # 节点: [哈希值, 该哈希下的条目列表, {距离: 子节点}]
+        self._root: list | None = None
+        self.size = 0
+
+    def add(self, value: int, item) -> None:
+        self.size += 1
+        if self._root is None:
+            self._root = [value, [item], {}]
+            return
+        node = self._root
+        while True:
+            distance = hamming(value, node[0])
+            if distance == 0:
+                node[1].append(item)
+                return
+            child = node[2].get(distance)
+            if child is None:
+                node[2][distance] = [value, [item], {}]
+                return
+            node = child
+
+    def query(self, value: int, radius: int) -> list[tuple[int, object]]:
+        """返回与 value 距离不超过 radius 的 (距离, 条目)，按距离升序"""
+        if self._root is None:
+            return []
+        results = []
+        stack = [self._root]
+        while stack:
+            node = stack.pop()
+            distance = hamming(value, node[0])
+            if distance <= radius:
+                results.extend((distance, item) for item in node[1])
+            low, high = distance - radius, distance + radius
+            stack.extend(
+                child for d, child in node[2].items() if low <= d <= high
+            )
+        results.sort(key=lambda r: r[0])
+        return results
+
+
+@dataclass
+class PhashEntry:
+    digest: str
+    album_id: str
+    file: str
+
+
+class NearDuplicateIndex:
+    """按群保存备份图片的感知哈希，用于查找重新编码 / 缩放过的相似图片
+
+    索引文件为 backup/<群号>/_phash.json（摘要 → [哈希, 相册ID, 文件名]），
+    首次使用时载入并构建 BK 树。
+    """
+
+    def __init__(self, root: Path):
+        self.root = root
+        self._data: dict[int, dict[str, list]] = {}
+        self._trees: dict[int, BKTree] = {}
+        # 批量建索引在线程中运行，与上传时的增量写入互斥
+        self._lock = threading.Lock()
+        self.queries = 0
+        self.matches = 0
+
+    def _index_path(self, group_id: int) -> Path:
+        return self.root / str(group_id) / INDEX_FILE
+
+    def _load(self, group_id: int) -> dict[str, list]:
+        data = self._data.get(group_id)
+        if data is not None:
+            return data
+        try:
+            data = json.loads(self._index_path(group_id).read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            data = {}
+        self._data[group_id] = data
+        self._trees[group_id] = self._build_tree(data)
+        return data
+
+    @staticmethod
+    def _build_tree(data: dict[str, list]) -> BKTree:
+        tree = BKTree()
+        for digest, (value, album_id, file) in data.items():
+            tree.add(int(value, 16), PhashEntry(digest, album_id, file))
+        return tree
+
+    def _save(self, group_id: int) -> None:
+        path = self._index_path(group_id)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_name(path.name + ".tmp")
+        tmp.write_text(json.dumps(self._data[group_id]), encoding="utf-8")
+        os.replace(tmp, path)
+
+    def query(
+        self, group_id: int, value: int, radius: int
+    ) -> list[tuple[int, PhashEntry]]:
+        with self._lock:
+            self._load(group_id)
+            results = self._trees[group_id].query(value, radius)
+        self.queries += 1
+        if results:
+            self.matches += 1
+        return results
+
+    def add(
+        self, group_id: int, digest: str, value: int, album_id, file: str
+    ) -> None:
+        with self._lock:
+            data = self._load(group_id)
+            if digest in data:
+                return
+            data[digest] = [f"{value:016x}", str(album_id), file]
+            self._trees[group_id].add(value, PhashEntry(digest, str(album_id), file))
+            self._save(group_id)
+
+    def rebuild(self, group_ids=None, workers: int | None = None) -> dict:
+        """为备份目录中尚未建立索引的图片批量计算哈希（多线程），返回统计
+
+        摘要优先取自相册的 _index.json；未迁移的相册没有索引文件，直接扫描目录中的
+        图片并现算 SHA-256。对应文件已被删除的条目会被清理。
+        """
+        from .backup_store import INDEX_FILE as BACKUP_INDEX_FILE, _file_sha256
+
+        workers = workers or min(8, os.cpu_count() or 2)
+        stats = {"groups": 0, "indexed": 0, "skipped": 0, "pruned": 0, "errors": 0}
+        if not self.root.is_dir():
+            return stats
+
+        def compute(item):
+            digest, album_id, path = item
+            try:
+                return digest or _file_sha256(path), album_id, path.name, dhash(path)
+            except Exception as e:
+                logger.debug(f"[qun_album] 计算感知哈希失败: {path}: {e}")
+                return digest, album_id, path.name, None
+
+        for group_dir in sorted(self.root.iterdir()):
+            if not group_dir.is_dir() or not group_dir.name.isdigit():
+                continue
+            group_id = int(group_dir.name)
+            if group_ids and group_id not in group_ids:
+                continue
+            with self._lock:
+                data = self._load(group_id)
+                indexed = {(album_id, file) for _, album_id, file in data.values()}
+            pending: list[tuple[str | None, str, Path]] = []
+            for album_dir in group_dir.iterdir():
+                if not album_dir.is_dir():
+                    continue
+                try:
+                    backup_index = json.loads(
+                        (album_dir / BACKUP_INDEX_FILE).read_text(encoding="utf-8")
+                    )
+                except (OSError, ValueError):
+                    backup_index = {}
+                digests = {file: digest for digest, file in backup_index.items()}
+                for path in album_dir.iterdir():
+                    if (
+                        not path.is_file()
+                        or path.name.startswith("_")
+                        or path.suffix.lower() not in IMAGE_SUFFIXES
+                    ):
+                        continue
+                    digest = digests.get(path.name)
+                    if (album_dir.name, path.name) in indexed or digest in data:
+                        stats["skipped"] += 1
+                        continue
+                    pending.append((digest, album_dir.name, path))
+
+            with ThreadPoolExecutor(max_workers=workers) as pool:
+                results = list(pool.map(compute, pending))
+            with self._lock:
+                changed = False
+                for digest, album_id, file, value in results:
+                    if value is None:
+                        stats["errors"] += 1
+                        continue
+                    if digest in data:
+                        stats["skipped"] += 1
+                        continue
+                    data[digest] = [f"{value:016x}", album_id, file]
+                    self._trees[group_id].add(
+                        value, PhashEntry(digest, album_id, file)
+                    )
+                    stats["indexed"] += 1
+                    changed = True
+                stale = [
+                    digest
+                    for digest, (_, album_id, file) in data.items()
+                    if not (group_dir / album_id / file).is_file()
+                ]
+                if stale:
+                    # BK 树不支持删除，清理后整棵重建
+                    for digest in stale:
+                        del data[digest]
+                    self._trees[group_id] = self._build_tree(data)
+                    stats["pruned"] += len(stale)
+                if changed or stale:
+                    self._save(group_id)
+            stats["groups"] += 1
+        logger.info(
+            f"[qun_album] 感知哈希索引完成: {stats['groups']} 个群"
+            f"，新增 {stats['indexed']}，跳过 {stats['skipped']}"
+            f"，清理 {stats['pruned']}，失败 {stats['errors']}"
+        )
+        return stats
+
+    def stats(self) -> dict:
+        return {
+            "groups": len(self._trees),
+            "entries": sum(t.size for t in self._trees.values()),
+            "queries": self.queries,
+            "matches": self.matches,
+        }
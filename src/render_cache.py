@@ -0,0 +1,187 @@
+import asyncio
+import hashlib
+import json
+import os
+import threading
+from collections import OrderedDict
+from pathlib import Path
+
+from astrbot.api import logger
+
+# 渲染逻辑有不兼容改动时递增，使旧缓存全部失效
+RENDER_CACHE_VERSION = 1
+
+
+def make_render_key(**fields) -> str:
+    """对渲染输入做规范化 JSON 序列化后取 SHA-256 作为缓存键"""
+    payload = json.dumps(
+        {"v": RENDER_CACHE_VERSION, **fields},
+        ensure_ascii=False,
+        sort_keys=True,
+        default=str,
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class RenderCache:
+    """渲染结果缓存：内存 LRU + 可选磁盘层
+
+    两层都按字节数限制容量；磁盘层按最近访问时间淘汰，
+    命中磁盘层时会回填内存层。
+    """
+
+    def __init__(
+        self,
+        max_memory_bytes: int = 32 * 1024 * 1024,
+        disk_dir: Path | None = None,
+        max_disk_bytes: int = 0,
+    ):
+        self.max_memory_bytes = max_memory_bytes
+        self.max_disk_bytes = max_disk_bytes
+        self.disk_dir = disk_dir if disk_dir and max_disk_bytes > 0 else None
+        self._memory: OrderedDict[str, bytes] = OrderedDict()
+        self._memory_bytes = 0
+        self._disk_index: OrderedDict[str, int] | None = None
+        self._disk_bytes = 0
+        self._lock = threading.Lock()
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+    # ---------- 内存层 ----------
+
+    def _memory_get(self, key: str) -> bytes | None:
+        with self._lock:
+            data = self._memory.get(key)
+            if data is not None:
+                self._memory.move_to_end(key)
+            return data
+
+    def _memory_put(self, key: str, data: bytes) -> None:
+        if len(data) > self.max_memory_bytes:
+            return
+        with self._lock:
+            old = self._memory.pop(key, None)
+            if old is not None:
+                self._memory_bytes -= len(old)
+            self._memory[key] = data
+            self._memory_bytes += len(data)
+            while self._memory_bytes > self.max_memory_bytes and self._memory:
+                _, evicted = self._memory.popitem(last=False)
+                self._memory_bytes -= len(evicted)
+
+    # ---------- 磁盘层 ----------
+
+    def _path(self, key: str) -> Path:
+        return self.disk_dir / key[:2] / key
+
+    def _load_disk_index(self) -> OrderedDict[str, int]:
+        if self._disk_index is not None:
+            return self._disk_index
+        entries = []
+        if self.disk_dir.is_dir():
+            for path in self.disk_dir.glob("*/*"):
+                if path.is_file() and not path.name.endswith(".tmp"):
+                    st = path.stat()
+                    entries.append((st.st_mtime, path.name, st.st_size))
+        entries.sort()
+        self._disk_index = OrderedDict((name, size) for _, name, size in entries)
+        self._disk_bytes = sum(size for _, _, size in entries)
+        return self._disk_index
+
+    def _disk_get(self, key: str) -> bytes | None:
+        with self._lock:
+            index = self._load_disk_index()
+            if key not in index:
+                return None
+            index.move_to_end(key)
+        path = self._path(key)
+        try:
+            data = path.read_bytes()
+            os.utime(path)
+            return data
+        except OSError:
+            with self._lock:
+                size = index.pop(key, None)
+                if size is not None:
+                    self._disk_bytes -= size
+            return None
+
+    def _disk_put(self, key: str, data: bytes) -> None:
+        if len(data) > self.max_disk_bytes:
+            return
+        path = self._path(key)
+        try:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            tmp = path.with_name(path.name + ".tmp")
+            tmp.write_bytes(data)
+            os.replace(tmp, path)
+        except OSError as e:
+            logger.warning(f"[qun_album] 写入渲染缓存失败: {e}")
+            return
+        evicted = []
+        with self._lock:
+            index = self._load_disk_index()
+            old = index.pop(key, None)
+            if old is not None:
+                self._disk_bytes -= old
+            index[key] = len(data)
+            self._disk_bytes += len(data)
+            while self._disk_bytes > self.max_disk_bytes and index:
+                old_key, size = index.popitem(last=False)
+                self._disk_bytes -= size
+                evicted.append(old_key)
+        for old_key in evicted:
+            try:
+                self._path(old_key).unlink()
+            except OSError:
+                pass
+
+    # ---------- 对外接口 ----------
+
+    def get_sync(self, key: str) -> bytes | None:
+        data = self._memory_get(key)
+        if data is not None:
+            self.memory_hits += 1
+            return data
+        if self.disk_dir is not None:
+            data = self._disk_get(key)
+            if data is not None:
+                self.disk_hits += 1
+                self._memory_put(key, data)
+                return data
+        self.misses += 1
+        return None
+
+    def put_sync(self, key: str, data: bytes) -> None:
+        self._memory_put(key, data)
+        if self.disk_dir is not None:
+            self._disk_put(key, data)
+
+    async def get(self, key: str) -> bytes | None:
+        data = self._memory_get(key)
+        if data is not None:
+            self.memory_hits += 1
+            return data
+        if self.disk_dir is None:
+            self.misses += 1
+            return None
+        return await asyncio.to_thread(self.get_sync, key)
+
+    async def put(self, key: str, data: bytes) -> None:
+        if self.disk_dir is None:
+            self._memory_put(key, data)
+            return
+        await asyncio.to_thread(self.put_sync, key, data)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "memory_hits": self.memory_hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "memory_entries": len(self._memory),
+                "memory_bytes": self._memory_bytes,
+                "disk_entries": len(self._disk_index or ()),
+                "disk_bytes": self._disk_bytes,
+            }
@@ -0,0 +1,194 @@
+import asyncio
+import functools
+import threading
+import time
+from collections import deque
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from pathlib import Path
+from typing import Any, Callable
+
+from astrbot.api import logger
+
+RENDER_MODES = ("off", "thread", "process")
+LATENCY_WINDOW = 256
+
+
+class RenderQueueFull(RuntimeError):
+    """渲染队列已满"""
+
+
+def _init_worker(font_dir: str | None, max_lines: int, max_chars: int) -> None:
+    """工作线程/进程启动时预加载字体与气泡素材"""
+    from . import emoji_compat
+
+    emoji_compat.install_shim()
+    from . import draw
+
+    if font_dir:
+        draw.set_font_dir(Path(font_dir))
+    draw.set_text_limits(max_lines, max_chars)
+    draw.warm_up()
+
+
+class RenderPool:
+    """把同步的 PIL 渲染放到事件循环之外执行
+
+    mode:
+        off     —— 直接在事件循环中渲染（旧行为）
+        thread  —— 线程池
+        process —— 进程池
+    排队中和执行中的任务总数不超过 workers + queue_size，超出时直接拒绝。
+    超时的任务在工作池中仍会继续执行，直到真正结束才释放名额。
+    """
+
+    def __init__(
+        self,
+        mode: str = "off",
+        workers: int = 2,
+        queue_size: int = 16,
+        timeout: float = 60.0,
+    ):
+        self.mode = mode if mode in RENDER_MODES else "off"
+        self.workers = max(1, int(workers))
+        self.queue_size = max(0, int(queue_size))
+        self.timeout = float(timeout) if timeout and timeout > 0 else None
+        self._executor: Executor | None = None
+        self._initargs: tuple = (None, 0, 0)
+        self._futures: set[asyncio.Future] = set()
+        self._pending = 0
+        # 名额在工作线程 / 进程池管理线程中释放
+        self._pending_lock = threading.Lock()
+        self._closed = False
+        self._latencies: deque[float] = deque(maxlen=LATENCY_WINDOW)
+        self.completed = 0
+        self.failed = 0
+        self.timed_out = 0
+        self.rejected = 0
+
+    def _create_executor(self) -> Executor | None:
+        if self.mode == "thread":
+            return ThreadPoolExecutor(
+                max_workers=self.workers,
+                thread_name_prefix="qun-album-render",
+                initializer=_init_worker,
+                initargs=self._initargs,
+            )
+        if self.mode == "process":
+            return ProcessPoolExecutor(
+                max_workers=self.workers,
+                initializer=_init_worker,
+                initargs=self._initargs,
+            )
+        return None
+
+    def start(
+        self, font_dir: Path | None, max_lines: int = 0, max_chars: int = 0
+    ) -> None:
+        """按当前字体目录与文本上限启动（或重建）工作池"""
+        self._initargs = (str(font_dir) if font_dir else None, max_lines, max_chars)
+        old = self._executor
+        self._executor = self._create_executor()
+        if old is not None:
+            # 已提交的任务继续在旧池中跑完
+            old.shutdown(wait=False)
+        if self._executor is not None:
+            logger.debug(
+                f"[qun_album] 渲染池已启动: mode={self.mode}, workers={self.workers}"
+            )
+
+    async def run(self, func: Callable[..., Any], /, *args, **kwargs) -> Any:
+        if self._closed:
+            raise asyncio.CancelledError("渲染池已关闭")
+        if self._executor is None:
+            start = time.perf_counter()
+            try:
+                result = func(*args, **kwargs)
+            except Exception:
+                self.failed += 1
+                raise
+            self._record(time.perf_counter() - start)
+            return result
+
+        with self._pending_lock:
+            if self._pending >= self.workers + self.queue_size:
+                self.rejected += 1
+                raise RenderQueueFull(f"渲染队列已满({self._pending})")
+            self._pending += 1
+
+        start = time.perf_counter()
+        try:
+            job = self._executor.submit(functools.partial(func, *args, **kwargs))
+        except BaseException:
+            self._release()
+            raise
+        # 任务真正结束（或在排队时被取消）后才释放名额，超时不算结束
+        job.add_done_callback(self._release)
+        future = asyncio.wrap_future(job)
+        self._futures.add(future)
+        try:
+            result = await asyncio.wait_for(future, self.timeout)
+        except asyncio.TimeoutError:
+            self.timed_out += 1
+            logger.warning(f"[qun_album] 渲染超时({self.timeout}s)")
+            raise
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            self.failed += 1
+            raise
+        finally:
+            self._futures.discard(future)
+        self._record(time.perf_counter() - start)
+        return result
+
+    def _release(self, _job=None) -> None:
+        with self._pending_lock:
+            self._pending -= 1
+
+    async def run_local(self, func: Callable[..., Any], /, *args, **kwargs) -> Any:
+        """在当前进程的线程中执行（off 模式下直接执行）
+
+        用于处理已经在主进程内存中的图像（如拼接、编码），避免跨进程序列化。
+        """
+        if self._executor is None:
+            return func(*args, **kwargs)
+        return await asyncio.to_thread(func, *args, **kwargs)
+
+    def _record(self, elapsed: float) -> None:
+        self.completed += 1
+        self._latencies.append(elapsed)
+
+    async def shutdown(self) -> None:
+        """取消排队中的任务并关闭工作池"""
+        self._closed = True
+        for future in list(self._futures):
+            future.cancel()
+        executor, self._executor = self._executor, None
+        if executor is not None:
+            await asyncio.to_thread(
+                functools.partial(executor.shutdown, wait=True, cancel_futures=True)
+            )
+
+    def stats(self) -> dict:
+        latencies = sorted(self._latencies)
+        if latencies:
+            avg = sum(latencies) / len(latencies)
+            p95 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))]
+            peak = latencies[-1]
+        else:
+            avg = p95 = peak = 0.0
+        return {
+            "mode": self.mode,
+            "workers": self.workers if self._executor is not None else 0,
+            "queue_depth": max(0, self._pending - self.workers)
+            if self._executor is not None
+            else 0,
+            "in_flight": self._pending,
+            "completed": self.completed,
+            "failed": self.failed,
+            "timed_out": self.timed_out,
+            "rejected": self.rejected,
+            "avg_ms": avg * 1000,
+            "p95_ms": p95 * 1000,
+            "max_ms": peak * 1000,
+        }
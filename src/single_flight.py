@@ -0,0 +1,42 @@
+import asyncio
+from typing import Awaitable, Callable, Generic, Hashable, TypeVar
+
+T = TypeVar("T")
+
+
+class SingleFlight(Generic[T]):
+    """合并同一 key 的并发调用：进行中的调用完成前，后来者等待同一个结果
+
+    发起者被取消时，等待者随之收到 CancelledError；发起者失败时，等待者收到同一个异常。
+    调用结束后立即移除，下一次调用重新执行 factory。
+    """
+
+    def __init__(self):
+        self._inflight: dict[Hashable, asyncio.Future] = {}
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self._inflight
+
+    def __len__(self) -> int:
+        return len(self._inflight)
+
+    async def run(self, key: Hashable, factory: Callable[[], Awaitable[T]]) -> T:
+        future = self._inflight.get(key)
+        if future is not None:
+            return await asyncio.shield(future)
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = future
+        try:
+            result = await factory()
+            future.set_result(result)
+            return result
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except Exception as e:
+            future.set_exception(e)
+            # 标记异常已被取回，避免没有并发等待者时产生告警
+            future.exception()
+            raise
+        finally:
+            self._inflight.pop(key, None)
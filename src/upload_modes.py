@@ -0,0 +1,76 @@
+from collections import defaultdict
+
+# 各协议端依次尝试的文件参数形式
+UPLOAD_MODES = {
+    "napcat": ("raw_path", "base64", "file_uri"),
+    "snowluma": ("raw_path", "base64", "file_uri"),
+    "llbot": ("raw_path", "file_uri", "base64"),
+}
+
+
+class UploadModeTracker:
+    """记录每个 (机器人, 协议端) 最近一次上传成功的模式
+
+    下次上传优先尝试该模式，失败时自动撤销偏好，回到默认顺序。
+    同时按 (协议端, 模式) 统计成功、失败次数与耗时。
+    """
+
+    def __init__(self):
+        self._preferred: dict[tuple[str, str], str] = {}
+        self._counters: dict[tuple[str, str], dict] = defaultdict(
+            lambda: {"success": 0, "failure": 0, "total_ms": 0.0}
+        )
+
+    def order(self, client_key: str, backend: str) -> list[str]:
+        modes = list(UPLOAD_MODES.get(backend, UPLOAD_MODES["napcat"]))
+        preferred = self._preferred.get((client_key, backend))
+        if preferred in modes:
+            modes.remove(preferred)
+            modes.insert(0, preferred)
+        return modes
+
+    def record_success(
+        self, client_key: str, backend: str, mode: str, elapsed_ms: float
+    ) -> None:
+        counter = self._counters[(backend, mode)]
+        counter["success"] += 1
+        counter["total_ms"] += elapsed_ms
+        self._preferred[(client_key, backend)] = mode
+
+    def record_failure(
+        self, client_key: str, backend: str, mode: str, elapsed_ms: float
+    ) -> None:
+        counter = self._counters[(backend, mode)]
+        counter["failure"] += 1
+        counter["total_ms"] += elapsed_ms
+        if self._preferred.get((client_key, backend)) == mode:
+            del self._preferred[(client_key, backend)]
+
+    def stats(self) -> dict:
+        modes = {}
+        for (backend, mode), counter in sorted(self._counters.items()):
+            attempts = counter["success"] + counter["failure"]
+            modes[f"{backend}/{mode}"] = {
+                "success": counter["success"],
+                "failure": counter["failure"],
+                "avg_ms": counter["total_ms"] / attempts if attempts else 0.0,
+            }
+        return {
+            "preferred": {
+                f"{client}/{backend}": mode
+                for (client, backend), mode in self._preferred.items()
+            },
+            "modes": modes,
+        }
+
+
+_tracker = UploadModeTracker()
+
+
+def get_upload_tracker() -> UploadModeTracker:
+    return _tracker
+
+
+def set_upload_tracker(tracker: UploadModeTracker) -> None:
+    global _tracker
+    _tracker = tracker
@@ -0,0 +1,267 @@
+import asyncio
+import json
+import os
+import random
+import time
+import uuid
+from collections import defaultdict
+from dataclasses import asdict, dataclass, field
+from pathlib import Path
+from typing import Awaitable, Callable
+
+from astrbot.api import logger
+
+
+@dataclass
+class UploadJob:
+    """一次上传任务：同一相册的一张或多张（拼接分页）图片
+
+    done 记录已上传的张数，重试或重启后从未完成的那张继续。
+    lookup_name 非空表示 album_id 来自缓存，上传失败时需按名称重新查询一次。
+    """
+
+    job_id: str
+    self_id: str
+    group_id: int
+    album_id: str
+    album_name: str
+    backend: str
+    paths: list[str]
+    backup: bool = False
+    lookup_name: str | None = None
+    done: int = 0
+    attempts: int = 0
+    next_at: float = 0.0
+    created_at: float = field(default_factory=time.time)
+    last_error: str = ""
+
+
+UploadHandler = Callable[[UploadJob, object], Awaitable[None]]
+Notifier = Callable[[UploadJob, object, str | None], Awaitable[None]]
+
+
+class UploadQueue:
+    """持久化的异步上传队列
+
+    每个任务以 JSON 文件保存在 queue_dir 中，入队、每张图上传完成、每次重试时落盘，
+    插件重启后自动恢复未完成的任务。workers 个协程并发处理，
+    同一群同时最多 per_group 个任务；失败按指数退避重试，最多 max_attempts 次。
+    处理逻辑与完成通知由调用方提供（handler / notifier）。
+    """
+
+    def __init__(
+        self,
+        queue_dir: Path,
+        handler: UploadHandler,
+        notifier: Notifier,
+        workers: int = 2,
+        per_group: int = 1,
+        max_attempts: int = 5,
+        base_delay: float = 5.0,
+        max_delay: float = 300.0,
+    ):
+        self.queue_dir = queue_dir
+        self.handler = handler
+        self.notifier = notifier
+        self.workers = max(1, workers)
+        self.per_group = max(1, per_group)
+        self.max_attempts = max(1, max_attempts)
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self._jobs: dict[str, UploadJob] = {}
+        self._running: set[str] = set()
+        self._group_running: dict[int, int] = defaultdict(int)
+        self._clients: dict[str, object] = {}
+        self._wakeup = asyncio.Event()
+        self._tasks: list[asyncio.Task] = []
+        self._closing = False
+        self.completed = 0
+        self.failed = 0
+        self.retries = 0
+
+    # ---------- 持久化 ----------
+
+    def _job_path(self, job_id: str) -> Path:
+        return self.queue_dir / f"{job_id}.json"
+
+    def save(self, job: UploadJob) -> None:
+        self.queue_dir.mkdir(parents=True, exist_ok=True)
+        path = self._job_path(job.job_id)
+        tmp = path.with_name(path.name + ".tmp")
+        tmp.write_text(json.dumps(asdict(job), ensure_ascii=False), encoding="utf-8")
+        os.replace(tmp, path)
+
+    def _discard(self, job: UploadJob) -> None:
+        self._jobs.pop(job.job_id, None)
+        try:
+            self._job_path(job.job_id).unlink()
+        except FileNotFoundError:
+            pass
+
+    def _load(self) -> None:
+        if not self.queue_dir.is_dir():
+            return
+        for path in self.queue_dir.glob("*.json"):
+            try:
+                job = UploadJob(**json.loads(path.read_text(encoding="utf-8")))
+            except (OSError, ValueError, TypeError) as e:
+                logger.warning(f"[qun_album] 上传任务文件损坏，已跳过: {path.name}: {e}")
+                continue
+            self._jobs[job.job_id] = job
+        if self._jobs:
+            logger.info(
+                f"[qun_album] 恢复未完成的上传任务 {len(self._jobs)} 个，"
+                "将在对应机器人收到群消息（注册客户端）后继续"
+            )
+
+    # ---------- 生命周期 ----------
+
+    def start(self) -> None:
+        if self._tasks:
+            return
+        self._load()
+        self._tasks = [
+            asyncio.create_task(self._worker(), name=f"qun-album-上传-{i}")
+            for i in range(self.workers)
+        ]
+
+    async def close(self, drain_timeout: float = 10.0) -> None:
+        """停止接收新任务，等待执行中的任务最多 drain_timeout 秒，其余留在磁盘上次启动时继续"""
+        self._closing = True
+        self._wakeup.set()
+        if not self._tasks:
+            return
+        _, pending = await asyncio.wait(self._tasks, timeout=drain_timeout)
+        for task in pending:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        if self._jobs:
+            logger.info(f"[qun_album] {len(self._jobs)} 个上传任务已保存，下次启动时继续")
+
+    def register_client(self, self_id, client) -> None:
+        """记录机器人客户端；重启后恢复的任务要等对应机器人出现后才能执行"""
+        key = str(self_id)
+        if self._clients.get(key) is not client:
+            if key not in self._clients:
+                parked = sum(1 for j in self._jobs.values() if j.self_id == key)
+                if parked:
+                    logger.info(
+                        f"[qun_album] 机器人 {key} 已连接，继续 {parked} 个上传任务"
+                    )
+            self._clients[key] = client
+            self._wakeup.set()
+
+    # ---------- 入队与调度 ----------
+
+    async def submit(self, job: UploadJob, client) -> int:
+        """入队并返回当前排在它前面的任务数"""
+        if self._closing:
+            raise RuntimeError("上传队列已关闭")
+        self.register_client(job.self_id, client)
+        await asyncio.to_thread(self.save, job)
+        ahead = len(self._jobs)
+        self._jobs[job.job_id] = job
+        self._wakeup.set()
+        return ahead
+
+    @staticmethod
+    def new_job_id() -> str:
+        return f"{int(time.time())}_{uuid.uuid4().hex[:8]}"
+
+    def _next_ready(self) -> UploadJob | None:
+        now = time.time()
+        for job in sorted(self._jobs.values(), key=lambda j: (j.next_at, j.created_at)):
+            if job.job_id in self._running or job.next_at > now:
+                continue
+            if job.self_id not in self._clients:
+                continue
+            if self._group_running[job.group_id] >= self.per_group:
+                continue
+            return job
+        return None
+
+    def _next_delay(self) -> float | None:
+        """距最近一个退避结束的任务还有多久；没有时返回 None（等待唤醒）
+
+        已就绪但所在群已满的任务不计入：执行中的任务结束时会唤醒 worker。
+        """
+        now = time.time()
+        waiting = [
+            job.next_at
+            for job in self._jobs.values()
+            if job.job_id not in self._running
+            and job.self_id in self._clients
+            and job.next_at > now
+            and self._group_running[job.group_id] < self.per_group
+        ]
+        if not waiting:
+            return None
+        return max(0.1, min(waiting) - now)
+
+    async def _worker(self) -> None:
+        while not self._closing:
+            self._wakeup.clear()
+            job = self._next_ready()
+            if job is None:
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), self._next_delay())
+                except asyncio.TimeoutError:
+                    pass
+                continue
+            self._running.add(job.job_id)
+            self._group_running[job.group_id] += 1
+            try:
+                await self._run(job)
+            finally:
+                self._running.discard(job.job_id)
+                self._group_running[job.group_id] -= 1
+                self._wakeup.set()
+
+    async def _run(self, job: UploadJob) -> None:
+        client = self._clients[job.self_id]
+        try:
+            await self.handler(job, client)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            job.attempts += 1
+            job.last_error = str(e)
+            if job.attempts >= self.max_attempts:
+                self.failed += 1
+                logger.error(
+                    f"[qun_album] 上传任务 {job.job_id} 重试 {job.attempts} 次后放弃: {e}"
+                )
+                self._discard(job)
+                await self._notify(job, client, job.last_error)
+                return
+            self.retries += 1
+            delay = min(self.max_delay, self.base_delay * 2 ** (job.attempts - 1))
+            job.next_at = time.time() + delay * random.uniform(0.8, 1.2)
+            logger.warning(
+                f"[qun_album] 上传任务 {job.job_id} 第 {job.attempts} 次失败，"
+                f"{delay:.0f}s 后重试: {e}"
+            )
+            await asyncio.to_thread(self.save, job)
+            return
+        self.completed += 1
+        self._discard(job)
+        await self._notify(job, client, None)
+
+    async def _notify(self, job: UploadJob, client, error: str | None) -> None:
+        try:
+            await self.notifier(job, client, error)
+        except Exception as e:
+            logger.warning(f"[qun_album] 发送上传结果通知失败: {e}")
+
+    def stats(self) -> dict:
+        return {
+            "pending": len(self._jobs) - len(self._running),
+            "running": len(self._running),
+            "no_client": sum(
+                1 for j in self._jobs.values() if j.self_id not in self._clients
+            ),
+            "completed": self.completed,
+            "failed": self.failed,
+            "retries": self.retries,
+        }
@@ -1,21 +1,47 @@
+import asyncio
 import base64
 from pathlib import Path
 import random
-from typing import Any, Optional
+import time
+from typing import Any
 from aiocqhttp import CQHttp
-import aiohttp
 from astrbot.api import logger
-from astrbot.core.message.components import Image, Plain, Reply, At, File
+from astrbot.core.message.components import (
+    At,
+    File,
+    Forward,
+    Image,
+    Node,
+    Nodes,
+    Plain,
+    Reply,
+)
 from astrbot.core.platform.astr_message_event import AstrMessageEvent
 from astrbot.core.platform.sources.aiocqhttp.aiocqhttp_message_event import (
     AiocqhttpMessageEvent,
 )
 
-from PIL import Image as PILImage
-import io
+from .backend_registry import (
+    BATCH_UPLOAD_ACTION,
+    UPLOAD_ACTIONS,
+    candidate_actions,
+    get_backend_registry,
+    is_unsupported_action,
+)
+from .http_client import get_http_client
+from .ingest import IMAGE_SUFFIXES, ImageHandle, ingest_source
+from .member_cache import get_member_cache
+from .message_buffer import BufferedMessage, get_message_buffer
+from .upload_modes import get_upload_tracker
 
 
 ILLEGAL_CHARS = frozenset('\\/:*?"<>|')
+# 单次 upload_group_album 携带的文件数
+BATCH_UPLOAD_SIZE = 20
+# 不支持批量接口的协议端同时进行的单张上传数
+BATCH_UPLOAD_CONCURRENCY = 3
+COLLECT_DOWNLOAD_CONCURRENCY = 6
+FORWARD_MAX_DEPTH = 3
 
 
 def sanitize_filename(name: str, fallback: str = "default") -> str:
@@ -26,15 +52,6 @@ def sanitize_filename(name: str, fallback: str = "default") -> str:
     return cleaned if cleaned else fallback
 
 
-def detect_image_ext(data: bytes, fallback: str = "png") -> str:
-    try:
-        img = PILImage.open(io.BytesIO(data))
-        fmt = (img.format or "").lower()
-        return {"jpeg": "jpg", "tiff": "tif"}.get(fmt, fmt) if fmt else fallback
-    except Exception:
-        return fallback
-
-
 def _normalize_album_item(item: dict) -> dict:
     if "id" in item and "album_id" not in item:
         item["album_id"] = item["id"]
@@ -70,201 +87,180 @@ def normalize_album_list_response(payload: Any) -> list[dict]:
     return []
 
 
-async def _upload_napcat(
-    event: AiocqhttpMessageEvent,
+async def _build_upload_payload(mode: str, save_path: Path) -> str:
+    """按上传模式构造 file 参数；base64 只在真正尝试该模式时才读取并编码"""
+    if mode == "raw_path":
+        return str(save_path.absolute())
+    if mode == "file_uri":
+        return f"file://{save_path.absolute()}"
+    data = await asyncio.to_thread(save_path.read_bytes)
+    return f"base64://{base64.b64encode(data).decode('ascii')}"
+
+
+async def _call_upload(
+    client: CQHttp,
+    self_id,
+    backend: str,
     raw_group_id: int,
     raw_album_id: Any,
     album_name: str,
-    file_path: str,
-    file_base64: str,
-    file_uri: str,
+    file_values: list[str],
 ) -> None:
-    candidates = [
-        (
-            "group=int|album_id=str|album_name=str|file=raw_path",
-            raw_group_id,
-            str(raw_album_id),
-            str(album_name),
-            file_path,
-        ),
-        (
-            "group=int|album_id=str|album_name=str|file=base64",
-            raw_group_id,
-            str(raw_album_id),
-            str(album_name),
-            file_base64,
-        ),
-        (
-            "group=int|album_id=str|album_name=str|file=file_uri",
-            raw_group_id,
-            str(raw_album_id),
-            str(album_name),
-            file_uri,
-        ),
-    ]
-    last_error = None
-    failure_modes: list[tuple[str, str]] = []
-    for mode, group_value, album_id_value, album_name_value, file_value in candidates:
-        logger.debug(
-            "[qun_album] 尝试上传群相册图片(napcat) "
-            f"模式={mode}, group_id={group_value}, "
-            f"album_id={album_id_value}, album_name={album_name_value}, "
-            f"file_preview={file_value[:120]}"
-        )
-        try:
-            await event.bot.upload_image_to_qun_album(
-                group_id=group_value,
-                album_id=album_id_value,
-                album_name=album_name_value,
-                file=file_value,
+    """调用协议端上传接口，按该机器人的接口支持记录选择；多个文件只能走批量接口"""
+
+    async def invoke(action: str) -> None:
+        if action == BATCH_UPLOAD_ACTION:
+            await client.api.call_action(
+                action,
+                group_id=raw_group_id,
+                album_id=str(raw_album_id),
+                files=file_values,
             )
-            logger.debug(f"[qun_album] 上传群相册成功(napcat)，模式: {mode}")
-            return
-        except Exception as e:
-            last_error = e
-            failure_modes.append((mode, str(e)))
-            logger.warning(f"[qun_album] 上传群相册失败(napcat)，模式={mode}: {e}")
-    if failure_modes:
-        logger.debug(f"[qun_album] napcat 各上传模式失败详情: {failure_modes}")
-    raise last_error
+        else:
+            await client.api.call_action(
+                action,
+                group_id=raw_group_id,
+                album_id=str(raw_album_id),
+                album_name=str(album_name),
+                file=file_values[0],
+            )
+
+    candidates = candidate_actions(UPLOAD_ACTIONS, backend)
+    if len(file_values) > 1:
+        candidates = (BATCH_UPLOAD_ACTION,)
+    await get_backend_registry().call(self_id, candidates, invoke)
+
+
+def _batch_upload_preferred(self_id, backend: str) -> bool:
+    actions = get_backend_registry().actions(
+        self_id, candidate_actions(UPLOAD_ACTIONS, backend)
+    )
+    return actions[0] == BATCH_UPLOAD_ACTION
 
 
-async def _upload_snowluma(
-    event: AiocqhttpMessageEvent,
+async def upload_album_image(
+    client: CQHttp,
+    self_id,
     raw_group_id: int,
     raw_album_id: Any,
     album_name: str,
-    file_path: str,
-    file_base64: str,
-    file_uri: str,
+    save_path: Path,
+    backend: str = "napcat",
 ) -> None:
-    candidates = [
-        (
-            "group=int|album_id=str|album_name=str|file=raw_path",
-            raw_group_id,
-            str(raw_album_id),
-            str(album_name),
-            file_path,
-        ),
-        (
-            "group=int|album_id=str|album_name=str|file=base64",
-            raw_group_id,
-            str(raw_album_id),
-            str(album_name),
-            file_base64,
-        ),
-        (
-            "group=int|album_id=str|album_name=str|file=file_uri",
-            raw_group_id,
-            str(raw_album_id),
-            str(album_name),
-            file_uri,
-        ),
-    ]
+    await _upload_with_modes(
+        client, self_id, raw_group_id, raw_album_id, album_name, [save_path], backend
+    )
+
+
+async def _upload_with_modes(
+    client: CQHttp,
+    self_id,
+    raw_group_id: int,
+    raw_album_id: Any,
+    album_name: str,
+    save_paths: list[Path],
+    backend: str,
+) -> None:
+    """依次尝试各文件参数形式上传，优先使用该机器人上次成功的模式"""
+    tracker = get_upload_tracker()
+    client_key = str(self_id)
     last_error = None
     failure_modes: list[tuple[str, str]] = []
-    for mode, group_value, album_id_value, album_name_value, file_value in candidates:
+    for mode in tracker.order(client_key, backend):
+        file_values = [await _build_upload_payload(mode, p) for p in save_paths]
         logger.debug(
-            "[qun_album] 尝试上传群相册图片(snowluma) "
-            f"模式={mode}, group_id={group_value}, "
-            f"album_id={album_id_value}, album_name={album_name_value}, "
-            f"file_preview={file_value[:120]}"
+            f"[qun_album] 尝试上传群相册图片({backend}) "
+            f"模式={mode}, group_id={raw_group_id}, "
+            f"album_id={raw_album_id}, album_name={album_name}, "
+            f"files={len(file_values)}, file_preview={file_values[0][:120]}"
         )
+        start = time.perf_counter()
         try:
-            await event.bot.api.call_action(
-                "upload_image_to_qun_album",
-                group_id=group_value,
-                album_id=album_id_value,
-                album_name=album_name_value,
-                file=file_value,
+            await _call_upload(
+                client,
+                self_id,
+                backend,
+                raw_group_id,
+                raw_album_id,
+                album_name,
+                file_values,
             )
-            logger.debug(f"[qun_album] 上传群相册成功(snowluma)，模式: {mode}")
-            return
         except Exception as e:
+            if is_unsupported_action(e):
+                # 接口本身不可用，换文件参数形式也没有意义
+                raise
+            tracker.record_failure(
+                client_key, backend, mode, (time.perf_counter() - start) * 1000
+            )
             last_error = e
             failure_modes.append((mode, str(e)))
-            logger.warning(f"[qun_album] 上传群相册失败(snowluma)，模式={mode}: {e}")
+            logger.warning(f"[qun_album] 上传群相册失败({backend})，模式={mode}: {e}")
+            continue
+        tracker.record_success(
+            client_key, backend, mode, (time.perf_counter() - start) * 1000
+        )
+        logger.debug(f"[qun_album] 上传群相册成功({backend})，模式: {mode}")
+        return
     if failure_modes:
-        logger.debug(f"[qun_album] snowluma 各上传模式失败详情: {failure_modes}")
+        logger.debug(f"[qun_album] {backend} 各上传模式失败详情: {failure_modes}")
     raise last_error
 
 
-async def upload_album_image_with_fallback(
-    event: AiocqhttpMessageEvent,
+async def upload_album_images(
+    client: CQHttp,
+    self_id,
     raw_group_id: int,
     raw_album_id: Any,
     album_name: str,
-    save_path: Path,
+    save_paths: list[Path],
     backend: str = "napcat",
-) -> None:
-    file_path = str(save_path.absolute())
-    file_uri = f"file://{save_path.absolute()}"
-    file_base64 = f"base64://{base64.b64encode(save_path.read_bytes()).decode('ascii')}"
-
-    if backend == "llbot":
-        candidates = [
-            ("group=int|album_id=str|files=[raw_path]", [file_path]),
-            ("group=int|album_id=str|files=[file_uri]", [file_uri]),
-            ("group=int|album_id=str|files=[base64]", [file_base64]),
-        ]
-        last_error = None
-        failure_modes: list[tuple[str, str]] = []
-        for mode, files_value in candidates:
-            logger.debug(
-                "[qun_album] 尝试上传群相册图片(llbot) "
-                f"模式={mode}, group_id={raw_group_id}, "
-                f"album_id={raw_album_id}, files_preview={files_value[0][:120]}"
+) -> list[Exception | None]:
+    """批量上传，返回与 save_paths 一一对应的结果（None 表示成功）
+
+    首选批量接口的协议端每 BATCH_UPLOAD_SIZE 张调用一次；其他协议端并发逐张上传，
+    批量接口被确认不支持时剩余图片也改为逐张上传。
+    """
+    results: list[Exception | None] = [None] * len(save_paths)
+    start = 0
+    while start < len(save_paths) and _batch_upload_preferred(self_id, backend):
+        chunk = save_paths[start : start + BATCH_UPLOAD_SIZE]
+        try:
+            await _upload_with_modes(
+                client,
+                self_id,
+                raw_group_id,
+                raw_album_id,
+                album_name,
+                chunk,
+                backend,
             )
+        except Exception as e:
+            if is_unsupported_action(e):
+                break
+            results[start : start + len(chunk)] = [e] * len(chunk)
+        start += len(chunk)
+
+    sem = asyncio.Semaphore(BATCH_UPLOAD_CONCURRENCY)
+
+    async def upload_one(index: int, save_path: Path) -> None:
+        async with sem:
             try:
-                await event.bot.api.call_action(
-                    "upload_group_album",
-                    group_id=raw_group_id,
-                    album_id=str(raw_album_id),
-                    files=files_value,
+                await upload_album_image(
+                    client,
+                    self_id,
+                    raw_group_id,
+                    raw_album_id,
+                    album_name,
+                    save_path,
+                    backend,
                 )
-                logger.debug(f"[qun_album] 上传群相册成功(llbot)，模式: {mode}")
-                return
             except Exception as e:
-                last_error = e
-                failure_modes.append((mode, str(e)))
-                logger.warning(f"[qun_album] 上传群相册失败(llbot)，模式={mode}: {e}")
-        if failure_modes:
-            logger.debug(f"[qun_album] llbot 各上传模式失败详情: {failure_modes}")
-        raise last_error
-
-    if backend == "snowluma":
-        await _upload_snowluma(
-            event,
-            raw_group_id,
-            raw_album_id,
-            album_name,
-            file_path,
-            file_base64,
-            file_uri,
-        )
-    else:
-        await _upload_napcat(
-            event,
-            raw_group_id,
-            raw_album_id,
-            album_name,
-            file_path,
-            file_base64,
-            file_uri,
-        )
+                results[index] = e
 
-
-async def download_image(url: str, http: bool = True) -> bytes | None:
-    """下载图片"""
-    if http:
-        url = url.replace("https://", "http://")
-    try:
-        async with aiohttp.ClientSession() as session:
-            async with session.get(url) as resp:
-                return await resp.read()
-    except Exception as e:
-        logger.error(f"图片下载失败: {e}")
-        return None
+    await asyncio.gather(
+        *(upload_one(i, save_paths[i]) for i in range(start, len(save_paths)))
+    )
+    return results
 
 
 async def get_avatar(user_id: str) -> bytes | None:
@@ -275,78 +271,157 @@ async def get_avatar(user_id: str) -> bytes | None:
 
     avatar_url = f"https://q4.qlogo.cn/headimg_dl?dst_uin={user_id}&spec=640"
     try:
-        async with aiohttp.ClientSession() as session:
-            async with session.get(avatar_url, timeout=10) as resp:
-                resp.raise_for_status()
-                return await resp.read()
+        return await get_http_client().fetch(avatar_url)
     except Exception as e:
         logger.error(f"下载头像失败: {e}")
         return None
 
 
-async def load_bytes(src: str) -> bytes | None:
-    """统一把 src 转成 bytes"""
-    raw: Optional[bytes] = None
-    # 1. 本地文件
-    if Path(src).is_file():
-        raw = Path(src).read_bytes()
-    # 2. URL
-    elif src.startswith("http"):
-        raw = await download_image(src)
-    # 3. Base64（直接返回）
-    elif src.startswith("base64://"):
-        return base64.b64decode(src[9:])
-    return raw
+async def _forward_image_sources(client: CQHttp, nodes, depth: int) -> list:
+    """从合并转发的原始节点中提取图片来源，嵌套转发最多展开 FORWARD_MAX_DEPTH 层"""
+    sources: list = []
+    for node in nodes or []:
+        if not isinstance(node, dict):
+            continue
+        content = node.get("message") or node.get("content") or []
+        if not isinstance(content, list):
+            continue
+        for seg in content:
+            if not isinstance(seg, dict):
+                continue
+            data = seg.get("data") or {}
+            if seg.get("type") == "image":
+                sources.append(("image", data.get("url"), data.get("file")))
+            elif seg.get("type") == "forward" and depth < FORWARD_MAX_DEPTH:
+                if isinstance(data.get("content"), list):
+                    sources += await _forward_image_sources(
+                        client, data["content"], depth + 1
+                    )
+                elif data.get("id"):
+                    sources += await _fetch_forward_sources(
+                        client, data["id"], depth + 1
+                    )
+    return sources
+
+
+async def _fetch_forward_sources(client: CQHttp, forward_id, depth: int) -> list:
+    try:
+        res = await client.get_forward_msg(id=str(forward_id))
+    except Exception as e:
+        logger.warning(f"[qun_album] 获取合并转发 {forward_id} 失败: {e}")
+        return []
+    if isinstance(res, dict):
+        res = res.get("messages") or res.get("message") or []
+    return await _forward_image_sources(client, res, depth)
+
+
+async def _component_image_sources(
+    client: CQHttp, segments, depth: int = 0, forwards: bool = True
+) -> list:
+    sources: list = []
+    for seg in segments or []:
+        if isinstance(seg, Image):
+            sources.append(("image", seg.url, seg.file))
+        elif isinstance(seg, File):
+            if seg.name and seg.name.lower().endswith(IMAGE_SUFFIXES):
+                sources.append(("file", seg))
+        elif not forwards:
+            continue
+        elif isinstance(seg, Forward) and depth < FORWARD_MAX_DEPTH:
+            sources += await _fetch_forward_sources(client, seg.id, depth + 1)
+        elif isinstance(seg, Node) and depth < FORWARD_MAX_DEPTH:
+            sources += await _component_image_sources(client, seg.content, depth + 1)
+        elif isinstance(seg, Nodes) and depth < FORWARD_MAX_DEPTH:
+            for node in seg.nodes:
+                sources += await _component_image_sources(
+                    client, node.content, depth + 1
+                )
+    return sources
+
+
+async def _ingest_image_source(
+    source, temp_dir: Path, max_bytes: int = 0
+) -> ImageHandle | None:
+    if source[0] == "file":
+        try:
+            local_path = await source[1].get_file()
+            if local_path and Path(local_path).exists():
+                return await ingest_source(local_path, temp_dir, max_bytes)
+        except Exception as e:
+            logger.error(f"从文件组件获取图片失败: {e}")
+        return None
+    _, url, file = source
+    if url and (handle := await ingest_source(url, temp_dir, max_bytes)):
+        return handle
+    if file and (handle := await ingest_source(file, temp_dir, max_bytes)):
+        return handle
+    return None
 
 
-async def get_first_image(event: AstrMessageEvent) -> bytes | None:
+async def ingest_first_image(
+    event: AstrMessageEvent, temp_dir: Path, max_bytes: int = 0
+) -> ImageHandle | None:
     """
-    获取消息里的第一张图并以 Base64 字符串返回。
+    把消息里的第一张图流式写入 temp_dir 并返回句柄。
     顺序：
     1) 引用消息中的图片
     2) 当前消息中的图片
     找不到返回 None。
     """
+    reply_seg = next((s for s in event.get_messages() if isinstance(s, Reply)), None)
+    sources: list = []
+    if reply_seg and reply_seg.chain:
+        sources += await _component_image_sources(
+            event.bot, reply_seg.chain, forwards=False
+        )
+    sources += await _component_image_sources(
+        event.bot, event.get_messages(), forwards=False
+    )
+    for source in sources:
+        if handle := await _ingest_image_source(source, temp_dir, max_bytes):
+            return handle
+    return None
+
 
-    # ---------- 1. 先看引用 ----------
+async def collect_images(
+    event: AiocqhttpMessageEvent, temp_dir: Path, limit: int = 0, max_bytes: int = 0
+) -> list[ImageHandle]:
+    """收集引用消息、当前消息及其中合并转发里的所有图片，流式写入 temp_dir
+
+    先按出现顺序整理出全部来源并去重，再并发下载；内容相同的图片只保留一张。
+    limit 大于 0 时最多返回 limit 张。
+    """
     reply_seg = next((s for s in event.get_messages() if isinstance(s, Reply)), None)
+    sources: list = []
     if reply_seg and reply_seg.chain:
-        for seg in reply_seg.chain:
-            if isinstance(seg, Image):
-                if seg.url and (img := await load_bytes(seg.url)):
-                    return img
-                if seg.file and (img := await load_bytes(seg.file)):
-                    return img
-            elif isinstance(seg, File):
-                # 检查是否为图片文件
-                if seg.name and seg.name.lower().endswith(
-                    (".jpg", ".jpeg", ".png", ".gif", ".webp")
-                ):
-                    try:
-                        local_path = await seg.get_file()
-                        if local_path and Path(local_path).exists():
-                            return Path(local_path).read_bytes()
-                    except Exception as e:
-                        logger.error(f"从文件组件获取图片失败: {e}")
-
-    # ---------- 2. 再看当前消息 ----------
-    for seg in event.get_messages():
-        if isinstance(seg, Image):
-            if seg.url and (img := await load_bytes(seg.url)):
-                return img
-            if seg.file and (img := await load_bytes(seg.file)):
-                return img
-        elif isinstance(seg, File):
-            # 检查是否为图片文件
-            if seg.name and seg.name.lower().endswith(
-                (".jpg", ".jpeg", ".png", ".gif", ".webp")
-            ):
-                try:
-                    local_path = await seg.get_file()
-                    if local_path and Path(local_path).exists():
-                        return Path(local_path).read_bytes()
-                except Exception as e:
-                    logger.error(f"从文件组件获取图片失败: {e}")
+        sources += await _component_image_sources(event.bot, reply_seg.chain)
+    sources += await _component_image_sources(event.bot, event.get_messages())
+
+    unique: dict = {}
+    for source in sources:
+        key = source if source[0] == "image" else ("file", source[1].name)
+        unique.setdefault(key, source)
+    sources = list(unique.values())
+    if limit:
+        sources = sources[:limit]
+
+    sem = asyncio.Semaphore(COLLECT_DOWNLOAD_CONCURRENCY)
+
+    async def load(source) -> ImageHandle | None:
+        async with sem:
+            return await _ingest_image_source(source, temp_dir, max_bytes)
+
+    images: list[ImageHandle] = []
+    digests: set[str] = set()
+    for handle in await asyncio.gather(*(load(src) for src in sources)):
+        if handle is None:
+            continue
+        if handle.sha256 in digests:
+            handle.path.unlink(missing_ok=True)
+            continue
+        digests.add(handle.sha256)
+        images.append(handle)
+    return images
 
 
 def get_replyer_id(event: AiocqhttpMessageEvent) -> str | None:
@@ -379,27 +454,12 @@ async def get_reply_text_async(event: AiocqhttpMessageEvent) -> str:
     return text
 
 
-async def get_user_name(client: CQHttp, user_id: int, group_id: int = 0) -> str:
-    """
-    获取群成员的昵称或群名片，无法获取则返回“未知用户”
-    """
-    if user_id == 0:
-        return "未知"
-    if group_id:
-        member_info = await client.get_group_member_info(
-            group_id=group_id, user_id=user_id
-        )
-        if name := member_info.get("card") or member_info.get("nickname"):
-            return name
-    name = (await client.get_stranger_info(user_id=user_id)).get("nickname")
-    return name or "未知"
-
-
 async def check_group_level_permission(
-    event: AiocqhttpMessageEvent, level_threshold: int
+    event: AiocqhttpMessageEvent, level_threshold: int, max_age: float = 0
 ) -> tuple[bool, int]:
     """
     检查群成员等级权限
+    max_age > 0 时允许使用不超过该秒数的缓存成员信息，否则总是实时查询
     返回: (是否允许, 当前等级)
     """
     if level_threshold <= 0:
@@ -408,9 +468,7 @@ async def check_group_level_permission(
     try:
         group_id = int(event.get_group_id())
         user_id = int(event.get_sender_id())
-        info = await event.bot.get_group_member_info(
-            group_id=group_id, user_id=user_id, no_cache=True
-        )
+        info = await _lookup_member(event.bot, group_id, user_id, max_age=max_age)
         level = int(info.get("level", 0))
         role = info.get("role", "unknown")
 
@@ -428,9 +486,203 @@ async def check_group_level_permission(
         return True, 0
 
 
+HISTORY_PAGE_SIZE = 200
+HISTORY_MAX_SCAN = 32000
+MENTION_RESOLVE_CONCURRENCY = 8
+
+
+def _history_messages(res) -> list[dict]:
+    messages = res.get("messages", []) if isinstance(res, dict) else res
+    return [m for m in messages or [] if isinstance(m, dict)]
+
+
+def _history_seq(msg: dict):
+    """消息的序号；message_id 与序号不一定单调对应，不能作为翻页游标"""
+    return msg.get("message_seq") or msg.get("real_seq")
+
+
+def extract_message_parts(raw_msg) -> list:
+    """提取 OneBot 消息段中的文本片段（不做任何网络请求）
+
+    返回列表中 str 为文本，int 为需要查询昵称的 @ 对象 QQ 号。
+    """
+    if isinstance(raw_msg, str):
+        return [raw_msg] if raw_msg else []
+    parts: list = []
+    if not isinstance(raw_msg, list):
+        return parts
+    for seg in raw_msg:
+        if not isinstance(seg, dict):
+            continue
+        data = seg.get("data") or {}
+        if seg.get("type") == "text":
+            parts.append(data.get("text", ""))
+        elif seg.get("type") == "at":
+            qq = data.get("qq")
+            name = data.get("name")
+            if name:
+                parts.append(f"@{name} ")
+            elif qq and str(qq).isdigit():
+                parts.append(int(qq))
+            elif qq:
+                parts.append(f"@{qq} ")
+        elif seg.get("type") == "file":
+            parts.append(f"[文件: {data.get('file', '未知文件')}]")
+    return parts
+
+
+def render_message_parts(parts, names: dict[int, str]) -> str:
+    """把 extract_message_parts 的结果拼成文本，@ 对象替换为 names 中的昵称"""
+    text = ""
+    for part in parts:
+        if isinstance(part, int):
+            text += f"@{names.get(part) or part} "
+        else:
+            text += part
+    return text
+
+
+async def _resolve_user_name(
+    client: CQHttp, group_id: int, user_id: int
+) -> str | None:
+    """依次尝试群成员信息与陌生人信息，都查不到时返回 None"""
+    try:
+        info = await _lookup_member(client, group_id, user_id)
+        if name := info.get("card") or info.get("nickname"):
+            return name
+    except Exception:
+        pass
+    try:
+        return (await client.get_stranger_info(user_id=user_id)).get("nickname")
+    except Exception:
+        return None
+
+
+async def resolve_user_names(client: CQHttp, group_id: int, user_ids) -> dict[int, str]:
+    """并发解析一批 QQ 号的昵称，结果（包括查不到的）写入成员缓存的昵称层"""
+    cache = get_member_cache()
+    names: dict[int, str] = {}
+    pending: list[int] = []
+    for user_id in dict.fromkeys(user_ids):
+        if cache is not None:
+            hit, name = cache.peek_name(group_id, user_id)
+            if hit:
+                if name:
+                    names[user_id] = name
+                continue
+        pending.append(user_id)
+    if not pending:
+        return names
+
+    sem = asyncio.Semaphore(MENTION_RESOLVE_CONCURRENCY)
+
+    async def resolve(user_id: int) -> str | None:
+        async with sem:
+            name = await _resolve_user_name(client, group_id, user_id)
+        if cache is not None:
+            cache.store_name(group_id, user_id, name)
+        return name
+
+    results = await asyncio.gather(*(resolve(uid) for uid in pending))
+    for user_id, name in zip(pending, results):
+        if name:
+            names[user_id] = name
+    return names
+
+
+async def _render_history(
+    event: AiocqhttpMessageEvent, group_id: int, entries: list[BufferedMessage]
+) -> list[dict]:
+    """先收集整个窗口中需要解析的 @ 对象，统一解析后再拼出文本"""
+    mentions = [p for entry in entries for p in entry.parts if isinstance(p, int)]
+    names = await resolve_user_names(event.bot, group_id, mentions)
+    return [
+        {
+            "user_id": entry.user_id,
+            "text": render_message_parts(entry.parts, names),
+            "message_id": entry.message_id,
+        }
+        for entry in entries
+    ]
+
+
+def buffered_message_from_raw(raw: dict) -> BufferedMessage | None:
+    """把群消息事件的原始数据转换为缓冲区条目"""
+    message_id = raw.get("message_id")
+    if message_id is None:
+        return None
+    seq = raw.get("real_seq")
+    try:
+        seq = int(seq) if seq not in (None, "") else None
+    except (TypeError, ValueError):
+        seq = None
+    return BufferedMessage(
+        message_id=str(message_id),
+        seq=seq,
+        time=int(raw.get("time") or 0),
+        user_id=str(raw.get("user_id") or (raw.get("sender") or {}).get("user_id")),
+        parts=tuple(extract_message_parts(raw.get("message"))),
+    )
+
+
+async def _history_from_buffer(
+    event: AiocqhttpMessageEvent, group_id: int, reply_msg_id: str, count: int
+) -> list[dict] | None:
+    buffer = get_message_buffer()
+    if buffer is None:
+        return None
+    entries = buffer.lookup(group_id, reply_msg_id, count)
+    if entries is None:
+        return None
+    return await _render_history(event, group_id, entries)
+
+
+async def _iter_history_pages(
+    event: AiocqhttpMessageEvent, group_id: int, start_seq, max_scan: int
+):
+    """从 start_seq（0 表示最新）开始按固定页大小向更早的消息翻页
+
+    每页按 [新 -> 旧] 产出，不含已产出过的消息；没有更早的消息、消息不带序号、
+    游标不再前进或累计传输超过 max_scan 条时停止。
+    """
+    cursor = start_seq
+    seen: set[str] = set()
+    scanned = 0
+    while scanned < max_scan:
+        res = await event.bot.get_group_msg_history(
+            group_id=group_id,
+            message_seq=cursor,
+            count=HISTORY_PAGE_SIZE,
+            reverseOrder=False,
+        )
+        messages = _history_messages(res)
+        scanned += len(messages)
+        page = []
+        for msg in reversed(messages):
+            key = str(msg.get("message_id"))
+            if key not in seen:
+                seen.add(key)
+                page.append(msg)
+        if not page:
+            return
+        yield page
+
+        oldest_seq = _history_seq(messages[0])
+        if not oldest_seq:
+            logger.debug("[qun_album] 历史消息不带序号，无法继续向前翻页")
+            return
+        if oldest_seq == cursor:
+            return
+        cursor = oldest_seq
+    logger.warning(f"[qun_album] 历史消息已翻阅 {scanned} 条，达到上限")
+
+
 async def get_message_history(event: AiocqhttpMessageEvent, count: int) -> list[dict]:
     """
     获取回复的消息及其之上的 count-1 条消息。
+
+    优先使用本地消息缓冲区；未覆盖时以 message_seq 为游标按固定页大小向前翻页，找到目标并凑齐 count 条有效消息即停止；
+    get_msg 返回了目标的序号时直接从目标处开始翻页。
     """
     # 获取被回复的消息 ID
     reply_seg = next(
@@ -452,119 +704,71 @@ async def get_message_history(event: AiocqhttpMessageEvent, count: int) -> list[
     reply_msg_id = str(reply_msg_id)
     group_id = int(event.get_group_id())
     logger.debug(
-        f"[qun_album] 开始迭代搜索. 目标 ID: {reply_msg_id}, 群号: {group_id}, 计划获取数量: {count}"
+        f"[qun_album] 开始翻页搜索. 目标 ID: {reply_msg_id}, 群号: {group_id}, 计划获取数量: {count}"
     )
 
     try:
-        # 1. 先获取目标消息的时间戳，用于后续范围判定
+        # 0. 目标窗口完整落在本地消息缓冲区内时直接使用
+        buffered = await _history_from_buffer(event, group_id, reply_msg_id, count)
+        if buffered is not None:
+            logger.debug(f"[qun_album] 消息缓冲区命中，共 {len(buffered)} 条")
+            return buffered
+
+        # 1. 获取目标消息的时间戳与序号：时间戳用于判定是否已翻过目标，序号用于直接定位
         target_msg_res = await event.bot.get_msg(message_id=reply_msg_id)
-        target_time = (
-            target_msg_res.get("time") if isinstance(target_msg_res, dict) else None
+        if not isinstance(target_msg_res, dict):
+            target_msg_res = {}
+        target_time = target_msg_res.get("time")
+        target_seq = target_msg_res.get("message_seq") or target_msg_res.get(
+            "real_seq"
         )
 
         if not target_time:
             logger.error(f"[qun_album] 无法获取目标消息 {reply_msg_id} 的时间戳")
             return []
 
-        logger.debug(f"[qun_album] 目标消息时间戳: {target_time}")
-
-        # 2. 采用迭代搜索的方式，从最新消息开始逐步扩大范围
-        # 起始 100 条，其次 1000，然后 2000 依次翻倍，上限 32000
-        search_counts = [100, 1000, 2000, 4000, 8000, 16000, 32000]
-        target_messages = []
-
-        for search_count in search_counts:
-            # 获取最新的 search_count 条消息，使用正序获取，即 [旧, ..., 最新]
-            res = await event.bot.get_group_msg_history(
-                group_id=group_id, message_seq=0, count=search_count, reverseOrder=False
-            )
-
-            messages = res.get("messages", []) if isinstance(res, dict) else res
-            if not messages:
-                continue
-
-            # 获取当前批次最老的消息时间
-            earliest_time = messages[0].get("time")
-            logger.debug(
-                f"[qun_album] 搜索范围 {search_count}: 最早时间 {earliest_time}, 目标时间 {target_time}"
-            )
-
-            # 如果当前批次的最早时间已经早于或等于目标时间，说明目标消息必然在当前批次内
-            if earliest_time <= target_time:
-                # 查找目标消息在当前列表中的位置
-                target_idx = -1
-                for i, msg in enumerate(messages):
-                    if str(msg.get("message_id")) == reply_msg_id:
-                        target_idx = i
-                        break
-
-                if target_idx != -1:
-                    logger.debug(
-                        f"[qun_album] 找到目标. target_idx: {target_idx}, 计划获取有效消息数量: {count}"
-                    )
+        logger.debug(f"[qun_album] 目标消息时间戳: {target_time}, 序号: {target_seq}")
 
-                    target_messages = []
-                    # 从 target_idx 开始往前找（往旧的方向找），直到找齐 count 条有效消息
-                    for i in range(target_idx, -1, -1):
-                        msg = messages[i]
-                        sender_id = str(
-                            msg.get("user_id") or msg.get("sender", {}).get("user_id")
-                        )
-                        text = ""
-                        raw_msg = msg.get("message")
-
-                        if isinstance(raw_msg, list):
-                            for seg in raw_msg:
-                                if seg.get("type") == "text":
-                                    text += seg.get("data", {}).get("text", "")
-                                elif seg.get("type") == "at":
-                                    data = seg.get("data", {})
-                                    qq = data.get("qq")
-                                    name = data.get("name")
-                                    if not name and qq:
-                                        try:
-                                            name = await get_user_name(
-                                                client=event.bot,
-                                                group_id=group_id,
-                                                user_id=int(qq),
-                                            )
-                                        except Exception:
-                                            name = str(qq)
-
-                                    if name:
-                                        text += f"@{name} "
-                                elif seg.get("type") == "file":
-                                    file_name = seg.get("data", {}).get(
-                                        "file", "未知文件"
-                                    )
-                                    text += f"[文件: {file_name}]"
-                        elif isinstance(raw_msg, str):
-                            text = raw_msg
-
-                        if text.strip():
-                            target_messages.append(
-                                {
-                                    "user_id": sender_id,
-                                    "text": text,
-                                    "message_id": msg.get("message_id"),
-                                }
-                            )
-
-                        if len(target_messages) >= count:
+        # 2. 优先从目标序号处翻页；定位失败（协议端序号语义不同）时从最新消息翻页
+        starts = [target_seq, 0] if target_seq else [0]
+        for start_seq in starts:
+            target_entries: list[BufferedMessage] = []
+            found = False
+            async for page in _iter_history_pages(
+                event, group_id, start_seq, HISTORY_MAX_SCAN
+            ):
+                for msg in page:
+                    if not found:
+                        if str(msg.get("message_id")) == reply_msg_id:
+                            found = True
+                        elif (msg.get("time") or 0) < target_time:
+                            # 已翻到比目标更早的消息，目标不在这段历史里
                             break
-
-                    target_messages.reverse()
-
-                    logger.debug(
-                        f"[qun_album] 最终获取到的有效消息列表(正序): {[m['text'] for m in target_messages]}"
-                    )
-                    return target_messages
+                        else:
+                            continue
+                    entry = buffered_message_from_raw(msg)
+                    if entry is not None and entry.has_text:
+                        target_entries.append(entry)
+                    if len(target_entries) >= count:
+                        break
                 else:
-                    logger.warning(
-                        f"[qun_album] 时间戳判定在范围内但未找到 ID: {reply_msg_id}，继续扩大搜索范围"
-                    )
+                    continue
+                break
 
-        logger.error(f"在最近 32000 条消息中未找到目标消息 ID: {reply_msg_id}")
+            if found:
+                target_entries.reverse()
+                target_messages = await _render_history(
+                    event, group_id, target_entries
+                )
+                logger.debug(
+                    f"[qun_album] 最终获取到的有效消息列表(正序): {[m['text'] for m in target_messages]}"
+                )
+                return target_messages
+            logger.debug(f"[qun_album] 从序号 {start_seq} 开始未找到目标消息")
+
+        logger.error(
+            f"在最近 {HISTORY_MAX_SCAN} 条消息中未找到目标消息 ID: {reply_msg_id}"
+        )
         return []
 
     except Exception as e:
@@ -572,14 +776,31 @@ async def get_message_history(event: AiocqhttpMessageEvent, count: int) -> list[
         return []
 
 
+async def _lookup_member(
+    client: CQHttp, group_id: int, user_id: int, max_age: float | None = None
+) -> dict:
+    """查询群成员信息，启用成员缓存时走缓存（max_age 为 0 表示强制刷新）"""
+    cache = get_member_cache()
+    if cache is None:
+        return await client.get_group_member_info(
+            group_id=group_id, user_id=user_id, no_cache=True
+        )
+    return await cache.get(client, group_id, user_id, max_age=max_age)
+
+
+async def warm_member_cache(client: CQHttp, group_id: int) -> None:
+    """批量预热群成员缓存（未启用缓存时不做任何事）"""
+    cache = get_member_cache()
+    if cache is not None and cache.needs_warm_up(group_id):
+        await cache.warm_group(client, group_id)
+
+
 async def get_member_rich_info(client: CQHttp, group_id: int, user_id: int) -> dict:
     """
     获取群成员详细信息：role, level, title, nickname
     """
     try:
-        info = await client.get_group_member_info(
-            group_id=group_id, user_id=user_id, no_cache=True
-        )
+        info = await _lookup_member(client, group_id, user_id)
         return {
             "role": info.get("role", "member"),
             "level": int(info.get("level", 0)),
@@ -0,0 +1,82 @@
+import importlib.util
+import logging
+import sys
+import types
+from pathlib import Path
+
+# 以插件根目录为导入起点，测试中通过 src.xxx 导入各模块
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+
+def _stub_module(name: str, **attrs) -> types.ModuleType:
+    """注册替身模块（连同尚不存在的上级包）"""
+    module = sys.modules.get(name)
+    if module is None:
+        module = sys.modules[name] = types.ModuleType(name)
+        parent, _, child = name.rpartition(".")
+        if parent:
+            setattr(_stub_module(parent), child, module)
+    for key, value in attrs.items():
+        setattr(module, key, value)
+    return module
+
+
+def _placeholders(*names: str) -> dict[str, type]:
+    return {name: type(name, (), {}) for name in names}
+
+
+def _stub_astrbot() -> None:
+    """未安装 AstrBot 时提供最小替身：logger 与被导入的消息 / 事件类型占位
+
+    测试只覆盖不依赖 AstrBot 运行时的逻辑，占位类型仅用于满足模块导入。
+    """
+    logger = logging.getLogger("astrbot")
+    _stub_module("astrbot", logger=logger)
+    _stub_module("astrbot.api", logger=logger)
+    _stub_module(
+        "astrbot.core.message.components",
+        **_placeholders(
+            "At", "File", "Forward", "Image", "Node", "Nodes", "Plain", "Reply"
+        ),
+    )
+    _stub_module(
+        "astrbot.core.platform.astr_message_event",
+        **_placeholders("AstrMessageEvent"),
+    )
+    _stub_module(
+        "astrbot.core.platform.sources.aiocqhttp.aiocqhttp_message_event",
+        **_placeholders("AiocqhttpMessageEvent"),
+    )
+
+
+def _stub_aiocqhttp() -> None:
+    """未安装 aiocqhttp 时提供与其一致的异常类型及 CQHttp 占位"""
+
+    class Error(Exception):
+        pass
+
+    class ApiNotAvailable(Error):
+        pass
+
+    class ActionFailed(Error):
+        def __init__(self, result: dict):
+            super().__init__(result)
+            self.result = result
+
+        @property
+        def retcode(self):
+            return self.result.get("retcode")
+
+    _stub_module("aiocqhttp", **_placeholders("CQHttp"))
+    _stub_module(
+        "aiocqhttp.exceptions",
+        Error=Error,
+        ApiNotAvailable=ApiNotAvailable,
+        ActionFailed=ActionFailed,
+    )
+
+
+if importlib.util.find_spec("astrbot") is None:
+    _stub_astrbot()
+if importlib.util.find_spec("aiocqhttp") is None:
+    _stub_aiocqhttp()
@@ -0,0 +1,122 @@
+import asyncio
+
+import pytest
+
+from src.album_catalog import AlbumCatalog
+
+
+class Fetcher:
+    """假的相册列表接口，每次调用返回 albums 的当前内容"""
+
+    def __init__(self, *names: str, delay: float = 0):
+        self.albums = [{"album_id": str(i), "name": n} for i, n in enumerate(names)]
+        self.delay = delay
+        self.calls = 0
+        self.error: Exception | None = None
+
+    async def __call__(self) -> list[dict]:
+        self.calls += 1
+        await asyncio.sleep(self.delay)
+        if self.error is not None:
+            raise self.error
+        return [dict(a) for a in self.albums]
+
+
+def test_find_caches_by_name():
+    fetch = Fetcher("日常", "表情")
+
+    async def run():
+        catalog = AlbumCatalog()
+        first = await catalog.find(1, "表情", fetch)
+        second = await catalog.find(1, "表情", fetch)
+        default = await catalog.find(1, None, fetch)
+        return catalog, first, second, default
+
+    catalog, first, second, default = asyncio.run(run())
+    assert first == ({"album_id": "1", "name": "表情"}, False)
+    assert second == ({"album_id": "1", "name": "表情"}, True)
+    assert default[0]["name"] == "日常"
+    assert fetch.calls == 1
+    assert catalog.stats()["hits"] == 2
+
+
+def test_concurrent_misses_fetch_once():
+    fetch = Fetcher("日常", delay=0.02)
+
+    async def run():
+        catalog = AlbumCatalog()
+        return await asyncio.gather(*(catalog.find(1, "日常", fetch) for _ in range(5)))
+
+    results = asyncio.run(run())
+    assert [album["album_id"] for album, _ in results] == ["0"] * 5
+    assert fetch.calls == 1
+
+
+def test_unknown_name_refetches_only_after_miss_interval():
+    fetch = Fetcher("日常")
+
+    async def run():
+        catalog = AlbumCatalog(miss_refresh_interval=30)
+        await catalog.find(1, "日常", fetch)
+        fetch.albums.append({"album_id": "9", "name": "新相册"})
+        recent = await catalog.find(1, "新相册", fetch)
+        catalog._groups[1].fetched_at -= 60
+        later = await catalog.find(1, "新相册", fetch)
+        return recent, later
+
+    recent, later = asyncio.run(run())
+    assert recent == (None, True)
+    assert later == ({"album_id": "9", "name": "新相册"}, False)
+    assert fetch.calls == 2
+
+
+def test_stale_entry_is_served_and_refreshed_in_background():
+    fetch = Fetcher("日常")
+    refreshed = []
+
+    async def on_refresh(group_id, albums):
+        refreshed.append([a["name"] for a in albums])
+
+    async def run():
+        catalog = AlbumCatalog(ttl=10, on_refresh=on_refresh)
+        await catalog.find(1, "日常", fetch)
+        catalog._groups[1].fetched_at -= 60
+        fetch.albums[0]["name"] = "改名后"
+        stale = await catalog.find(1, "日常", fetch)
+        await asyncio.sleep(0.01)
+        fresh = await catalog.find(1, "改名后", fetch)
+        await catalog.close()
+        return stale, fresh
+
+    stale, fresh = asyncio.run(run())
+    assert stale == ({"album_id": "0", "name": "日常"}, True)
+    assert fresh == ({"album_id": "0", "name": "改名后"}, True)
+    assert refreshed == [["日常"], ["改名后"]]
+    assert fetch.calls == 2
+
+
+def test_failed_fetch_propagates_and_is_retried():
+    fetch = Fetcher("日常")
+    fetch.error = RuntimeError("timeout")
+
+    async def run():
+        catalog = AlbumCatalog()
+        with pytest.raises(RuntimeError):
+            await catalog.find(1, "日常", fetch)
+        fetch.error = None
+        return await catalog.find(1, "日常", fetch)
+
+    assert asyncio.run(run())[0]["album_id"] == "0"
+
+
+def test_invalidate_forces_refetch():
+    fetch = Fetcher("日常")
+
+    async def run():
+        catalog = AlbumCatalog()
+        await catalog.find(1, "日常", fetch)
+        catalog.invalidate(1)
+        return await catalog.find(1, "日常", fetch)
+
+    assert asyncio.run(run())[1] is False
+    assert fetch.calls == 2
@@ -0,0 +1,105 @@
+import asyncio
+import hashlib
+
+import pytest
+
+from src import avatar_cache
+from src.avatar_cache import Avatar, AvatarCache
+
+
+class FakeHttp:
+    """假的头像 CDN：带 If-None-Match 且 ETag 未变时返回 304"""
+
+    def __init__(self, data: bytes = b"avatar", etag: str = '"v1"'):
+        self.data = data
+        self.etag = etag
+        self.requests: list[tuple[str, dict]] = []
+        self.fail = False
+
+    async def request(self, url, headers=None, max_bytes=None):
+        self.requests.append((url, dict(headers or {})))
+        if self.fail:
+            raise RuntimeError("network down")
+        if headers and headers.get("If-None-Match") == self.etag:
+            return 304, {"etag": self.etag}, b""
+        return 200, {"etag": self.etag}, self.data
+
+
+@pytest.fixture
+def http(monkeypatch):
+    fake = FakeHttp()
+    monkeypatch.setattr(avatar_cache, "get_http_client", lambda: fake)
+    return fake
+
+
+@pytest.fixture(autouse=True)
+def no_decode(monkeypatch):
+    # 跳过 PIL 解码裁圆，用原始字节代替图像
+    async def build(self, user_id, data, fetched_at):
+        digest = hashlib.sha256(data).hexdigest()
+        return self._remember(user_id, Avatar(data, digest, fetched_at))
+
+    monkeypatch.setattr(AvatarCache, "_build", build)
+
+
+def test_memory_hit_avoids_network(tmp_path, http):
+    cache = AvatarCache(cache_dir=tmp_path)
+
+    async def run():
+        first = await cache.get("12345")
+        second = await cache.get("12345")
+        return first, second
+
+    first, second = asyncio.run(run())
+    assert first is second
+    assert first.image == b"avatar"
+    assert len(http.requests) == 1
+    assert "spec=140" in http.requests[0][0]
+    assert cache.stats()["memory_hits"] == 1
+
+
+def test_expired_entry_revalidates_with_etag(tmp_path, http):
+    cache = AvatarCache(cache_dir=tmp_path, ttl=0)
+
+    async def run():
+        await cache.get("12345")
+        return await cache.get("12345")
+
+    avatar = asyncio.run(run())
+    assert avatar.image == b"avatar"
+    assert http.requests[1][1] == {"If-None-Match": '"v1"'}
+    assert cache.stats()["not_modified"] == 1
+
+
+def test_disk_layer_survives_restart(tmp_path, http):
+    asyncio.run(AvatarCache(cache_dir=tmp_path).get("12345"))
+
+    restarted = AvatarCache(cache_dir=tmp_path)
+    avatar = asyncio.run(restarted.get("12345"))
+    assert avatar.image == b"avatar"
+    assert len(http.requests) == 1
+    assert restarted.stats()["disk_hits"] == 1
+
+
+def test_stale_data_is_used_when_download_fails(tmp_path, http):
+    asyncio.run(AvatarCache(cache_dir=tmp_path).get("12345"))
+    http.fail = True
+
+    avatar = asyncio.run(AvatarCache(cache_dir=tmp_path, ttl=0).get("12345"))
+    assert avatar.image == b"avatar"
+
+
+def test_disk_entries_are_bounded_by_recent_use(tmp_path, http):
+    cache = AvatarCache(cache_dir=tmp_path, max_memory_entries=0, max_disk_entries=2)
+
+    async def run():
+        for user_id in ("10001", "10002"):
+            await cache.get(user_id)
+        await cache.get("10001")
+        await cache.get("10003")
+
+    asyncio.run(run())
+    cached = sorted(p.stem for p in tmp_path.glob("*/*.json"))
+    assert cached == ["10001", "10003"]
+    assert not list(tmp_path.glob("*/10002.img"))
+    assert cache.stats()["disk_entries"] == 2
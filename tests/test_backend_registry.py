@@ -0,0 +1,120 @@
+import asyncio
+import json
+
+import pytest
+from aiocqhttp.exceptions import ActionFailed
+
+from src.backend_registry import (
+    ALBUM_LIST_ACTIONS,
+    BackendRegistry,
+    candidate_actions,
+)
+
+
+def unsupported() -> ActionFailed:
+    return ActionFailed({"status": "failed", "retcode": 1404})
+
+
+class FakeApi:
+    """假的协议端：get_version_info 返回 app_name，其余接口按 supported 决定成败"""
+
+    def __init__(self, app_name: str, supported: set[str]):
+        self.app_name = app_name
+        self.supported = supported
+        self.calls: list[str] = []
+
+    async def call_action(self, action: str, **params):
+        self.calls.append(action)
+        if action == "get_version_info":
+            return {"app_name": self.app_name, "app_version": "1.0"}
+        if action not in self.supported:
+            raise unsupported()
+        return {"action": action}
+
+
+class FakeClient:
+    def __init__(self, app_name: str, supported: set[str]):
+        self.api = FakeApi(app_name, supported)
+
+
+def call_album_list(registry: BackendRegistry, client: FakeClient):
+    async def run():
+        backend = await registry.backend("10000", client)
+        return await registry.call(
+            "10000",
+            candidate_actions(ALBUM_LIST_ACTIONS, backend),
+            lambda action: client.api.call_action(action, group_id=1),
+        )
+
+    return asyncio.run(run())
+
+
+def test_unsupported_action_is_recorded_and_skipped(tmp_path):
+    registry = BackendRegistry(tmp_path / "backends.json")
+    client = FakeClient("NapCat.Onebot", {"get_group_album_list"})
+
+    assert call_album_list(registry, client) == {"action": "get_group_album_list"}
+    assert client.api.calls == [
+        "get_version_info",
+        "get_qun_album_list",
+        "get_group_album_list",
+    ]
+
+    client.api.calls.clear()
+    call_album_list(registry, client)
+    assert client.api.calls == ["get_group_album_list"]
+    assert registry.stats()["unsupported"] == {"10000": ["get_qun_album_list"]}
+
+
+def test_action_record_is_persisted(tmp_path):
+    path = tmp_path / "backends.json"
+    call_album_list(
+        BackendRegistry(path), FakeClient("NapCat.Onebot", {"get_group_album_list"})
+    )
+    saved = json.loads(path.read_text(encoding="utf-8"))["10000"]
+    assert saved["supported"] == ["get_group_album_list"]
+    assert saved["unsupported"] == ["get_qun_album_list"]
+
+    client = FakeClient("NapCat.Onebot", {"get_group_album_list"})
+    call_album_list(BackendRegistry(path), client)
+    assert client.api.calls == ["get_group_album_list"]
+
+
+def test_previously_supported_action_falls_back_after_backend_change(tmp_path):
+    registry = BackendRegistry(tmp_path / "backends.json")
+    call_album_list(registry, FakeClient("NapCat.Onebot", {"get_qun_album_list"}))
+
+    # 同一个 QQ 号换成了只支持另一个接口的协议端，不必等重新探测
+    client = FakeClient("NapCat.Onebot", {"get_group_album_list"})
+    assert call_album_list(registry, client) == {"action": "get_group_album_list"}
+    info = asyncio.run(registry.get("10000", None))
+    assert info.supported == ["get_group_album_list"]
+    assert info.unsupported == ["get_qun_album_list"]
+
+
+def test_all_candidates_unsupported_raises_and_retries_later(tmp_path):
+    registry = BackendRegistry(tmp_path / "backends.json")
+    client = FakeClient("LLOneBot", set())
+
+    with pytest.raises(ActionFailed):
+        call_album_list(registry, client)
+    assert registry.actions("10000", ALBUM_LIST_ACTIONS["llbot"]) == list(
+        ALBUM_LIST_ACTIONS["llbot"]
+    )
+
+
+def test_other_errors_are_not_recorded(tmp_path):
+    registry = BackendRegistry(tmp_path / "backends.json")
+
+    async def run():
+        await registry.get("10000", FakeClient("LLOneBot", set()))
+
+        async def invoke(action):
+            raise ActionFailed({"status": "failed", "retcode": 200})
+
+        with pytest.raises(ActionFailed):
+            await registry.call("10000", ALBUM_LIST_ACTIONS["llbot"], invoke)
+
+    asyncio.run(run())
+    info = asyncio.run(registry.get("10000", None))
+    assert (info.supported, info.unsupported) == ([], [])
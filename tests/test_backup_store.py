@@ -0,0 +1,181 @@
+import json
+import os
+
+import pytest
+
+from src.backup_store import INDEX_FILE, OBJECTS_DIR, BackupStore
+from src.ingest import save_bytes
+
+PNG = b"\x89PNG\r\n\x1a\n" + b"\x01" * 4096
+JPG = b"\xff\xd8\xff" + b"\x02" * 8192
+
+
+@pytest.fixture
+def store(tmp_path):
+    return BackupStore(tmp_path / "backup")
+
+
+def ingest(tmp_path, data: bytes):
+    return save_bytes(data, tmp_path / "ingest")
+
+
+def objects(store: BackupStore) -> list:
+    return [p for p in (store.root / OBJECTS_DIR).rglob("*") if p.is_file()]
+
+
+def test_add_stores_object_once_and_links_album_file(tmp_path, store):
+    path = store.add(ingest(tmp_path, PNG), 1, "a", "20260101_000000")
+
+    assert path.parent == store.root / "1" / "a"
+    assert path.suffix == ".png"
+    assert path.read_bytes() == PNG
+    assert len(objects(store)) == 1
+    assert not list((tmp_path / "ingest").iterdir())
+    index = json.loads((path.parent / INDEX_FILE).read_text(encoding="utf-8"))
+    assert list(index.values()) == [path.name]
+
+
+def test_add_reuses_existing_entry_in_same_album(tmp_path, store):
+    first = store.add(ingest(tmp_path, PNG), 1, "a", "20260101_000000")
+    second = store.add(ingest(tmp_path, PNG), 1, "a", "20260101_000001")
+
+    assert first == second
+    assert len([p for p in first.parent.iterdir() if p.suffix == ".png"]) == 1
+    assert not list((tmp_path / "ingest").iterdir())
+
+
+def test_add_shares_object_across_albums(tmp_path, store):
+    first = store.add(ingest(tmp_path, PNG), 1, "a", "n")
+    second = store.add(ingest(tmp_path, PNG), 1, "b", "n")
+
+    assert first != second
+    assert len(objects(store)) == 1
+    assert os.path.samefile(first, second)
+
+
+def test_same_second_uploads_do_not_overwrite(tmp_path, store):
+    first = store.add(ingest(tmp_path, PNG), 1, "a", "20260101_000000")
+    second = store.add(ingest(tmp_path, JPG), 1, "a", "20260101_000000")
+
+    assert first != second
+    assert first.read_bytes() == PNG
+    assert second.read_bytes() == JPG
+
+
+def test_migrate_removes_duplicates_and_reports_reclaimed_bytes(store):
+    album = store.root / "2" / "x"
+    album.mkdir(parents=True)
+    (album / "t1.jpg").write_bytes(JPG)
+    (album / "t2.jpg").write_bytes(JPG)
+    (album / "t3.png").write_bytes(PNG)
+    other = store.root / "2" / "y"
+    other.mkdir()
+    (other / "copy.png").write_bytes(PNG)
+
+    report = store.migrate()
+
+    assert report.scanned == 4
+    assert report.duplicates == 1
+    assert report.linked == 1
+    assert report.errors == 0
+    assert report.reclaimed_bytes == len(JPG) + len(PNG)
+    assert sorted(p.name for p in album.iterdir()) == [INDEX_FILE, "t1.jpg", "t3.png"]
+    assert os.path.samefile(album / "t3.png", other / "copy.png")
+    assert len(objects(store)) == 2
+    index = json.loads((album / INDEX_FILE).read_text(encoding="utf-8"))
+    assert sorted(index.values()) == ["t1.jpg", "t3.png"]
+
+
+def test_migrate_is_idempotent(store):
+    album = store.root / "2" / "x"
+    album.mkdir(parents=True)
+    (album / "t1.jpg").write_bytes(JPG)
+    (album / "t2.jpg").write_bytes(JPG)
+    store.migrate()
+
+    report = store.migrate()
+
+    assert report.scanned == 1
+    assert report.duplicates == 0
+    assert report.linked == 0
+    assert report.reclaimed_bytes == 0
+
+
+def test_migrate_keeps_bytes_of_shared_duplicates_unreclaimed(store):
+    album = store.root / "3" / "x"
+    album.mkdir(parents=True)
+    (album / "keep.png").write_bytes(PNG)
+    # 与相册外的文件共享 inode 的重复文件，删除后不会释放空间
+    outside = store.root.parent / "outside.png"
+    outside.write_bytes(PNG)
+    os.link(outside, album / "linked.png")
+
+    report = store.migrate()
+
+    assert report.duplicates == 1
+    assert report.reclaimed_bytes == 0
+
+
+def test_migrate_sweeps_unreferenced_objects(tmp_path, store):
+    kept = store.add(ingest(tmp_path, PNG), 1, "a", "n")
+    removed = store.add(ingest(tmp_path, JPG), 1, "a", "n")
+    removed.unlink()
+
+    report = store.migrate()
+
+    assert report.swept == 1
+    assert report.reclaimed_bytes == len(JPG)
+    assert [p.read_bytes() for p in objects(store)] == [PNG]
+    assert kept.read_bytes() == PNG
+    assert store.migrate().swept == 0
+
+
+def test_without_hardlinks_keeps_one_copy_per_album(tmp_path, store, monkeypatch):
+    def no_link(src, dst):
+        raise OSError("hardlinks not supported")
+
+    monkeypatch.setattr(os, "link", no_link)
+    first = store.add(ingest(tmp_path, PNG), 1, "a", "n")
+    again = store.add(ingest(tmp_path, PNG), 1, "a", "m")
+    other = store.add(ingest(tmp_path, PNG), 1, "b", "n")
+
+    assert first == again
+    assert first.read_bytes() == other.read_bytes() == PNG
+    assert objects(store) == []
+    assert not list((tmp_path / "ingest").iterdir())
+    assert store.migrate().hardlinks is False
+
+
+def test_link_failure_after_detection_moves_object_into_album(
+    tmp_path, store, monkeypatch
+):
+    assert store._hardlinks_supported()
+
+    def no_link(src, dst):
+        raise OSError("too many links")
+
+    monkeypatch.setattr(os, "link", no_link)
+    path = store.add(ingest(tmp_path, PNG), 1, "a", "n")
+
+    assert path.read_bytes() == PNG
+    assert objects(store) == []
+
+
+def test_migrate_without_hardlinks_sweeps_copied_objects(tmp_path, store, monkeypatch):
+    # 旧版在链接失败时把本体复制了一份，objects/ 与相册目录各占一份空间
+    album_file = store.add(ingest(tmp_path, PNG), 1, "a", "n")
+    obj = objects(store)[0]
+    album_file.unlink()
+    album_file.write_bytes(PNG)
+
+    def no_link(src, dst):
+        raise OSError("hardlinks not supported")
+
+    monkeypatch.setattr(os, "link", no_link)
+    store._hardlinks = None
+    report = store.migrate()
+
+    assert report.hardlinks is False
+    assert report.swept == 1
+    assert not obj.exists()
+    assert album_file.read_bytes() == PNG
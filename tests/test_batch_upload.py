@@ -0,0 +1,111 @@
+import asyncio
+import base64
+from pathlib import Path
+
+import pytest
+from aiocqhttp.exceptions import ActionFailed
+
+from src import backend_registry, upload_modes
+from src.backend_registry import BackendRegistry
+from src.upload_modes import UploadModeTracker
+from src.utils import BATCH_UPLOAD_SIZE, upload_album_images
+
+
+def file_name(value: str) -> str:
+    """从任一种文件参数形式中取出文件名（测试图片的内容就是文件名）"""
+    if value.startswith("base64://"):
+        return base64.b64decode(value[len("base64://") :]).decode()
+    return Path(value.removeprefix("file://")).name
+
+
+class FakeApi:
+    """假的协议端：记录上传调用，unsupported 中的接口返回 1404，bad_files 中的文件上传失败"""
+
+    def __init__(self, app_name: str, unsupported: set[str] = frozenset()):
+        self.app_name = app_name
+        self.unsupported = unsupported
+        self.uploads: list[tuple[str, list[str]]] = []
+        self.bad_files: set[str] = set()
+
+    async def call_action(self, action: str, **params):
+        if action == "get_version_info":
+            return {"app_name": self.app_name}
+        if action in self.unsupported:
+            raise ActionFailed({"status": "failed", "retcode": 1404})
+        files = params.get("files") or [params["file"]]
+        if self.bad_files.intersection(file_name(f) for f in files):
+            raise ActionFailed({"status": "failed", "retcode": 200})
+        self.uploads.append((action, files))
+
+
+class FakeClient:
+    def __init__(self, api: FakeApi):
+        self.api = api
+
+
+@pytest.fixture(autouse=True)
+def fresh_state(monkeypatch):
+    monkeypatch.setattr(backend_registry, "_registry", BackendRegistry(None))
+    monkeypatch.setattr(upload_modes, "_tracker", UploadModeTracker())
+
+
+def upload(api: FakeApi, count: int, tmp_path):
+    paths = [tmp_path / f"{i}.png" for i in range(count)]
+    for path in paths:
+        path.write_text(path.name)
+    client = FakeClient(api)
+
+    async def run():
+        registry = backend_registry.get_backend_registry()
+        backend = await registry.backend("10000", client)
+        return await upload_album_images(client, "10000", 1, "a1", "相册", paths, backend)
+
+    return paths, asyncio.run(run())
+
+
+def test_llbot_uploads_in_batches(tmp_path):
+    api = FakeApi("LLOneBot")
+    count = BATCH_UPLOAD_SIZE * 2 + 5
+
+    paths, results = upload(api, count, tmp_path)
+
+    assert results == [None] * count
+    assert [(action, len(files)) for action, files in api.uploads] == [
+        ("upload_group_album", BATCH_UPLOAD_SIZE),
+        ("upload_group_album", BATCH_UPLOAD_SIZE),
+        ("upload_group_album", 5),
+    ]
+    assert api.uploads[0][1][0] == str(paths[0].absolute())
+
+
+def test_unsupported_batch_action_falls_back_to_single_uploads(tmp_path):
+    api = FakeApi("LLOneBot", unsupported={"upload_group_album"})
+
+    _, results = upload(api, 25, tmp_path)
+
+    assert results == [None] * 25
+    assert {action for action, _ in api.uploads} == {"upload_image_to_qun_album"}
+    assert len(api.uploads) == 25
+    registry = backend_registry.get_backend_registry()
+    assert registry.stats()["unsupported"] == {"10000": ["upload_group_album"]}
+
+
+def test_single_uploads_report_failures_per_file(tmp_path):
+    api = FakeApi("NapCat.Onebot")
+    api.bad_files = {"1.png"}
+
+    _, results = upload(api, 3, tmp_path)
+
+    assert results[0] is None and results[2] is None
+    assert isinstance(results[1], ActionFailed)
+    assert {action for action, _ in api.uploads} == {"upload_image_to_qun_album"}
+
+
+def test_failed_batch_marks_every_file_in_it(tmp_path):
+    api = FakeApi("LLOneBot")
+    api.bad_files = {"0.png"}
+
+    _, results = upload(api, BATCH_UPLOAD_SIZE + 1, tmp_path)
+
+    assert all(isinstance(r, ActionFailed) for r in results[:BATCH_UPLOAD_SIZE])
+    assert results[BATCH_UPLOAD_SIZE] is None
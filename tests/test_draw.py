@@ -0,0 +1,176 @@
+import io
+import threading
+
+import pytest
+from PIL import Image, ImageFont
+
+from src import draw
+from src.draw import (
+    ELLIPSIS,
+    BubbleTemplate,
+    FontRegistry,
+    StitchPager,
+    compose_vertical,
+    layout_text,
+    wrap_text,
+)
+
+
+@pytest.fixture(scope="module")
+def font():
+    return ImageFont.load_default(40)
+
+
+TEXT = (
+    "The quick brown fox jumps over the lazy dog. "
+    "群友的怪话需要被完整地保存下来，长句子会按照宽度自动换行。" * 3
+)
+
+
+def test_layout_breaks_greedily_within_width(font):
+    layout = layout_text(TEXT, font, 500, max_lines=0, max_chars=0)
+
+    assert "".join(layout.lines) == TEXT
+    assert not layout.truncated
+    rest = TEXT
+    for line, width in zip(layout.lines, layout.widths):
+        assert width <= 500
+        assert abs(width - font.getlength(line)) <= 1
+        rest = rest[len(line) :]
+        if rest:
+            # 再多放一个字就会超宽
+            assert font.getlength(line + rest[0]) > 499
+    assert layout.width == max(layout.widths)
+
+
+def test_layout_keeps_explicit_and_blank_lines(font):
+    layout = layout_text("第一行\r\n\n第三行", font, 500, max_lines=0, max_chars=0)
+
+    assert layout.lines == ["第一行", "", "第三行"]
+    assert layout.widths[1] == 0
+
+
+def test_layout_truncates_by_lines_with_ellipsis(font):
+    layout = layout_text(TEXT, font, 500, max_lines=2, max_chars=0)
+
+    assert len(layout.lines) == 2
+    assert layout.truncated
+    assert layout.lines[-1].endswith(ELLIPSIS)
+    assert layout.widths[-1] <= 500
+
+
+def test_layout_truncates_by_chars(font):
+    layout = layout_text("一二三四五六七八九十", font, 2000, max_lines=0, max_chars=4)
+
+    assert layout.lines == ["一二三四" + ELLIPSIS]
+    assert layout.truncated
+
+
+def test_single_wide_char_still_gets_a_line(font):
+    assert wrap_text("宽字", font, 1) == ["宽", "字"]
+
+
+def test_bubble_template_returns_copies_and_reuses_cache():
+    template = BubbleTemplate(maxsize=4)
+    first = template.render(300, 200)
+    first.paste((255, 0, 0, 255), (0, 0, 300, 200))
+    second = template.render(300, 200)
+
+    assert second.size == (300, 200)
+    assert second.getpixel((150, 100)) == (255, 255, 255, 255)
+    assert list(template._bubbles) == [(300, 200)]
+
+
+def test_bubble_template_is_bounded_by_bytes():
+    item = 300 * 200 * 4
+    template = BubbleTemplate(maxsize=10, max_bytes=item * 2, max_item_bytes=item)
+    for height in (200, 199, 198):
+        template.render(300, height)
+
+    # 条目数远未到上限，按字节数淘汰最久未用的气泡
+    assert list(template._bubbles) == [(300, 199), (300, 198)]
+    assert template._bytes <= item * 2
+    assert template._bytes == sum(w * h * 4 for w, h in template._bubbles)
+
+
+def test_oversized_bubble_is_not_cached():
+    template = BubbleTemplate(max_item_bytes=100 * 100 * 4)
+    bubble = template.render(200, 200)
+
+    assert bubble.size == (200, 200)
+    assert not template._bubbles
+    assert template._bytes == 0
+
+
+def solid(width: int, height: int, color: str = "white") -> Image.Image:
+    return Image.new("RGB", (width, height), color)
+
+
+def test_stitch_pager_splits_pages_by_height():
+    pager = StitchPager(max_height=250)
+    pages = []
+    for height in (100, 100, 100, 300, 50):
+        img = solid(80, height)
+        if not pager.fits(img):
+            pages.append(pager.flush())
+        pager.add(img)
+    pages.append(pager.flush())
+
+    sizes = []
+    for page in pages:
+        with Image.open(io.BytesIO(page)) as decoded:
+            sizes.append(decoded.size)
+    # 超高的单张子图独占一页
+    assert sizes == [(80, 200), (80, 100), (80, 300), (80, 50)]
+    assert pager.flush() is None
+
+
+def test_stitch_pager_respects_pixel_limit():
+    pager = StitchPager(max_height=10_000, max_pixels=100 * 250)
+    pager.add(solid(50, 100))
+
+    assert pager.fits(solid(50, 100))
+    assert not pager.fits(solid(100, 200))
+
+
+def test_compose_vertical_stacks_images_on_background():
+    top, bottom = solid(40, 10, "red"), solid(20, 10, "blue")
+
+    data = compose_vertical([top, bottom])
+
+    with Image.open(io.BytesIO(data)) as img:
+        assert img.format == "PNG"
+        assert img.size == (40, 20)
+        assert img.getpixel((0, 0)) == (255, 0, 0)
+        assert img.getpixel((0, 15)) == (0, 0, 255)
+        assert img.getpixel((30, 15)) == (0xEA, 0xED, 0xF4)
+
+
+def test_font_registry_caches_per_thread(monkeypatch):
+    monkeypatch.setattr(draw, "FONT_DIR", None)
+    registry = FontRegistry(maxsize=2)
+    first = registry.get(32)
+
+    assert registry.get(32) is first
+    other = []
+    thread = threading.Thread(target=lambda: other.append(registry.get(32)))
+    thread.start()
+    thread.join()
+    # FreeType 字体对象不能跨线程共用，每个线程各自加载
+    assert other[0] is not first
+    stats = registry.stats()
+    assert (stats["hits"], stats["misses"]) == (1, 2)
+
+
+def test_font_registry_lru_and_invalidate(monkeypatch):
+    monkeypatch.setattr(draw, "FONT_DIR", None)
+    registry = FontRegistry(maxsize=2)
+    small = registry.get(20)
+    registry.get(30)
+    registry.get(40)
+
+    assert registry.get(20) is not small
+    assert registry.stats()["size"] == 2
+    cached = registry.get(20)
+    registry.invalidate()
+    assert registry.get(20) is not cached
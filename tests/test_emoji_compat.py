@@ -0,0 +1,61 @@
+import re
+
+import pytest
+
+from src import emoji_compat
+
+EMOJIS = ["😀", "👍", "👍🏻", "🇨🇳", "1️⃣"]
+
+
+@pytest.fixture
+def fresh(tmp_path, monkeypatch):
+    """每个测试使用独立的缓存目录与未编译状态，emoji 表换成小列表"""
+    monkeypatch.setattr(emoji_compat, "_pattern", None)
+    monkeypatch.setattr(emoji_compat, "_cache_dir", tmp_path)
+    monkeypatch.setattr(emoji_compat, "_emoji_list", lambda: list(EMOJIS))
+    return tmp_path
+
+
+def cache_files(path) -> list[str]:
+    return sorted(p.name for p in path.iterdir())
+
+
+def test_trie_regex_prefers_longest_match():
+    pattern = re.compile(emoji_compat._trie_regex(EMOJIS))
+
+    assert pattern.findall("a👍🏻b👍c😀") == ["👍🏻", "👍", "😀"]
+    assert pattern.fullmatch("1️⃣")
+    assert pattern.search("plain text") is None
+
+
+def test_pattern_is_cached_on_disk_and_reused(fresh, monkeypatch):
+    pattern = emoji_compat.get_emoji_pattern()
+    assert pattern.findall("👍🏻") == ["👍🏻"]
+    [name] = cache_files(fresh)
+    assert name.startswith(emoji_compat.EMOJI_PATTERN_PREFIX)
+
+    def fail():
+        raise AssertionError("缓存存在时不应重新构建")
+
+    monkeypatch.setattr(emoji_compat, "_pattern", None)
+    monkeypatch.setattr(emoji_compat, "_emoji_list", fail)
+    assert emoji_compat.get_emoji_pattern().pattern == pattern.pattern
+
+
+def test_corrupt_cache_is_rebuilt(fresh):
+    path = emoji_compat._pattern_cache_path()
+    path.write_text("(?:😀|👍", encoding="utf-8")
+
+    pattern = emoji_compat.get_emoji_pattern()
+
+    assert pattern.findall("😀👍") == ["😀", "👍"]
+    assert path.read_text(encoding="utf-8") == pattern.pattern
+    assert cache_files(fresh) == [path.name]
+
+
+def test_stale_version_caches_are_replaced(fresh):
+    (fresh / f"{emoji_compat.EMOJI_PATTERN_PREFIX}0.0.1.txt").write_text("x")
+
+    emoji_compat.get_emoji_pattern()
+
+    assert cache_files(fresh) == [emoji_compat._pattern_cache_path().name]
@@ -0,0 +1,98 @@
+import io
+import random
+
+import pytest
+
+from src.encoder import EncodeOptions, encode_image, fit_bytes
+
+Image = pytest.importorskip("PIL.Image")
+
+
+def noisy_image(width: int = 400, height: int = 300, seed: int = 1):
+    """随机噪点图：几乎无法压缩，便于触发字节预算"""
+    rng = random.Random(seed)
+    data = bytes(rng.randrange(256) for _ in range(width * height * 3))
+    return Image.frombytes("RGB", (width, height), data)
+
+
+def test_from_config_clamps_values():
+    options = EncodeOptions.from_config(
+        {
+            "output_format": "bmp",
+            "output_quality": 150,
+            "png_compress_level": -1,
+            "output_max_kb": 64,
+        }
+    )
+    assert options.format == "auto"
+    assert options.quality == 100
+    assert options.png_compress_level == 0
+    assert options.max_bytes == 64 * 1024
+
+
+def test_auto_format_uses_default_and_skips_search_without_budget():
+    result = encode_image(noisy_image(), EncodeOptions(), default_format="png")
+    assert result.format == "png"
+    assert result.ext == "png"
+    assert result.quality is None
+    assert result.scale == 1.0
+
+
+def test_lossy_budget_lowers_quality_before_scaling():
+    image = noisy_image()
+    full = encode_image(image, EncodeOptions(format="jpeg"))
+    budget = len(full.data) * 2 // 3
+
+    result = encode_image(image, EncodeOptions(format="jpeg", max_bytes=budget))
+
+    assert len(result.data) <= budget
+    assert result.scale == 1.0
+    assert 40 <= result.quality < 90
+    # 二分查找得到的是满足预算的最高质量
+    higher = encode_image(
+        image, EncodeOptions(format="jpeg", quality=result.quality + 1)
+    )
+    assert len(higher.data) > budget
+
+
+def test_tight_budget_scales_down():
+    image = noisy_image()
+    floor = encode_image(image, EncodeOptions(format="jpeg", quality=40))
+    budget = len(floor.data) // 2
+
+    result = encode_image(image, EncodeOptions(format="jpeg", max_bytes=budget))
+
+    assert len(result.data) <= budget
+    assert result.scale < 1.0
+    with Image.open(io.BytesIO(result.data)) as decoded:
+        assert decoded.width == int(image.width * result.scale)
+
+
+def test_impossible_budget_stops_at_min_scale():
+    options = EncodeOptions(format="png", max_bytes=100, min_scale=0.4)
+
+    result = encode_image(noisy_image(), options)
+
+    assert len(result.data) > 100
+    assert 0.4 <= result.scale < 0.4 / 0.85
+
+
+def test_fit_bytes_reencodes_oversized_images_only():
+    data = encode_image(noisy_image(), EncodeOptions(format="jpeg")).data
+
+    assert fit_bytes(data, EncodeOptions()) is None
+    assert fit_bytes(data, EncodeOptions(max_bytes=len(data) * 2)) is None
+    result = fit_bytes(data, EncodeOptions(max_bytes=len(data) // 2))
+    assert result is not None
+    assert result.format == "jpeg"
+    assert len(result.data) <= len(data) // 2
+
+
+def test_fit_bytes_leaves_animations_and_garbage_alone():
+    frames = [noisy_image(64, 64, seed) for seed in range(3)]
+    output = io.BytesIO()
+    frames[0].save(output, format="GIF", save_all=True, append_images=frames[1:])
+    gif = output.getvalue()
+
+    assert fit_bytes(gif, EncodeOptions(max_bytes=100)) is None
+    assert fit_bytes(b"not an image" * 100, EncodeOptions(max_bytes=100)) is None
@@ -0,0 +1,75 @@
+import asyncio
+
+from src.utils import HISTORY_PAGE_SIZE, _iter_history_pages
+
+
+class FakeBot:
+    """假的 get_group_msg_history：返回 message_seq 及其之前共 count 条（含该条），正序
+
+    message_seq 为 0 时从最新一条开始，与 NapCat 的行为一致。
+    """
+
+    def __init__(self, total: int, with_seq: bool = True):
+        self.messages = [
+            {"message_id": f"m{seq}", "message_seq": seq if with_seq else None}
+            for seq in range(1, total + 1)
+        ]
+        self.cursors: list[int] = []
+
+    async def get_group_msg_history(self, group_id, message_seq, count, reverseOrder):
+        self.cursors.append(message_seq)
+        end = len(self.messages) if not message_seq else message_seq
+        return {"messages": self.messages[max(0, end - count) : end]}
+
+
+class FakeEvent:
+    def __init__(self, bot: FakeBot):
+        self.bot = bot
+
+
+def collect(bot: FakeBot, start_seq=0, max_scan: int = 100_000) -> list[list[str]]:
+    async def run():
+        pages = _iter_history_pages(FakeEvent(bot), 1, start_seq, max_scan)
+        return [[m["message_id"] for m in page] async for page in pages]
+
+    return asyncio.run(run())
+
+
+def test_pages_walk_backwards_without_duplicates():
+    total = HISTORY_PAGE_SIZE * 2 + 50
+    bot = FakeBot(total)
+
+    pages = collect(bot)
+
+    flat = [message_id for page in pages for message_id in page]
+    assert flat == [f"m{seq}" for seq in range(total, 0, -1)]
+    assert bot.cursors[0] == 0
+    # 游标是上一页最旧一条的序号，该条在下一页中被去重
+    assert bot.cursors[1] == total - HISTORY_PAGE_SIZE + 1
+
+
+def test_start_seq_begins_at_target():
+    bot = FakeBot(500)
+
+    first = collect(bot, start_seq=300)[0]
+
+    assert first[0] == "m300"
+    assert len(first) == HISTORY_PAGE_SIZE
+
+
+def test_messages_without_seq_stop_after_first_page():
+    bot = FakeBot(HISTORY_PAGE_SIZE * 3, with_seq=False)
+
+    pages = collect(bot)
+
+    assert len(pages) == 1
+    assert len(bot.cursors) == 1
+
+
+def test_scan_limit_stops_paging():
+    bot = FakeBot(HISTORY_PAGE_SIZE * 10)
+
+    pages = collect(bot, max_scan=HISTORY_PAGE_SIZE * 2)
+
+    assert len(pages) == 2
+    assert len(bot.cursors) == 2
@@ -0,0 +1,50 @@
+import pytest
+
+from src.ingest import IMAGE_SUFFIXES, save_bytes, sniff_image_ext
+
+
+@pytest.mark.parametrize(
+    "head, ext",
+    [
+        (b"\xff\xd8\xff\xe0\x00\x10JFIF", "jpg"),
+        (b"\x89PNG\r\n\x1a\n\x00\x00\x00\rIHDR", "png"),
+        (b"GIF87a\x01\x00", "gif"),
+        (b"GIF89a\x01\x00", "gif"),
+        (b"RIFF\x24\x00\x00\x00WEBPVP8 ", "webp"),
+        (b"BM\x36\x00\x00\x00", "bmp"),
+        (b"II*\x00\x08\x00\x00\x00", "tif"),
+        (b"MM\x00*\x00\x00\x00\x08", "tif"),
+        (b"\x00\x00\x00\x18ftypheic\x00\x00", "heic"),
+        (b"\x00\x00\x00\x18ftypmif1\x00\x00", "heic"),
+        (b"\x00\x00\x00\x1cftypavif\x00\x00", "avif"),
+    ],
+)
+def test_sniff_image_ext(head, ext):
+    assert sniff_image_ext(head) == ext
+    assert f".{ext}" in IMAGE_SUFFIXES
+
+
+@pytest.mark.parametrize("head", [b"", b"hello world", b"RIFF\x00\x00\x00\x00WAVE"])
+def test_sniff_image_ext_fallback(head):
+    assert sniff_image_ext(head) == "png"
+    assert sniff_image_ext(head, fallback="bin") == "bin"
+
+
+def test_save_bytes_names_file_by_sniffed_format(tmp_path):
+    handle = save_bytes(b"\xff\xd8\xff" + b"\x00" * 100, tmp_path)
+
+    assert handle.ext == "jpg"
+    assert handle.path.suffix == ".jpg"
+    assert handle.size == 103
+    assert len(handle.sha256) == 64
+
+
+def test_save_bytes_enforces_size_limit(tmp_path):
+    with pytest.raises(ValueError):
+        save_bytes(b"\x00" * 10, tmp_path, max_bytes=5)
+    assert not list(tmp_path.iterdir())
+
+
+def test_save_bytes_empty(tmp_path):
+    assert save_bytes(b"", tmp_path) is None
+    assert not list(tmp_path.iterdir())
@@ -0,0 +1,114 @@
+import asyncio
+import time
+
+from src.member_cache import MemberInfoCache
+
+
+class FakeClient:
+    def __init__(self, members: list[dict], delay: float = 0):
+        self.members = members
+        self.delay = delay
+        self.info_calls = 0
+        self.list_calls = 0
+        self.fail_list = False
+
+    async def get_group_member_info(self, group_id, user_id, no_cache=False):
+        self.info_calls += 1
+        await asyncio.sleep(self.delay)
+        return next(m for m in self.members if m["user_id"] == user_id)
+
+    async def get_group_member_list(self, group_id):
+        self.list_calls += 1
+        if self.fail_list:
+            raise RuntimeError("timeout")
+        return {"data": self.members}
+
+
+MEMBERS = [
+    {"user_id": 1, "nickname": "甲", "card": "", "level": "10"},
+    {"user_id": 2, "nickname": "乙", "card": "乙的群名片", "level": "3"},
+]
+
+
+def test_get_caches_and_shares_concurrent_requests():
+    client = FakeClient(MEMBERS, delay=0.02)
+
+    async def run():
+        cache = MemberInfoCache()
+        results = await asyncio.gather(*(cache.get(client, 100, 1) for _ in range(3)))
+        again = await cache.get(client, 100, 1)
+        return cache, results, again
+
+    cache, results, again = asyncio.run(run())
+    assert [r["nickname"] for r in results] == ["甲"] * 3
+    assert again["nickname"] == "甲"
+    assert client.info_calls == 1
+    assert cache.stats()["hits"] == 1
+
+
+def test_max_age_bypasses_older_entries():
+    client = FakeClient(MEMBERS)
+
+    async def run():
+        cache = MemberInfoCache(ttl=300)
+        await cache.get(client, 100, 1)
+        key = (100, 1)
+        at, info = cache._entries[key]
+        cache._entries[key] = (at - 60, info)
+        await cache.get(client, 100, 1)
+        await cache.get(client, 100, 1, max_age=30)
+
+    asyncio.run(run())
+    assert client.info_calls == 2
+
+
+def test_warm_group_fills_cache_once_per_interval():
+    client = FakeClient(MEMBERS)
+
+    async def run():
+        cache = MemberInfoCache(bulk_interval=600)
+        loaded = await cache.warm_group(client, 100)
+        again = await cache.warm_group(client, 100)
+        info = await cache.get(client, 100, 2)
+        return cache, loaded, again, info
+
+    cache, loaded, again, info = asyncio.run(run())
+    assert (loaded, again) == (2, 0)
+    assert info["card"] == "乙的群名片"
+    assert client.list_calls == 1
+    assert client.info_calls == 0
+    assert not cache.needs_warm_up(100)
+
+
+def test_failed_warm_up_backs_off():
+    client = FakeClient(MEMBERS)
+    client.fail_list = True
+
+    async def run():
+        cache = MemberInfoCache()
+        first = await cache.warm_group(client, 100)
+        second = await cache.warm_group(client, 100)
+        return first, second
+
+    assert asyncio.run(run()) == (0, 0)
+    assert client.list_calls == 1
+
+
+def test_names_prefer_card_and_cache_negative_results():
+    cache = MemberInfoCache(negative_ttl=120)
+    cache._store(100, 2, MEMBERS[1], time.time())
+
+    assert cache.peek_name(100, 2) == (True, "乙的群名片")
+    assert cache.peek_name(100, 3) == (False, None)
+    cache.store_name(100, 3, None)
+    assert cache.peek_name(100, 3) == (True, None)
+    cache.negative_ttl = -1
+    assert cache.peek_name(100, 3) == (False, None)
+
+
+def test_entries_are_bounded():
+    cache = MemberInfoCache(max_entries=2)
+    for user_id in range(5):
+        cache._store(100, user_id, {"user_id": user_id}, 0)
+
+    assert list(cache._entries) == [(100, 3), (100, 4)]
@@ -0,0 +1,92 @@
+from src.message_buffer import GAP, BufferedMessage, MessageBuffer
+
+
+def msg(seq: int | None, text: str = "hi", message_id: str | None = None):
+    return BufferedMessage(
+        message_id or f"m{seq}", seq, 1_700_000_000 + (seq or 0), "42", (text,)
+    )
+
+
+def fill(buffer: MessageBuffer, group_id: int, messages) -> None:
+    for message in messages:
+        buffer.record(group_id, message)
+
+
+def ids(messages) -> list[str]:
+    return [m.message_id for m in messages]
+
+
+def test_lookup_returns_contiguous_window_in_order():
+    buffer = MessageBuffer()
+    fill(buffer, 1, [msg(seq) for seq in range(1, 11)])
+
+    assert ids(buffer.lookup(1, "m8", 3)) == ["m6", "m7", "m8"]
+    assert buffer.stats()["hits"] == 1
+
+
+def test_lookup_skips_messages_without_text():
+    buffer = MessageBuffer()
+    fill(buffer, 1, [msg(1), msg(2, text="  "), msg(3), msg(4, text=""), msg(5)])
+
+    assert ids(buffer.lookup(1, "m5", 3)) == ["m1", "m3", "m5"]
+
+
+def test_seq_gap_is_a_miss():
+    buffer = MessageBuffer()
+    # 序号 4 没有收到（例如机器人自己发的消息）
+    fill(buffer, 1, [msg(seq) for seq in (1, 2, 3, 5, 6)])
+
+    assert ids(buffer.lookup(1, "m6", 2)) == ["m5", "m6"]
+    assert buffer.lookup(1, "m6", 3) is None
+    assert buffer.stats()["misses"] == 1
+
+
+def test_gap_marker_before_target_is_a_miss():
+    buffer = MessageBuffer()
+    fill(buffer, 1, [msg(1), msg(2), GAP, msg(3), msg(4)])
+
+    assert ids(buffer.lookup(1, "m4", 2)) == ["m3", "m4"]
+    assert buffer.lookup(1, "m4", 3) is None
+    # 断档在目标消息之后不影响
+    assert ids(buffer.lookup(1, "m2", 2)) == ["m1", "m2"]
+
+
+def test_messages_without_seq_only_serve_single_message_windows():
+    buffer = MessageBuffer()
+    fill(buffer, 1, [msg(None, message_id=f"n{i}") for i in range(5)])
+
+    assert ids(buffer.lookup(1, "n4", 1)) == ["n4"]
+    assert buffer.lookup(1, "n4", 2) is None
+
+
+def test_window_larger_than_buffer_is_a_miss():
+    buffer = MessageBuffer(size=5)
+    fill(buffer, 1, [msg(seq) for seq in range(1, 11)])
+
+    assert buffer.lookup(1, "m10", 5) is not None
+    assert buffer.lookup(1, "m10", 6) is None
+    assert buffer.lookup(1, "m3", 1) is None
+    assert buffer.lookup(2, "m10", 1) is None
+
+
+def test_spilled_group_reloads_without_gap(tmp_path):
+    buffer = MessageBuffer(max_groups=1, spill_dir=tmp_path)
+    fill(buffer, 1, [msg(1), msg(2)])
+    buffer.record(2, msg(1))
+    assert buffer.stats()["groups"] == 1
+
+    buffer.record(1, msg(3))
+    assert ids(buffer.lookup(1, "m3", 3)) == ["m1", "m2", "m3"]
+
+
+def test_persisted_buffer_gets_gap_after_restart(tmp_path):
+    buffer = MessageBuffer(spill_dir=tmp_path)
+    fill(buffer, 1, [msg(1), msg(2)])
+    buffer.persist()
+
+    restarted = MessageBuffer(spill_dir=tmp_path)
+    assert ids(restarted.lookup(1, "m2", 2)) == ["m1", "m2"]
+    # 重启期间可能漏收消息，即使序号连续也不能跨越
+    restarted.record(1, msg(3))
+    assert restarted.lookup(1, "m3", 2) is None
+    assert ids(restarted.lookup(1, "m3", 1)) == ["m3"]
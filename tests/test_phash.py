@@ -0,0 +1,90 @@
+import random
+
+import pytest
+
+from src.phash import BKTree, NearDuplicateIndex, hamming
+
+
+def brute_force(values: list[int], query: int, radius: int) -> list[int]:
+    return sorted(i for i, v in enumerate(values) if hamming(query, v) <= radius)
+
+
+@pytest.mark.parametrize("radius", [0, 1, 6, 12, 32])
+def test_bktree_query_matches_brute_force(radius):
+    rng = random.Random(radius)
+    values = [rng.getrandbits(64) for _ in range(2000)]
+    # 加入一些相互接近的哈希和完全相同的哈希
+    values += [values[0] ^ (1 << bit) for bit in range(8)] + [values[1]] * 3
+    tree = BKTree()
+    for i, value in enumerate(values):
+        tree.add(value, i)
+
+    for query in values[:20] + [rng.getrandbits(64) for _ in range(20)]:
+        results = tree.query(query, radius)
+        assert sorted(i for _, i in results) == brute_force(values, query, radius)
+        distances = [d for d, _ in results]
+        assert distances == sorted(distances)
+        assert all(d == hamming(query, values[i]) for d, i in results)
+
+
+def test_bktree_empty():
+    assert BKTree().query(0, 64) == []
+
+
+def test_index_add_query_and_reload(tmp_path):
+    index = NearDuplicateIndex(tmp_path)
+    index.add(1, "d1", 0b1111, "a", "one.png")
+    index.add(1, "d1", 0b0000, "a", "dup.png")
+    index.add(2, "d2", 0b1111, "b", "two.png")
+
+    reloaded = NearDuplicateIndex(tmp_path)
+    results = reloaded.query(1, 0b0111, 1)
+    assert [(d, e.file) for d, e in results] == [(1, "one.png")]
+    assert reloaded.query(1, 0, 2) == []
+    assert reloaded.stats()["matches"] == 1
+
+
+def _write_jpeg(path, seed: int) -> None:
+    from PIL import Image
+
+    rng = random.Random(seed)
+    img = Image.new("L", (32, 24))
+    img.putdata([rng.randrange(256) for _ in range(32 * 24)])
+    img.resize((320, 240)).convert("RGB").save(path, "JPEG")
+
+
+def test_rebuild_indexes_unmigrated_backups_and_prunes(tmp_path):
+    pytest.importorskip("numpy")
+    pytest.importorskip("PIL")
+    album = tmp_path / "123" / "777"
+    album.mkdir(parents=True)
+    for i in range(3):
+        _write_jpeg(album / f"legacy{i}.jpg", i)
+
+    index = NearDuplicateIndex(tmp_path)
+    stats = index.rebuild()
+    assert (stats["indexed"], stats["skipped"], stats["errors"]) == (3, 0, 0)
+    assert index.rebuild()["skipped"] == 3
+
+    (album / "legacy1.jpg").unlink()
+    stats = NearDuplicateIndex(tmp_path).rebuild()
+    assert (stats["indexed"], stats["pruned"]) == (0, 1)
+    reloaded = NearDuplicateIndex(tmp_path)
+    assert reloaded.stats()["entries"] == 0
+    reloaded.query(123, 0, 0)
+    assert reloaded.stats()["entries"] == 2
+
+
+def test_dhash_survives_resize(tmp_path):
+    pytest.importorskip("numpy")
+    Image = pytest.importorskip("PIL.Image")
+    from src.phash import dhash
+
+    _write_jpeg(tmp_path / "a.jpg", 7)
+    with Image.open(tmp_path / "a.jpg") as img:
+        img.resize((160, 120)).save(tmp_path / "b.png")
+    _write_jpeg(tmp_path / "c.jpg", 8)
+
+    original = dhash(tmp_path / "a.jpg")
+    assert hamming(original, dhash(tmp_path / "b.png")) <= 6
+    assert hamming(original, dhash(tmp_path / "c.jpg")) > 6
@@ -0,0 +1,57 @@
+import asyncio
+
+from src.render_cache import RenderCache, make_render_key
+
+
+def test_render_key_is_order_independent_and_input_sensitive():
+    a = make_render_key(text="你好", user_id="1", size=(1, 2))
+    assert a == make_render_key(size=(1, 2), user_id="1", text="你好")
+    assert a != make_render_key(text="你好", user_id="2", size=(1, 2))
+
+
+def test_memory_layer_is_bounded_by_bytes():
+    cache = RenderCache(max_memory_bytes=10)
+    cache.put_sync("a", b"1234")
+    cache.put_sync("b", b"1234")
+    cache.get_sync("a")
+    cache.put_sync("c", b"1234")
+    cache.put_sync("big", b"x" * 11)
+
+    assert cache.get_sync("a") == b"1234"
+    assert cache.get_sync("b") is None
+    assert cache.get_sync("big") is None
+    stats = cache.stats()
+    assert stats["memory_bytes"] == 8
+    assert (stats["memory_hits"], stats["misses"]) == (2, 2)
+
+
+def test_disk_layer_survives_restart_and_refills_memory(tmp_path):
+    cache = RenderCache(max_memory_bytes=100, disk_dir=tmp_path, max_disk_bytes=100)
+    asyncio.run(cache.put("k" * 64, b"png"))
+
+    restarted = RenderCache(
+        max_memory_bytes=100, disk_dir=tmp_path, max_disk_bytes=100
+    )
+    assert asyncio.run(restarted.get("k" * 64)) == b"png"
+    assert asyncio.run(restarted.get("k" * 64)) == b"png"
+    stats = restarted.stats()
+    assert (stats["disk_hits"], stats["memory_hits"]) == (1, 1)
+
+
+def test_disk_layer_evicts_least_recently_used(tmp_path):
+    cache = RenderCache(max_memory_bytes=0, disk_dir=tmp_path, max_disk_bytes=10)
+    for key in ("aa1", "bb2", "cc3"):
+        cache.put_sync(key, b"12345")
+
+    assert cache.get_sync("aa1") is None
+    assert cache.get_sync("cc3") == b"12345"
+    assert sorted(p.name for p in tmp_path.glob("*/*")) == ["bb2", "cc3"]
+    assert cache.stats()["disk_bytes"] == 10
+
+
+def test_disk_layer_disabled_without_budget(tmp_path):
+    cache = RenderCache(disk_dir=tmp_path, max_disk_bytes=0)
+    cache.put_sync("key", b"data")
+
+    assert cache.disk_dir is None
+    assert not list(tmp_path.iterdir())
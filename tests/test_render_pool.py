@@ -0,0 +1,118 @@
+import asyncio
+import threading
+
+import pytest
+
+from src import render_pool
+from src.render_pool import RenderPool, RenderQueueFull
+
+
+@pytest.fixture(autouse=True)
+def no_warm_up(monkeypatch):
+    # 真实的初始化会加载字体与气泡素材，这里只测调度
+    monkeypatch.setattr(render_pool, "_init_worker", lambda *args: None)
+
+
+def run_pool(pool: RenderPool, body):
+    async def run():
+        pool.start(None)
+        try:
+            return await body()
+        finally:
+            await pool.shutdown()
+
+    return asyncio.run(run())
+
+
+def test_off_mode_runs_inline():
+    pool = RenderPool(mode="off")
+
+    async def body():
+        return await pool.run(threading.get_ident)
+
+    assert run_pool(pool, body) == threading.get_ident()
+    assert pool.stats()["completed"] == 1
+    assert pool.stats()["workers"] == 0
+
+
+def test_thread_mode_runs_off_the_event_loop():
+    pool = RenderPool(mode="thread", workers=2)
+
+    async def body():
+        return await pool.run(threading.get_ident)
+
+    assert run_pool(pool, body) != threading.get_ident()
+    assert pool.stats()["completed"] == 1
+
+
+def test_full_queue_rejects_new_jobs():
+    pool = RenderPool(mode="thread", workers=1, queue_size=1)
+    release = threading.Event()
+
+    async def body():
+        jobs = [asyncio.create_task(pool.run(release.wait, 5)) for _ in range(2)]
+        await asyncio.sleep(0.05)
+        with pytest.raises(RenderQueueFull):
+            await pool.run(release.wait, 5)
+        assert pool.stats()["in_flight"] == 2
+        release.set()
+        await asyncio.gather(*jobs)
+        await asyncio.sleep(0)
+        return pool.stats()
+
+    stats = run_pool(pool, body)
+    assert stats["rejected"] == 1
+    assert stats["completed"] == 2
+    assert stats["in_flight"] == 0
+
+
+def test_timed_out_job_keeps_its_slot_until_it_finishes():
+    pool = RenderPool(mode="thread", workers=1, queue_size=0, timeout=0.05)
+    release = threading.Event()
+
+    async def body():
+        with pytest.raises(asyncio.TimeoutError):
+            await pool.run(release.wait, 5)
+        # 超时的任务仍在工作线程中执行，名额未释放
+        with pytest.raises(RenderQueueFull):
+            await pool.run(lambda: None)
+        release.set()
+        for _ in range(100):
+            if pool.stats()["in_flight"] == 0:
+                break
+            await asyncio.sleep(0.01)
+        return await pool.run(lambda: "ok")
+
+    assert run_pool(pool, body) == "ok"
+    assert pool.stats()["timed_out"] == 1
+
+
+def test_failures_are_counted_and_propagated():
+    pool = RenderPool(mode="thread")
+
+    def boom():
+        raise ValueError("bad image")
+
+    async def body():
+        with pytest.raises(ValueError):
+            await pool.run(boom)
+
+    run_pool(pool, body)
+    assert pool.stats()["failed"] == 1
+    assert pool.stats()["in_flight"] == 0
+
+
+def test_closed_pool_refuses_work():
+    pool = RenderPool(mode="thread")
+
+    async def run():
+        pool.start(None)
+        await pool.shutdown()
+        with pytest.raises(asyncio.CancelledError):
+            await pool.run(lambda: None)
+
+    asyncio.run(run())
+
+
+def test_unknown_mode_falls_back_to_inline():
+    assert RenderPool(mode="gpu").mode == "off"
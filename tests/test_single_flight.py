@@ -0,0 +1,95 @@
+import asyncio
+
+import pytest
+
+from src.single_flight import SingleFlight
+
+
+def test_concurrent_calls_share_one_result():
+    calls = []
+
+    async def run():
+        flight = SingleFlight()
+        gate = asyncio.Event()
+
+        async def factory():
+            calls.append(1)
+            await gate.wait()
+            return "value"
+
+        tasks = [asyncio.create_task(flight.run("k", factory)) for _ in range(5)]
+        await asyncio.sleep(0)
+        assert "k" in flight
+        gate.set()
+        results = await asyncio.gather(*tasks)
+        return flight, results
+
+    flight, results = asyncio.run(run())
+    assert results == ["value"] * 5
+    assert calls == [1]
+    assert "k" not in flight and len(flight) == 0
+
+
+def test_error_reaches_every_waiter_and_is_not_cached():
+    calls = []
+
+    async def run():
+        flight = SingleFlight()
+
+        async def failing():
+            calls.append(1)
+            await asyncio.sleep(0.01)
+            raise RuntimeError("boom")
+
+        results = await asyncio.gather(
+            flight.run("k", failing),
+            flight.run("k", failing),
+            return_exceptions=True,
+        )
+
+        async def ok():
+            return 1
+
+        return results, await flight.run("k", ok)
+
+    results, retried = asyncio.run(run())
+    assert [type(r) for r in results] == [RuntimeError, RuntimeError]
+    assert calls == [1]
+    assert retried == 1
+
+
+def test_cancelled_leader_cancels_waiters():
+    async def run():
+        flight = SingleFlight()
+
+        async def slow():
+            await asyncio.sleep(10)
+
+        leader = asyncio.create_task(flight.run("k", slow))
+        await asyncio.sleep(0)
+        waiter = asyncio.create_task(flight.run("k", slow))
+        await asyncio.sleep(0)
+        leader.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await waiter
+        return flight
+
+    assert len(asyncio.run(run())) == 0
+
+
+def test_cancelled_waiter_does_not_cancel_leader():
+    async def run():
+        flight = SingleFlight()
+
+        async def slow():
+            await asyncio.sleep(0.02)
+            return "done"
+
+        leader = asyncio.create_task(flight.run("k", slow))
+        await asyncio.sleep(0)
+        waiter = asyncio.create_task(flight.run("k", slow))
+        await asyncio.sleep(0)
+        waiter.cancel()
+        return await leader
+
+    assert asyncio.run(run()) == "done"
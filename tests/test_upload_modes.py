@@ -0,0 +1,40 @@
+from src.upload_modes import UPLOAD_MODES, UploadModeTracker
+
+
+def test_default_order_per_backend():
+    tracker = UploadModeTracker()
+
+    assert tracker.order("1", "llbot") == list(UPLOAD_MODES["llbot"])
+    assert tracker.order("1", "unknown") == list(UPLOAD_MODES["napcat"])
+
+
+def test_success_moves_mode_to_front_for_that_client_only():
+    tracker = UploadModeTracker()
+    tracker.record_success("1", "napcat", "file_uri", 12.0)
+
+    assert tracker.order("1", "napcat") == ["file_uri", "raw_path", "base64"]
+    assert tracker.order("2", "napcat") == list(UPLOAD_MODES["napcat"])
+
+
+def test_failure_of_preferred_mode_restores_default_order():
+    tracker = UploadModeTracker()
+    tracker.record_success("1", "napcat", "base64", 10.0)
+    tracker.record_failure("1", "napcat", "raw_path", 5.0)
+    assert tracker.order("1", "napcat")[0] == "base64"
+
+    tracker.record_failure("1", "napcat", "base64", 30.0)
+    assert tracker.order("1", "napcat") == list(UPLOAD_MODES["napcat"])
+
+
+def test_stats_average_latency_per_backend_and_mode():
+    tracker = UploadModeTracker()
+    tracker.record_success("1", "napcat", "raw_path", 10.0)
+    tracker.record_failure("2", "napcat", "raw_path", 30.0)
+
+    stats = tracker.stats()
+    assert stats["modes"]["napcat/raw_path"] == {
+        "success": 1,
+        "failure": 1,
+        "avg_ms": 20.0,
+    }
+    assert stats["preferred"] == {"1/napcat": "raw_path"}
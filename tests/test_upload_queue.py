@@ -0,0 +1,196 @@
+import asyncio
+import json
+import time
+from dataclasses import asdict
+from pathlib import Path
+
+from src.upload_queue import UploadJob, UploadQueue
+
+
+class Recorder:
+    """假的上传处理器：前 failures 次调用失败，之后成功"""
+
+    def __init__(self, failures: int = 0):
+        self.failures = failures
+        self.calls: list[str] = []
+        self.notified: list[tuple[str, str | None]] = []
+        self.finished = asyncio.Event()
+
+    async def handler(self, job: UploadJob, client) -> None:
+        self.calls.append(job.job_id)
+        if len(self.calls) <= self.failures:
+            raise RuntimeError(f"失败 {len(self.calls)}")
+
+    async def notifier(self, job: UploadJob, client, error: str | None) -> None:
+        self.notified.append((job.job_id, error))
+        self.finished.set()
+
+
+def make_job(job_id: str = "job1", group_id: int = 100) -> UploadJob:
+    return UploadJob(
+        job_id=job_id,
+        self_id="10000",
+        group_id=group_id,
+        album_id="a1",
+        album_name="相册",
+        backend="napcat",
+        paths=["/tmp/x.png"],
+    )
+
+
+def make_queue(tmp_path, recorder: Recorder, **kwargs) -> UploadQueue:
+    kwargs.setdefault("base_delay", 0.01)
+    kwargs.setdefault("max_delay", 0.05)
+    return UploadQueue(
+        tmp_path / "queue", recorder.handler, recorder.notifier, **kwargs
+    )
+
+
+def test_submit_runs_job_and_removes_file(tmp_path):
+    async def run():
+        recorder = Recorder()
+        queue = make_queue(tmp_path, recorder)
+        queue.start()
+        ahead = await queue.submit(make_job(), object())
+        await asyncio.wait_for(recorder.finished.wait(), 2)
+        await queue.close()
+        return recorder, queue, ahead
+
+    recorder, queue, ahead = asyncio.run(run())
+    assert ahead == 0
+    assert recorder.notified == [("job1", None)]
+    assert queue.stats()["completed"] == 1
+    assert not list((tmp_path / "queue").glob("*.json"))
+
+
+def test_resumed_job_waits_for_client(tmp_path):
+    queue_dir = tmp_path / "queue"
+    queue_dir.mkdir()
+    job = make_job(job_id="resumed")
+    job.done = 1
+    (queue_dir / "resumed.json").write_text(json.dumps(asdict(job)), encoding="utf-8")
+
+    async def run():
+        recorder = Recorder()
+        queue = make_queue(tmp_path, recorder)
+        queue.start()
+        await asyncio.sleep(0.05)
+        parked = (list(recorder.calls), queue.stats()["no_client"])
+        queue.register_client("10000", object())
+        await asyncio.wait_for(recorder.finished.wait(), 2)
+        await queue.close()
+        return recorder, parked
+
+    recorder, (calls_before, no_client) = asyncio.run(run())
+    assert calls_before == []
+    assert no_client == 1
+    assert recorder.calls == ["resumed"]
+    assert not (queue_dir / "resumed.json").exists()
+
+
+def test_failed_job_retries_with_backoff(tmp_path):
+    async def run():
+        recorder = Recorder(failures=2)
+        queue = make_queue(tmp_path, recorder, max_attempts=5)
+        queue.start()
+        await queue.submit(make_job(), object())
+        await asyncio.wait_for(recorder.finished.wait(), 2)
+        await queue.close()
+        return recorder, queue
+
+    recorder, queue = asyncio.run(run())
+    assert recorder.calls == ["job1"] * 3
+    assert recorder.notified == [("job1", None)]
+    assert queue.stats()["retries"] == 2
+
+
+def test_retry_state_is_persisted(tmp_path):
+    async def run():
+        recorder = Recorder(failures=1)
+        # 退避足够长，第一次失败后任务停在磁盘上
+        queue = make_queue(tmp_path, recorder, base_delay=60, max_delay=60)
+        queue.start()
+        await queue.submit(make_job(), object())
+        while not recorder.calls:
+            await asyncio.sleep(0.01)
+        await asyncio.sleep(0.05)
+        await queue.close()
+
+    asyncio.run(run())
+    saved = json.loads((tmp_path / "queue" / "job1.json").read_text(encoding="utf-8"))
+    assert saved["attempts"] == 1
+    assert saved["last_error"] == "失败 1"
+    assert saved["next_at"] > time.time() + 30
+
+
+def test_job_dropped_after_max_attempts(tmp_path):
+    async def run():
+        recorder = Recorder(failures=10)
+        queue = make_queue(tmp_path, recorder, max_attempts=3)
+        queue.start()
+        await queue.submit(make_job(), object())
+        await asyncio.wait_for(recorder.finished.wait(), 2)
+        await queue.close()
+        return recorder, queue
+
+    recorder, queue = asyncio.run(run())
+    assert len(recorder.calls) == 3
+    assert recorder.notified == [("job1", "失败 3")]
+    assert queue.stats()["failed"] == 1
+    assert not list((tmp_path / "queue").glob("*.json"))
+
+
+def test_next_delay_ignores_group_saturated_jobs(tmp_path):
+    queue = make_queue(tmp_path, Recorder(), per_group=1)
+    queue.register_client("10000", object())
+    first, second = make_job("a"), make_job("b")
+    second.next_at = time.time() + 30
+    queue._jobs = {"a": first, "b": second}
+    queue._running.add("a")
+    queue._group_running[100] = 1
+    assert queue._next_delay() is None
+    queue._group_running[100] = 0
+    assert 25 < queue._next_delay() <= 30
+
+
+def test_same_second_jobs_keep_separate_files(tmp_path):
+    from src.ingest import save_bytes, staging_name
+
+    data_dir = tmp_path / "data"
+    paths = []
+    for content in (b"\x89PNG\r\n\x1a\nfirst", b"\x89PNG\r\n\x1a\nsecond"):
+        handle = save_bytes(content, tmp_path / "ingest")
+        # 同一群、同一秒：前缀完全相同
+        target = data_dir / staging_name("100_20260101_000000", handle)
+        paths.append(handle.move_to(target).path)
+    assert paths[0] != paths[1]
+
+    uploaded: list[bytes] = []
+
+    async def handler(job: UploadJob, client) -> None:
+        path = Path(job.paths[0])
+        uploaded.append(path.read_bytes())
+        path.unlink()
+
+    async def run():
+        done = asyncio.Event()
+        results = []
+
+        async def notifier(job, client, error):
+            results.append((job.job_id, error))
+            if len(results) == 2:
+                done.set()
+
+        queue = UploadQueue(tmp_path / "queue", handler, notifier, workers=2)
+        queue.start()
+        for i, path in enumerate(paths):
+            job = make_job(job_id=f"job{i}")
+            job.paths = [str(path)]
+            await queue.submit(job, object())
+        await asyncio.wait_for(done.wait(), 2)
+        await queue.close()
+        return results
+
+    results = asyncio.run(run())
+    assert sorted(results) == [("job0", None), ("job1", None)]
+    assert sorted(uploaded) == [b"\x89PNG\r\n\x1a\nfirst", b"\x89PNG\r\n\x1a\nsecond"]